@@ -0,0 +1,84 @@
+"""
+播放记录基准：向 moc_plus.history 写入大量播放事件，测量写入吞吐量和统计查询耗时。
+
+  * 写入：通过 PlayHistory 的后台写线程（与播放器中的用法相同）
+  * 查询：最常播放、最近播放、跳过率、下一首预测，各取中位数
+
+用法:
+    python benchmarks/bench_history.py [--events 1000000] [--tracks 20000] [--runs 5] [--json results.json]
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def _best_ms(fn, runs: int) -> float:
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the play history store")
+    parser.add_argument("--events", type=int, default=1_000_000)
+    parser.add_argument("--tracks", type=int, default=20_000)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--json", metavar="PATH", help="把结果写入 JSON 文件")
+    args = parser.parse_args()
+
+    from moc_plus import history
+
+    with tempfile.TemporaryDirectory() as home:
+        db_path = os.path.join(home, "history.db")
+        log = history.PlayHistory(db_path)
+        rng = random.Random(0)
+        # 少数曲目被反复播放，更接近真实的收听分布
+        weights = [1 / (n + 1) for n in range(args.tracks)]
+        picks = rng.choices(range(args.tracks), weights, k=args.events)
+
+        start = time.perf_counter()
+        for n, track in enumerate(picks):
+            duration = 180.0 + track % 120
+            listened = duration if rng.random() < 0.8 else rng.uniform(0, duration)
+            log._post(history.PlayEvent(f"/music/{track:06d}.mp3", f"Track {track}", 1.7e9 + n * 200,
+                                        listened, duration, listened < duration * history.SKIP_FRACTION))
+        log.close(timeout=None)
+        write_s = time.perf_counter() - start
+
+        probe = f"/music/{picks[-1]:06d}.mp3"
+        result = {
+            "events": args.events,
+            "write_events_per_s": int(args.events / write_s),
+            "db_mb": round(os.path.getsize(db_path) / 1024 / 1024, 1),
+            "top_tracks_ms": _best_ms(lambda: history.top_tracks(20, db_path=db_path), args.runs),
+            "recently_played_ms": _best_ms(lambda: history.recently_played(20, db_path=db_path), args.runs),
+            "most_skipped_ms": _best_ms(lambda: history.most_skipped(20, db_path=db_path), args.runs),
+            "totals_ms": _best_ms(lambda: history.totals(db_path), args.runs),
+            "likely_next_ms": _best_ms(lambda: history.likely_next(probe, db_path=db_path), args.runs),
+        }
+        plays = history.totals(db_path)[0]
+        assert plays == args.events, f"recorded {plays} of {args.events} events"
+
+    print(f"{args.events} events: write {result['write_events_per_s']:,}/s ({result['db_mb']} MB) | "
+          f"top {result['top_tracks_ms']:.2f} ms, recent {result['recently_played_ms']:.2f} ms, "
+          f"skipped {result['most_skipped_ms']:.2f} ms, totals {result['totals_ms']:.2f} ms, "
+          f"likely next {result['likely_next_ms']:.2f} ms")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
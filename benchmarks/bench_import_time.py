@@ -0,0 +1,98 @@
+"""
+基于 `python -X importtime` 的启动时间基准。
+
+检查 mpvs 命令行入口的导入耗时是否在预算之内，并确认 -n / -x 等控制路径
+不会把 Textual、requests、BeautifulSoup 或 mpv 拉进来。超出预算时以非零状态退出，
+可以直接放进 CI 或 pre-commit 中使用。
+
+用法:
+    python benchmarks/bench_import_time.py [--runs 5] [--budget-ms 50]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 控制路径不允许导入的重量级模块
+FORBIDDEN_FOR_CLI = ["textual", "requests", "bs4", "lxml", "mpv"]
+
+
+def _env(home: str) -> dict:
+    env = dict(os.environ, HOME=home, PYTHONPATH=ROOT)
+    env.pop("PYTHONDONTWRITEBYTECODE", None)
+    return env
+
+
+def import_time_us(module: str, env: dict) -> int:
+    """返回 module 的累计导入耗时（微秒）。"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True, env=env, check=True,
+    )
+    for line in result.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        parts = [p.strip() for p in line.split("|")]
+        if len(parts) == 3 and parts[2] == module:
+            return int(parts[1])
+    raise RuntimeError(f"importtime output did not mention {module}")
+
+
+def leaked_modules(module: str, env: dict) -> list[str]:
+    code = (
+        f"import sys, {module}; "
+        f"print(' '.join(m for m in {FORBIDDEN_FOR_CLI!r} if m in sys.modules))"
+    )
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, env=env, check=True)
+    return result.stdout.split()
+
+
+def cli_wall_time_ms(args: list[str], env: dict) -> float:
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "-m", "moc_plus.main", *args], capture_output=True, env=env, check=True)
+    return (time.perf_counter() - start) * 1000
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="mpvs startup import-time budget")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget-ms", type=float, default=50.0, help="moc_plus.main 累计导入耗时预算")
+    args = parser.parse_args()
+
+    failed = False
+    with tempfile.TemporaryDirectory() as home:
+        env = _env(home)
+        # 预热一次，生成 .pyc，避免把编译时间算进去
+        import_time_us("moc_plus.main", env)
+
+        samples = [import_time_us("moc_plus.main", env) / 1000 for _ in range(args.runs)]
+        median = statistics.median(samples)
+        status = "OK" if median <= args.budget_ms else "OVER BUDGET"
+        print(f"import moc_plus.main: median {median:.1f} ms, min {min(samples):.1f} ms "
+              f"(budget {args.budget_ms:.0f} ms) {status}")
+        failed |= median > args.budget_ms
+
+        leaked = leaked_modules("moc_plus.main", env)
+        if leaked:
+            print(f"moc_plus.main pulls in heavy modules: {', '.join(leaked)}")
+            failed = True
+
+        for cli_args in (["-n"], ["-x"]):
+            wall = statistics.median(cli_wall_time_ms(cli_args, env) for _ in range(args.runs))
+            print(f"mpvs {' '.join(cli_args)}: median wall time {wall:.1f} ms")
+
+        try:
+            app_ms = import_time_us("moc_plus.app", env) / 1000
+            print(f"import moc_plus.app (TUI, for reference): {app_ms:.1f} ms")
+        except (subprocess.CalledProcessError, RuntimeError):
+            print("import moc_plus.app: skipped (Textual not installed)")
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,133 @@
+"""
+歌单解析基准：对比旧的 load_m3u（整行 strip + 逐行 UTF-8 文本读取）与
+moc_plus.m3u 中的流式解析器（分块读取 / mmap）。
+
+分别测量：
+  * 纯解析耗时（不检查文件是否存在）
+  * Playlist.load_m3u 的端到端耗时（包括 stat 和去重）
+  * 首批歌曲可用的时间（增量加载时界面能多快显示第一屏）
+
+用法:
+    python benchmarks/bench_m3u.py [--sizes 10000 100000] [--runs 3] [--json results.json]
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def legacy_load_m3u(playlist, filepath: str) -> None:
+    """重构前的 Playlist.load_m3u，原样保留以便对比。"""
+    from moc_plus.playlist import Song
+    playlist.songs.clear()
+    existing_paths = set()
+    with open(filepath, 'r', encoding='utf-8') as f:
+        title = ""
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith('#EXTM3U'):
+                continue
+            if line.startswith('#EXTINF:'):
+                title = line.split(',', 1)[-1]
+            elif not line.startswith('#'):
+                path = line
+                if os.path.exists(path):
+                    if not title:
+                        title = os.path.splitext(os.path.basename(path))[0]
+                    if path not in existing_paths:
+                        existing_paths.add(path)
+                        playlist.songs.append(Song(title=title, path=path))
+                title = ""
+
+
+def legacy_parse(filepath: str) -> int:
+    """旧实现中去掉 stat 和去重之后的纯解析部分。"""
+    count = 0
+    with open(filepath, 'r', encoding='utf-8') as f:
+        title = ""
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith('#EXTM3U'):
+                continue
+            if line.startswith('#EXTINF:'):
+                title = line.split(',', 1)[-1]
+            elif not line.startswith('#'):
+                if not title:
+                    title = os.path.splitext(os.path.basename(line))[0]
+                count += 1
+                title = ""
+    return count
+
+
+def _best_ms(fn, runs: int) -> float:
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def make_playlist(home: str, size: int) -> str:
+    music_dir = os.path.join(home, f"library-{size}")
+    os.makedirs(music_dir, exist_ok=True)
+    m3u_path = os.path.join(home, f"bench-{size}.m3u8")
+    with open(m3u_path, "w", encoding="utf-8") as f:
+        f.write("#EXTM3U\n")
+        for n in range(size):
+            path = os.path.join(music_dir, f"{n:06d}.mp3")
+            open(path, "wb").close()
+            f.write(f"#EXTINF:{180 + n % 120},歌手 - 歌曲 {n}\n{path}\n")
+    return m3u_path
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the streaming M3U parser against the legacy loader")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--json", metavar="PATH", help="把结果写入 JSON 文件")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as home:
+        os.environ["HOME"] = home
+        from moc_plus.m3u import iter_m3u
+        from moc_plus.playlist import Playlist
+
+        results = {}
+        for size in args.sizes:
+            m3u_path = make_playlist(home, size)
+            playlist = Playlist()
+
+            def first_batch() -> None:
+                next(playlist.iter_load_m3u(m3u_path), None)
+
+            result = {
+                "parse_legacy_ms": _best_ms(lambda: legacy_parse(m3u_path), args.runs),
+                "parse_stream_ms": _best_ms(lambda: sum(1 for _ in iter_m3u(m3u_path)), args.runs),
+                "parse_mmap_ms": _best_ms(lambda: sum(1 for _ in iter_m3u(m3u_path, use_mmap=True)), args.runs),
+                "load_legacy_ms": _best_ms(lambda: legacy_load_m3u(playlist, m3u_path), args.runs),
+                "load_stream_ms": _best_ms(lambda: playlist.load_m3u(m3u_path), args.runs),
+                "first_batch_ms": _best_ms(first_batch, args.runs),
+            }
+            playlist.load_m3u(m3u_path)
+            assert len(playlist.songs) == size, f"loaded {len(playlist.songs)} of {size} entries"
+            results[f"entries_{size}"] = result
+            print(f"{size} entries: parse legacy {result['parse_legacy_ms']:.1f} ms, "
+                  f"stream {result['parse_stream_ms']:.1f} ms, mmap {result['parse_mmap_ms']:.1f} ms | "
+                  f"load legacy {result['load_legacy_ms']:.1f} ms, stream {result['load_stream_ms']:.1f} ms | "
+                  f"first batch {result['first_batch_ms']:.1f} ms")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,178 @@
+"""
+完全离线的性能基准套件。
+
+启动本地替身服务器（standin_server.py），把下载器指向它，然后测量：
+
+  * 搜索延迟与 HTML 解析耗时
+  * 不同并发度下的批量下载吞吐
+  * 10k–100k 条目的 m3u 保存/加载
+  * 播放列表视图重建耗时（需要 Textual）
+
+所有数据写入临时的 HOME 目录，不会触碰真实的 ~/.mpvs 和 ~/music/mpvs。
+
+用法:
+    python benchmarks/bench_suite.py [--quick] [--json results.json]
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+
+def _summary(samples: list[float]) -> dict:
+    ordered = sorted(samples)
+    return {
+        "n": len(ordered),
+        "median": statistics.median(ordered),
+        "p95": ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))],
+        "min": ordered[0],
+        "max": ordered[-1],
+    }
+
+
+def _timed(fn, *args, **kwargs) -> tuple[float, object]:
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return (time.perf_counter() - start) * 1000, result
+
+
+def bench_search(downloader, metrics, runs: int) -> dict:
+    downloader.search_songs("warmup", 1)
+    latencies = [_timed(downloader.search_songs, f"keyword{i}", i % 5 + 1)[0] for i in range(runs)]
+    return {
+        "latency_ms": _summary(latencies),
+        "parse_ms": metrics.histogram("search.parse.ms").snapshot(),
+    }
+
+
+def bench_downloads(downloader, home: str, songs: int, concurrency_levels: list[int]) -> dict:
+    results = {}
+    for level in concurrency_levels:
+        download_dir = os.path.join(home, f"downloads-c{level}")
+        ids = [f"c{level}s{n:04d}" for n in range(songs)]
+
+        def fetch(song_id: str) -> int:
+            info = downloader.get_song_info(song_id)
+            return os.path.getsize(downloader.download_song_and_lrc(info, download_dir))
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=level) as pool:
+            total_bytes = sum(pool.map(fetch, ids))
+        elapsed = time.perf_counter() - start
+        results[f"concurrency_{level}"] = {
+            "songs": songs,
+            "seconds": elapsed,
+            "songs_per_s": songs / elapsed,
+            "mb_per_s": total_bytes / elapsed / (1024 * 1024),
+        }
+    return results
+
+
+def bench_m3u(playlist_module, home: str, sizes: list[int]) -> dict:
+    Playlist, Song = playlist_module.Playlist, playlist_module.Song
+    results = {}
+    for size in sizes:
+        music_dir = os.path.join(home, f"library-{size}")
+        os.makedirs(music_dir, exist_ok=True)
+        songs = []
+        for n in range(size):
+            path = os.path.join(music_dir, f"{n:06d}.mp3")
+            open(path, "wb").close()
+            songs.append(Song(title=f"Track {n}", path=path))
+
+        playlist = Playlist()
+        playlist.songs = songs
+        m3u_path = os.path.join(home, f"bench-{size}.m3u")
+        save_ms, _ = _timed(playlist.save_m3u, m3u_path)
+
+        loaded = Playlist()
+        load_ms, _ = _timed(loaded.load_m3u, m3u_path)
+        assert len(loaded.songs) == size, f"loaded {len(loaded.songs)} of {size} entries"
+        results[f"entries_{size}"] = {"save_ms": save_ms, "load_ms": load_ms}
+    return results
+
+
+def bench_playlist_view(playlist_module, sizes: list[int]) -> dict:
+    try:
+        from moc_plus.app import MocPlusApp
+    except ImportError as e:
+        return {"skipped": f"Textual not available: {e}"}
+    Song = playlist_module.Song
+    results = {}
+
+    async def run() -> None:
+        app = MocPlusApp()
+        async with app.run_test() as pilot:
+            await pilot.pause()
+            for size in sizes:
+                app.playlist.songs = [Song(title=f"Track {n}", path=f"/nonexistent/{n}.mp3") for n in range(size)]
+                start = time.perf_counter()
+                app._update_playlist_view()
+                await pilot.pause()
+                results[f"songs_{size}"] = {"rebuild_ms": (time.perf_counter() - start) * 1000}
+            app.playlist.songs = []
+            await pilot.press("q")
+
+    asyncio.run(run())
+    return results
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Offline benchmark suite for mpvs")
+    parser.add_argument("--quick", action="store_true", help="缩小规模，快速冒烟运行")
+    parser.add_argument("--json", metavar="PATH", help="把结果写入 JSON 文件")
+    parser.add_argument("--audio-kb", type=int, default=512)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="替身服务器的模拟网络延迟")
+    args = parser.parse_args()
+
+    search_runs = 5 if args.quick else 30
+    download_songs = 8 if args.quick else 32
+    concurrency = [1, 4] if args.quick else [1, 2, 4, 8]
+    m3u_sizes = [1000] if args.quick else [10_000, 100_000]
+    view_sizes = [200] if args.quick else [500, 2000]
+
+    with tempfile.TemporaryDirectory() as home:
+        # 必须在导入 moc_plus 之前切换 HOME，日志和配置路径在导入时确定
+        os.environ["HOME"] = home
+        from standin_server import StandInServer
+        from moc_plus import downloader, metrics, playlist as playlist_module
+
+        results = {}
+        with StandInServer(audio_size=args.audio_kb * 1024, latency_ms=args.latency_ms) as server:
+            downloader.set_base_url(server.base_url)
+            results["search"] = bench_search(downloader, metrics, search_runs)
+            results["download"] = bench_downloads(downloader, home, download_songs, concurrency)
+        results["m3u"] = bench_m3u(playlist_module, home, m3u_sizes)
+        results["playlist_view"] = bench_playlist_view(playlist_module, view_sizes)
+
+    search = results["search"]
+    print(f"search latency: median {search['latency_ms']['median']:.1f} ms, "
+          f"p95 {search['latency_ms']['p95']:.1f} ms; "
+          f"parse median {search['parse_ms']['p50'] or 0:.1f} ms")
+    for name, data in results["download"].items():
+        print(f"download {name}: {data['songs_per_s']:.1f} songs/s, {data['mb_per_s']:.1f} MB/s")
+    for name, data in results["m3u"].items():
+        print(f"m3u {name}: save {data['save_ms']:.1f} ms, load {data['load_ms']:.1f} ms")
+    for name, data in results["playlist_view"].items():
+        if name == "skipped":
+            print(f"playlist view: skipped ({data})")
+        else:
+            print(f"playlist view {name}: rebuild {data['rebuild_ms']:.1f} ms")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
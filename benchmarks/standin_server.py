@@ -0,0 +1,164 @@
+"""
+离线基准测试用的本地替身服务器，模拟音乐站点的三个接口：
+
+    GET  /so.php?wd=<关键词>&page=<页码>    搜索结果 HTML（结构与真实站点一致）
+    POST /style/js/play.php                 歌曲信息 JSON（url / title / lrc）
+    GET  /audio/<id>.mp3                    合成的音频数据
+
+如果 fixtures/ 目录下有录制的 so.php 页面（so.html），搜索接口直接返回它；
+否则按真实页面的结构生成结果。
+
+单独运行:
+    python benchmarks/standin_server.py --port 8765
+    MPVS_BASE_URL=http://127.0.0.1:8765 mpvs
+"""
+import argparse
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+from urllib.parse import parse_qs, urlparse
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+SONGS_PER_PAGE = 20
+TOTAL_SONGS = 200
+
+LRC_TEMPLATE = "\n".join(f"[00:{i * 3:02d}.00]第 {i + 1} 行歌词" for i in range(20))
+
+
+def render_search_page(keyword: str, page: int) -> str:
+    """生成与 so.php 结构一致的搜索结果页面。"""
+    total_pages = (TOTAL_SONGS + SONGS_PER_PAGE - 1) // SONGS_PER_PAGE
+    items = []
+    for n in range(SONGS_PER_PAGE):
+        song_id = f"{keyword.encode('utf-8').hex()[:8] or 'x'}{page:03d}{n:03d}"
+        items.append(
+            f'<li><div class="name"><a class="url" href="/mp3/{song_id}.html" target="_blank">'
+            f'{keyword} - 歌曲 {page}-{n}</a></div><div class="mv"></div></li>'
+        )
+    return (
+        "<!DOCTYPE html><html><head><meta charset='utf-8'><title>搜索</title></head><body>"
+        + "<div class='header'>" + "<a href='#'>nav</a>" * 50 + "</div>"
+        + "<div class='play_list'><ul>" + "".join(items) + "</ul></div>"
+        + f"<div class='page'><a class='btn'>共{TOTAL_SONGS}首</a><a class='btn'>共{total_pages}页</a>"
+        + "".join(f"<a class='btn' href='?page={p}'>{p}</a>" for p in range(1, total_pages + 1))
+        + "</div>"
+        + f"<div class='pagedata'><span>{TOTAL_SONGS}</span></div>"
+        + "<div class='footer'>" + "<p>footer</p>" * 50 + "</div></body></html>"
+    )
+
+
+def synthetic_audio(size: int) -> bytes:
+    # MPEG 帧头 + 填充字节，足以模拟下载负载
+    frame = b"\xff\xfb\x90\x64" + bytes(413)
+    return (frame * (size // len(frame) + 1))[:size]
+
+
+class StandInServer:
+    """在后台线程中运行的替身服务器。"""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, audio_size: int = 512 * 1024,
+                 latency_ms: float = 0.0):
+        self.audio = synthetic_audio(audio_size)
+        self.latency = latency_ms / 1000
+        self.recorded_search: Optional[bytes] = None
+        recorded = os.path.join(FIXTURES_DIR, "so.html")
+        if os.path.exists(recorded):
+            with open(recorded, "rb") as f:
+                self.recorded_search = f.read()
+        self.httpd = ThreadingHTTPServer((host, port), self._make_handler())
+        self.httpd.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "StandInServer":
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self) -> "StandInServer":
+        return self.start()
+
+    def __exit__(self, *_exc) -> None:
+        self.stop()
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *_args):
+                pass
+
+            def _send(self, body: bytes, content_type: str) -> None:
+                if server.latency:
+                    time.sleep(server.latency)
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                if url.path == "/so.php":
+                    query = parse_qs(url.query)
+                    keyword = query.get("wd", [""])[0]
+                    page = int(query.get("page", ["1"])[0])
+                    body = server.recorded_search or render_search_page(keyword, page).encode("utf-8")
+                    self._send(body, "text/html; charset=utf-8")
+                elif url.path.startswith("/audio/"):
+                    self._send(server.audio, "audio/mpeg")
+                else:
+                    self.send_error(404)
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                form = parse_qs(self.rfile.read(length).decode("utf-8"))
+                if urlparse(self.path).path != "/style/js/play.php":
+                    self.send_error(404)
+                    return
+                song_id = form.get("id", [""])[0]
+                payload = {
+                    "msg": 1,
+                    "id": song_id,
+                    "title": f"替身歌曲 {song_id}",
+                    "url": f"{server.base_url}/audio/{song_id}.mp3",
+                    "lrc": LRC_TEMPLATE,
+                }
+                self._send(json.dumps(payload, ensure_ascii=False).encode("utf-8"), "application/json")
+
+        return Handler
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Local stand-in for the music site")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--audio-kb", type=int, default=512)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="每个响应前附加的模拟延迟")
+    args = parser.parse_args()
+    server = StandInServer(args.host, args.port, args.audio_kb * 1024, args.latency_ms)
+    print(f"Serving stand-in site at {server.base_url} (Ctrl+C to stop)")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,886 @@
+import os
+import re
+import time
+import contextlib
+from functools import partial
+from typing import TYPE_CHECKING, Optional
+
+from rich.text import Text
+from textual.app import App, ComposeResult
+from textual.containers import VerticalScroll
+from textual.message import Message
+from textual.screen import Screen
+from textual.timer import Timer
+from textual.worker import get_current_worker
+from textual.widgets import (Footer, Header, Input, ListItem, ListView,
+                             Static)
+
+# 导入我们自己的模块
+# downloader (requests/BeautifulSoup/lxml) 和 player (libmpv) 较重，推迟到首次使用时再导入
+from . import metrics
+from .browser import FileBrowserScreen
+from .ipc import ControlClient, RemotePlayer
+from .monitor import MetricsScreen, StatsScreen
+from .playlist import Playlist, Song, SUPPORTED_EXTENSIONS
+from .playqueue import CHECKPOINT_INTERVAL, PlayQueue
+from .scheduler import BULK, INTERACTIVE, DownloadScheduler, Job
+from .uiupdates import PlaybackClock, UIUpdateCoordinator
+
+if TYPE_CHECKING:
+    from .player import Player
+
+# 目录/歌单导入时每批追加到播放列表的歌曲数
+IMPORT_BATCH_SIZE = 500
+PLAYLIST_EXTENSIONS = (".m3u", ".m3u8")
+
+# --- 自定义 ListItem 和消息 ---
+class SongItem(ListItem):
+    class Clicked(Message):
+        def __init__(self, item: "SongItem") -> None:
+            self.item = item
+            super().__init__()
+    def __init__(self, song: Song, missing: bool = False):
+        super().__init__(Static(song.title))
+        self.song_data = song
+        self.set_class(missing, "missing")
+    def on_click(self) -> None:
+        self.post_message(self.Clicked(self))
+
+# --- 歌词屏幕 ---
+class LyricsScreen(Screen):
+    BINDINGS = [("escape", "app.pop_screen", "Back"), ("l", "app.pop_screen", "Back"), ("left", "decrease_offset", "Offset -0.1s"), ("right", "increase_offset", "Offset +0.1s")]
+    def __init__(self, player: "Player", current_song: Optional[Song] = None):
+        super().__init__(); self.player = player; self.current_song = current_song
+        self.lyrics: list[tuple[float, str]] = []; self.current_line_index = -1; self.lyrics_offset = 0.0
+        self.update_timer = self.set_interval(1 / 10, self.update_highlight, pause=True)
+    def _parse_lrc(self, lrc_content: str) -> list[tuple[float, str]]:
+        parsed_lyrics = [];
+        for line in lrc_content.splitlines():
+            match = re.match(r'\[(\d{2}):(\d{2})\.(\d{2,3})\](.*)', line)
+            if match:
+                minutes, seconds, ms, text = match.groups()
+                ms_normalized = ms.ljust(3, '0')
+                time_in_seconds = int(minutes) * 60 + int(seconds) + int(ms_normalized) / 1000.0
+                parsed_lyrics.append((time_in_seconds, text.strip()))
+        return sorted(parsed_lyrics)
+    def update_highlight(self) -> None:
+        if not self.lyrics: return
+        # 用进度条共用的外推时钟，不在 10Hz 的定时器里询问播放器（连接守护进程时那是一次阻塞的 IPC）
+        current_time = self.app.playback_clock.now() - self.lyrics_offset; new_line_index = -1
+        for i, (time, text) in enumerate(self.lyrics):
+            if current_time >= time: new_line_index = i
+        if new_line_index != self.current_line_index:
+            self.current_line_index = new_line_index; new_content = ""
+            for i, (time, text) in enumerate(self.lyrics):
+                line_text = text or '♪'
+                if i == self.current_line_index: new_content += f"[reverse]{line_text}[/reverse]\n"
+                else: new_content += f"{line_text}\n"
+            self.query_one("#lyrics_text", Static).update(new_content)
+    def action_increase_offset(self): self.lyrics_offset += 0.1; self.app.ui.set("sub_title", f"Offset: {self.lyrics_offset:.1f}s")
+    def action_decrease_offset(self): self.lyrics_offset -= 0.1; self.app.ui.set("sub_title", f"Offset: {self.lyrics_offset:.1f}s")
+    def compose(self) -> ComposeResult:
+        yield Header(name="Lyrics Viewer");
+        with VerticalScroll(id="lyrics_container"): yield Static("Loading lyrics...", id="lyrics_text")
+        yield Footer()
+    def on_mount(self) -> None:
+        lyrics_widget = self.query_one("#lyrics_text", Static)
+        if not self.current_song: lyrics_widget.update("No song is currently playing."); return
+        self.app.ui.set("sub_title", self.current_song.title)
+        lrc_path = os.path.splitext(self.current_song.path)[0] + ".lrc"
+        if os.path.exists(lrc_path):
+            try:
+                with open(lrc_path, 'r', encoding='utf-8') as f: lrc_content = f.read()
+                self.lyrics = self._parse_lrc(lrc_content)
+                if not self.lyrics: lyrics_widget.update(lrc_content or "Invalid format.")
+                else: self.update_timer.resume()
+            except Exception as e: lyrics_widget.update(f"Error reading lyrics file:\n{e}")
+        else: lyrics_widget.update("No lyrics file (.lrc) found for this song.")
+    def on_unmount(self) -> None: self.update_timer.pause()
+
+# --- 命令屏幕 ---
+class CommandScreen(Screen):
+    BINDINGS = [("escape", "app.pop_screen", "Back")]
+    def __init__(self, prompt: str, initial_value: str, callback):
+        super().__init__(); self.prompt = prompt; self.initial_value = initial_value; self.callback = callback
+    def compose(self) -> ComposeResult:
+        yield Static(self.prompt, id="command_prompt"); yield Input(self.initial_value, id="command_input"); yield Footer()
+    def on_mount(self) -> None: self.query_one(Input).focus()
+    def on_input_submitted(self, event: Input.Submitted) -> None:
+        self.app.pop_screen();
+        if self.callback: self.callback(event.value)
+
+# --- 搜索屏幕 ---
+class SearchScreen(Screen):
+    BINDINGS = [
+        ("escape", "app.pop_screen", "Back"),
+        ("n", "next_page", "Next Page"),
+        ("p", "previous_page", "Prev Page"),
+        ("a", "download_all", "Download All"),
+    ]
+    # 输入停顿多久后才发起搜索（秒）
+    SEARCH_DEBOUNCE = 0.3
+
+    def __init__(self):
+        super().__init__()
+        self.current_page = 1
+        self.total_pages = 1
+        self.current_query = ""
+        self.last_click_time = 0
+        self.last_clicked_item = None
+        # 每发起一次搜索加一，结果返回时据此丢弃已被新输入取代的旧结果
+        self.search_generation = 0
+        self.search_errors: list[str] = []
+        self.focus_results_on_finish = False
+        self._debounce_timer: Optional[Timer] = None
+
+    def compose(self) -> ComposeResult:
+        yield Header(name="Search Online Music")
+        yield Input(placeholder="Enter song or artist name...")
+        with VerticalScroll(id="search_results_view"):
+            yield ListView(id="search_results_list")
+        yield Footer()
+
+    def on_mount(self) -> None:
+        self.query_one(Input).focus()
+
+    def start_search(self, query: str, page: int = 1, focus_results: bool = True) -> None:
+        self.search_generation += 1
+        self.focus_results_on_finish = focus_results
+        self.app.ui.set("sub_title", f"Searching for '{query}' on page {page}...")
+        # exclusive=True：同组内只保留最新的一个搜索任务，旧任务被标记为取消
+        self.run_worker(partial(self.search_worker, query, page, self.search_generation),
+                        name="search", group="search", thread=True, exclusive=True, exit_on_error=False)
+
+    def _cancel_debounce(self) -> None:
+        if self._debounce_timer is not None:
+            self._debounce_timer.stop()
+            self._debounce_timer = None
+
+    def on_input_changed(self, event: Input.Changed) -> None:
+        """边输入边搜索：每次按键重置防抖计时器，停顿后才真正发请求。"""
+        self._cancel_debounce()
+        query = event.value.strip()
+        if not query:
+            # 输入被清空：让进行中的搜索结果作废
+            self.search_generation += 1
+            self.current_query = ""
+            self.query_one("#search_results_list", ListView).clear()
+            return
+        self._debounce_timer = self.set_timer(self.SEARCH_DEBOUNCE, partial(self._search_as_you_type, query))
+
+    def _search_as_you_type(self, query: str) -> None:
+        self._debounce_timer = None
+        if query == self.current_query and self.current_page == 1:
+            return
+        self.current_query = query
+        self.current_page = 1
+        self.total_pages = 1
+        # 输入过程中不抢焦点，用户可以继续输入
+        self.start_search(query, 1, focus_results=False)
+
+    def on_input_submitted(self, event: Input.Submitted) -> None:
+        self._cancel_debounce()
+        self.current_query = event.value.strip()
+        if not self.current_query:
+            return
+        self.current_page = 1
+        self.total_pages = 1
+        self.start_search(self.current_query, self.current_page)
+
+    def search_worker(self, query: str, page: int, generation: int):
+        from . import providers
+        worker = get_current_worker()
+        start = time.perf_counter()
+
+        def on_update(update) -> None:
+            # 每个来源一返回就推送到界面，已被新输入取代的结果直接丢弃
+            if worker.is_cancelled or generation != self.search_generation:
+                metrics.counter("search.superseded").inc()
+                return
+            if update.first:
+                metrics.histogram("search.first_result.ms").observe((time.perf_counter() - start) * 1000)
+            self.app.call_from_thread(self.app.on_search_finished, update, generation)
+
+        providers.search_all(query, page, on_update)
+        metrics.histogram("search.latency.ms").observe((time.perf_counter() - start) * 1000)
+
+    def download_one(self, song_data: dict, job: Job) -> Song:
+        """在调度器的工作线程中下载一首歌。"""
+        from . import providers
+        title, path, _cached = providers.fetch(song_data, self.app.downloads_dir, on_chunk=job.throttle)
+        return Song(title=title, path=path)
+
+    def submit_downloads(self, songs_to_download: list[dict], priority: int) -> None:
+        """把一组下载交给调度器，全部完成后统一回调 on_download_finished。"""
+        app = self.app
+
+        def on_complete(jobs: list[Job]) -> None:
+            if not app.is_running:
+                # 退出时 shutdown() 取消了正在下载的任务，界面已经不在了
+                return
+            downloaded_songs = []
+            errors = []
+            for song_data, job in zip(songs_to_download, jobs):
+                if job.error is None:
+                    downloaded_songs.append(job.result)
+                else:
+                    app.log(f"Download failed for {song_data.get('title', 'N/A')}: {job.error}")
+                    errors.append(song_data["title"])
+            app.call_from_thread(app.on_download_finished, (downloaded_songs, errors))
+
+        fns = [partial(self.download_one, song_data) for song_data in songs_to_download]
+        app.download_scheduler.submit_batch(fns, priority, on_complete)
+
+    def _trigger_download(self, item: ListItem):
+        if not hasattr(item, "song_data"): return
+        song_data = item.song_data
+        self.app.ui.set("sub_title", f"Downloading '{song_data['title']}'...")
+        # 用户主动点选的歌曲优先级最高，正在进行的整页下载会暂停让路
+        self.submit_downloads([song_data], INTERACTIVE)
+
+    def on_list_view_highlighted(self, event: ListView.Highlighted) -> None:
+        if event.item and hasattr(event.item, "song_data"):
+            self.app.ui.set("sub_title", f"Selected: {event.item.song_data['title']}")
+
+    def on_song_item_clicked(self, event: SongItem.Clicked) -> None:
+        current_click_time = time.time()
+        if (current_click_time - self.last_click_time < 0.5) and (self.last_clicked_item is event.item):
+            self._trigger_download(event.item)
+        self.last_click_time = current_click_time
+        self.last_clicked_item = event.item
+
+    def action_next_page(self) -> None:
+        if self.current_page < self.total_pages:
+            self.current_page += 1
+            self.start_search(self.current_query, self.current_page)
+
+    def action_previous_page(self) -> None:
+        if self.current_page > 1:
+            self.current_page -= 1
+            self.start_search(self.current_query, self.current_page)
+
+    def action_download_all(self) -> None:
+        list_view = self.query_one("#search_results_list", ListView)
+        songs_on_page = [child.song_data for child in list_view.children if hasattr(child, "song_data")]
+        if not songs_on_page: return
+        self.app.ui.set("sub_title", f"Queueing {len(songs_on_page)} songs for download...")
+        self.submit_downloads(songs_on_page, BULK)
+
+# --- 主应用 ---
+class MocPlusApp(App):
+    BINDINGS = [
+        ("q", "quit", "Quit"),
+        ("/", "push_screen('search')", "Search"),
+        ("p", "toggle_pause", "Play/Pause"),
+        ("space", "toggle_pause", "Play/Pause"),
+        ("l", "toggle_lyrics", "Show Lyrics"),
+        ("delete", "delete_song", "Delete Song"),
+        ("c", "clear_playlist", "Clear Playlist"),
+        ("s", "show_save_screen", "Save Playlist"),
+        ("o", "push_screen('browser')", "Open..."),
+        ("enter", "select_song", "Play Selected"),
+        ("n", "next_track", "Next"),
+        ("b", "previous_track", "Previous"),
+        ("z", "toggle_shuffle", "Shuffle"),
+        ("e", "enqueue_song", "Play Next"),
+        ("m", "push_screen('metrics')", "Metrics"),
+        ("h", "push_screen('stats')", "Stats"),
+        ("x", "cancel_import", "Cancel Import"),
+    ]
+    SCREENS = {"search": SearchScreen, "command": CommandScreen, "lyrics": LyricsScreen, "browser": FileBrowserScreen, "metrics": MetricsScreen, "stats": StatsScreen}
+    CSS_PATH = "tui.css"
+    # 播放进度条：播放中每秒走一格，暂停/空闲时只偶尔同步一次
+    NOW_PLAYING_IDLE_INTERVAL = 5.0
+    # 连接守护进程时，进度在两次 IPC 采样之间按本地时钟外推
+    REMOTE_SYNC_INTERVAL = 5.0
+
+    def __init__(self):
+        super().__init__()
+        # 状态栏、副标题和进度条的修改都经过协调器，按帧合并渲染
+        self.ui = UIUpdateCoordinator(self)
+        self.playback_clock = PlaybackClock()
+        self._now_playing_timer: Optional[Timer] = None
+        self.player: Optional["Player | RemotePlayer"] = None
+        self.playlist = Playlist()
+        # 本地播放时使用；连接守护进程时由守护进程的队列负责
+        self.play_queue = PlayQueue(self.playlist.songs)
+        # 守护进程当前持有的播放列表 [(标题, 路径)]，没有本地修改时不再推送
+        self.daemon_songs: Optional[list[tuple[str, str]]] = None
+        
+        # --- 路径管理 ---
+        self.config_dir = os.path.expanduser("~/.mpvs")
+        self.default_playlist_path = os.path.join(self.config_dir, "default.m3u")
+        self.current_playlist_path = self.default_playlist_path
+        self.downloads_dir = os.path.expanduser('~/music/mpvs')
+        self.download_scheduler = DownloadScheduler.from_env()
+        
+        # --- 状态变量 ---
+        self.last_click_time = 0
+        self.last_clicked_item = None
+        self.import_generation = 0
+        self.import_seen_paths: set[str] = set()
+        self.import_added = 0
+        self.import_scanned = 0
+        # 文件监视器报告为已删除/移走的播放列表条目
+        self.file_watcher = None
+        self.missing_paths: set[str] = set()
+
+        # --- 初始化检查 ---
+        os.makedirs(self.config_dir, exist_ok=True)
+        os.makedirs(self.downloads_dir, exist_ok=True)
+        if not os.path.exists(self.default_playlist_path):
+            with open(self.default_playlist_path, "w", encoding="utf-8") as f:
+                f.write("#EXTM3U\n")
+
+    def compose(self) -> ComposeResult:
+        yield Header(name="MOC-Plus Terminal Player")
+        yield Static(id="status_bar")
+        with VerticalScroll(id="playlist_view"):
+            yield ListView(id="playlist_listview")
+        yield Static(id="now_playing")
+        yield Footer()
+
+    @property
+    def status_text(self) -> str:
+        return self.ui.get("status", "")
+
+    @status_text.setter
+    def status_text(self, text: str) -> None:
+        self.ui.set("status", text)
+
+    def on_mount(self) -> None:
+        self.ui.register("status", self.query_one("#status_bar", Static).update)
+        self.ui.register("sub_title", partial(setattr, self, "sub_title"))
+        self.ui.register("now_playing", lambda now_playing: self.query_one("#now_playing", Static).update(Text(now_playing.render())))
+        self.status_text = "STATUS: Welcome to MOC-Plus!"
+        client = ControlClient.try_connect()
+        if client is not None:
+            # 已有后台守护进程：作为瘦客户端连接，保证只有一个 mpv 实例占用音频设备
+            self.player = RemotePlayer(client)
+            self._attach_to_daemon()
+        else:
+            try:
+                from .player import Player
+                self.player = Player()
+                self.player.on_track_end(self._on_track_end)
+            except (RuntimeError, OSError) as e:
+                # mpv 未安装等情况时给出提示，但仍允许浏览/管理播放列表
+                self.player = None
+                self.status_text = str(e)
+            self.action_load_playlist(self.default_playlist_path)
+            self._resume_from_checkpoint()
+            self.set_interval(CHECKPOINT_INTERVAL, self._checkpoint_queue)
+        self.query_one("#playlist_listview").focus()
+        self._start_file_watcher()
+        self.maintain_downloads(clean=True)
+        self.refresh_now_playing(delay=0)
+
+    def _start_file_watcher(self) -> None:
+        from .watcher import FileWatcher, music_roots
+        self.file_watcher = FileWatcher(
+            music_roots(self.downloads_dir),
+            lambda events: self.call_from_thread(self.on_files_changed, events),
+        ).start()
+
+    def _resume_from_checkpoint(self) -> None:
+        """从上次退出时的检查点恢复：选中同一首歌，若当时在播放则从同一位置继续。"""
+        restored = self.play_queue.restore()
+        if restored is None:
+            return
+        index, position, paused = restored
+        song = self.playlist.songs[index]
+        self.query_one("#playlist_listview", ListView).index = index
+        if self.player and not paused and os.path.exists(song.path):
+            self.player.play(song.path, start=position)
+            self.refresh_now_playing()
+            self.status_text = f"Resumed: {song.title} at {int(position) // 60}:{int(position) % 60:02d}"
+
+    def _checkpoint_queue(self, force: bool = False) -> None:
+        if self.player and not isinstance(self.player, RemotePlayer):
+            self.play_queue.checkpoint(self.player.get_current_time(), self.player.is_paused(), force=force)
+
+    def _sample_player(self) -> None:
+        """采样播放器状态。本地播放器的查询只是读取 mpv 回调缓存的字段；守护进程则是一次 IPC。"""
+        if isinstance(self.player, RemotePlayer):
+            status = self.player.get_status()
+            self.playback_clock.update(status.get("title"), status.get("time"), status.get("duration"),
+                                       bool(status.get("paused", True)))
+            return
+        index = self.play_queue.index_of(self.play_queue.current)
+        title = self.playlist.songs[index].title if index is not None else None
+        if self.player:
+            self.playback_clock.update(title or self.player.get_current_song_title(), self.player.get_current_time(),
+                                       self.player.get_duration(), self.player.is_paused())
+
+    def _tick_now_playing(self) -> None:
+        remote = isinstance(self.player, RemotePlayer)
+        if not remote or self.playback_clock.age() >= self.REMOTE_SYNC_INTERVAL:
+            self._sample_player()
+        clock = self.playback_clock
+        self.ui.set("now_playing", clock.snapshot())
+        if clock.paused or not clock.title:
+            delay = self.NOW_PLAYING_IDLE_INTERVAL
+        else:
+            # 对齐到下一个整秒，每秒只重绘一次
+            delay = 1.0 - clock.now() % 1.0 + 0.01
+        self._now_playing_timer = self.set_timer(delay, self._tick_now_playing)
+
+    def refresh_now_playing(self, delay: float = 0.2) -> None:
+        """播放状态刚被用户改变：稍后（等 mpv 加载完文件）重新采样并更新进度条。"""
+        if self._now_playing_timer is not None:
+            self._now_playing_timer.stop()
+        self.playback_clock.sampled_at = float("-inf")
+        if delay > 0:
+            self._now_playing_timer = self.set_timer(delay, self._tick_now_playing)
+        else:
+            self._now_playing_timer = None
+            self.call_later(self._tick_now_playing)
+
+    def _on_track_end(self) -> None:
+        # 在 mpv 的事件线程中调用；应用退出过程中可能已经无法投递
+        with contextlib.suppress(RuntimeError):
+            self.call_from_thread(self.action_next_track)
+
+    def _attach_to_daemon(self) -> None:
+        """从守护进程镜像播放列表和当前位置。"""
+        songs, index = self.player.get_playlist()
+        self.daemon_songs = [(title, path) for title, path in songs]
+        self.playlist.songs[:] = [Song(title=title, path=path) for title, path in songs]
+        self.playlist.current_selection_index = index
+        self._update_playlist_view()
+        if self.playlist.songs:
+            self.query_one("#playlist_listview", ListView).index = min(index, len(self.playlist.songs) - 1)
+        status = self.player.get_status()
+        title = status.get("title") or "nothing"
+        self.status_text = f"Attached to background player. Now playing: {title}"
+
+    def _sync_daemon_playlist(self) -> None:
+        """
+        作为瘦客户端运行时，把播放列表的修改同步给守护进程。
+        每次刷新播放列表视图都会调用，但只有本地修改过时才发起（阻塞的）IPC 请求，
+        刚从守护进程镜像来的列表不会原样发回去。
+        """
+        if isinstance(self.player, RemotePlayer):
+            songs = [(song.title, song.path) for song in self.playlist.songs]
+            if songs == self.daemon_songs:
+                return
+            self.player.set_playlist(songs, self.playlist.current_selection_index)
+            self.daemon_songs = songs
+
+    def on_search_finished(self, update, generation: int) -> None:
+        """合并某个来源返回的增量结果 (providers.SearchUpdate)。"""
+        if not isinstance(self.screen, SearchScreen): return
+        search_screen = self.screen
+        if generation != search_screen.search_generation:
+            # 结果已被更新的输入取代
+            metrics.counter("search.superseded").inc()
+            return
+        list_view = search_screen.query_one("#search_results_list", ListView)
+        if update.first:
+            list_view.clear()
+            search_screen.search_errors = []
+        if update.error is not None:
+            search_screen.search_errors.append(f"{update.provider}: {update.error}")
+        for song in update.songs:
+            list_item = SongItem(Song(title=song['title'], path=""))
+            list_item.song_data = song
+            list_view.append(list_item)
+
+        search_screen.total_pages = update.total_pages
+        has_results = any(hasattr(child, "song_data") for child in list_view.children)
+        if update.done and not has_results:
+            if search_screen.search_errors:
+                self.ui.set("sub_title", f"Search failed: {'; '.join(search_screen.search_errors)}")
+                list_view.append(ListItem(Static(f"Error: {'; '.join(search_screen.search_errors)}")))
+            else:
+                self.ui.set("sub_title", "No results found.")
+                list_view.append(ListItem(Static("No results found.")))
+        else:
+            sub_title = f"Found {update.total_songs} songs | Page {search_screen.current_page}/{update.total_pages}"
+            if update.pending:
+                sub_title += f" | waiting for {update.pending} more source(s)"
+            if search_screen.search_errors:
+                sub_title += f" | {len(search_screen.search_errors)} source(s) failed"
+            self.ui.set("sub_title", sub_title)
+        if update.done and search_screen.focus_results_on_finish:
+            list_view.focus()
+
+    def on_download_finished(self, result) -> None:
+        downloaded_songs, errors = result
+        added_count = 0
+        for song in downloaded_songs:
+            if not any(p_song.path == song.path for p_song in self.playlist.songs):
+                self.playlist.songs.append(song)
+                added_count += 1
+        
+        downloaded_count = len(downloaded_songs)
+        if errors:
+            self.ui.set("sub_title", f"Completed. Downloaded {downloaded_count}. {len(errors)} failed.")
+        else:
+            self.ui.set("sub_title", f"Successfully downloaded {downloaded_count} song(s).")
+
+        if isinstance(self.screen, SearchScreen):
+            self.pop_screen()
+
+        self._update_playlist_view()
+        if added_count > 0:
+            self.status_text = f"Added {added_count} new song(s). Press 's' to save."
+        else:
+            self.status_text = "Download complete. No new songs added to playlist."
+        if downloaded_songs:
+            self.maintain_downloads(clean=False)
+
+    def maintain_downloads(self, clean: bool) -> None:
+        """在后台清理下载目录并执行磁盘配额；当前播放列表和正在播放的歌曲受保护。"""
+        protected = [song.path for song in self.playlist.songs]
+        if self.play_queue.current:
+            protected.append(self.play_queue.current)
+        self.run_worker(partial(self.quota_worker, protected, clean), group="quota", thread=True,
+                        exit_on_error=False)
+
+    def quota_worker(self, protected: list[str], clean: bool) -> None:
+        from .quota import maintain
+        report = maintain(self.downloads_dir, protected, clean=clean)
+        if report.evicted or report.orphans:
+            self.call_from_thread(self._on_downloads_maintained, report)
+
+    def _on_downloads_maintained(self, report) -> None:
+        parts = []
+        if report.evicted:
+            parts.append(f"evicted {report.evicted} least recently played song(s)")
+        if report.orphans:
+            parts.append(f"removed {report.orphans} leftover file(s)")
+        self.ui.set("sub_title", f"Download cache: {', '.join(parts)}, freed {report.freed / 1024 / 1024:.1f} MB")
+
+    def _analyze_loudness(self) -> None:
+        """本地播放时在后台分析播放列表的响度；只有新加入播放列表的文件会被提交，已缓存的文件会被跳过。"""
+        if self.player and not isinstance(self.player, RemotePlayer):
+            self.player.analyze([song.path for song in self.playlist.songs])
+
+    def _update_playlist_view(self):
+        self._sync_daemon_playlist()
+        self.play_queue.sync()
+        self._analyze_loudness()
+        start = time.perf_counter()
+        list_view = self.query_one("#playlist_listview", ListView)
+        previous_index = list_view.index
+        list_view.clear()
+        if not self.playlist.songs:
+            list_view.append(ListItem(Static("Playlist is empty.")))
+        else:
+            for song in self.playlist.songs:
+                list_view.append(SongItem(song, missing=song.path in self.missing_paths))
+            if previous_index is not None:
+                list_view.index = min(previous_index, len(self.playlist.songs) - 1)
+        metrics.gauge("playlist.size").set(len(self.playlist.songs))
+        metrics.histogram("ui.playlist_rebuild.ms").observe((time.perf_counter() - start) * 1000)
+
+    def action_clear_playlist(self) -> None:
+        self.playlist.clear()
+        self.playlist.save_m3u(self.current_playlist_path)
+        self._update_playlist_view()
+        self.status_text = f"Playlist cleared and saved to {os.path.basename(self.current_playlist_path)}"
+
+    def action_show_save_screen(self):
+        self.push_screen(CommandScreen("Save playlist as:", self.current_playlist_path, self.action_save_playlist))
+
+    def action_load_playlist(self, path: str):
+        self.current_playlist_path = path
+        self.playlist.load_m3u(self.current_playlist_path)
+        self._update_playlist_view()
+        self.status_text = f"Loaded playlist from {os.path.basename(self.current_playlist_path)}"
+
+    def action_save_playlist(self, path: str):
+        self.current_playlist_path = path
+        self.playlist.save_m3u(self.current_playlist_path)
+        self.status_text = f"Playlist saved to {os.path.basename(self.current_playlist_path)}"
+
+    def action_toggle_lyrics(self) -> None:
+        if isinstance(self.screen, LyricsScreen):
+            self.pop_screen()
+        else:
+            list_view = self.query_one("#playlist_listview", ListView)
+            if list_view.highlighted_child and hasattr(list_view.highlighted_child, 'song_data'):
+                current_song = list_view.highlighted_child.song_data
+                self.push_screen(LyricsScreen(self.player, current_song))
+            else:
+                self.status_text = "Select a song to show lyrics."
+
+    def action_delete_song(self) -> None:
+        list_view = self.query_one("#playlist_listview", ListView)
+        if list_view.highlighted_child is None: return
+        index_to_delete = list_view.index
+        if index_to_delete is None: return
+        self.playlist.delete_song(index_to_delete)
+        self._update_playlist_view()
+        if self.playlist.songs:
+            new_index = min(index_to_delete, len(self.playlist.songs) - 1)
+            list_view.index = new_index
+        self.status_text = "Song removed. Press 's' to save changes."
+
+    def action_toggle_pause(self) -> None:
+        if self.player:
+            self.player.toggle_pause()
+            self.refresh_now_playing(delay=0.05)
+
+    def on_list_view_highlighted(self, event: ListView.Highlighted) -> None:
+        if event.list_view.id == "playlist_listview":
+            if event.item and hasattr(event.item, 'song_data'):
+                self.status_text = f"Selected: {event.item.song_data.title}"
+            # 同步内部播放列表选择索引以保持一致
+            if event.list_view.index is not None:
+                self.playlist.current_selection_index = event.list_view.index
+
+    def on_song_item_clicked(self, event: SongItem.Clicked) -> None:
+        if isinstance(event.item.parent, ListView) and event.item.parent.id == "search_results_list":
+            current_click_time = time.time()
+            if (current_click_time - self.last_click_time < 0.5) and (self.last_clicked_item is event.item):
+                if hasattr(event.item, "song_data"):
+                    self.screen._trigger_download(event.item)
+            self.last_click_time = current_click_time
+            self.last_clicked_item = event.item
+            return
+
+        if isinstance(event.item.parent, ListView) and event.item.parent.id == "playlist_listview":
+            current_click_time = time.time()
+            if (current_click_time - self.last_click_time < 0.5) and (self.last_clicked_item is event.item):
+                if hasattr(event.item, 'song_data'):
+                    self.action_select_song()
+            self.last_click_time = current_click_time
+            self.last_clicked_item = event.item
+
+    def action_select_song(self) -> None:
+        list_view = self.query_one("#playlist_listview", ListView)
+        if list_view.highlighted_child and hasattr(list_view.highlighted_child, 'song_data'):
+            song_to_play: Song = list_view.highlighted_child.song_data
+            if not os.path.exists(song_to_play.path):
+                self.status_text = "File not found. It may have been moved or deleted."
+                return
+            if self.player:
+                self.play_queue.jump(list_view.index)
+                self.player.play(song_to_play.path)
+                self._checkpoint_queue(force=True)
+                self.refresh_now_playing()
+                self.status_text = f"Playing: {song_to_play.title}"
+
+    def _play_from_queue(self, backwards: bool = False) -> None:
+        if isinstance(self.player, RemotePlayer):
+            # 守护进程维护自己的队列，这里只转发命令并同步高亮
+            if backwards:
+                self.player.previous()
+            else:
+                self.player.next()
+            status = self.player.get_status()
+            if status.get("index") is not None and self.playlist.songs:
+                self.query_one("#playlist_listview", ListView).index = min(int(status["index"]), len(self.playlist.songs) - 1)
+            self.status_text = f"Playing: {status.get('title') or 'nothing'}"
+            self.refresh_now_playing()
+            return
+        index = self.play_queue.advance(backwards)
+        if index is None:
+            self.status_text = "Nothing to play."
+            return
+        song = self.playlist.songs[index]
+        self.query_one("#playlist_listview", ListView).index = index
+        if self.player:
+            self.player.play(song.path)
+            self._checkpoint_queue(force=True)
+            self.refresh_now_playing()
+        self.status_text = f"Playing: {song.title}"
+
+    def action_next_track(self) -> None:
+        self._play_from_queue()
+
+    def action_previous_track(self) -> None:
+        self._play_from_queue(backwards=True)
+
+    def action_toggle_shuffle(self) -> None:
+        if isinstance(self.player, RemotePlayer):
+            enabled = self.player.set_shuffle()
+        else:
+            self.play_queue.set_shuffle(not self.play_queue.shuffle)
+            enabled = self.play_queue.shuffle
+        self.status_text = f"Shuffle {'on' if enabled else 'off'}."
+
+    def action_enqueue_song(self) -> None:
+        list_view = self.query_one("#playlist_listview", ListView)
+        if not (list_view.highlighted_child and hasattr(list_view.highlighted_child, 'song_data')): return
+        song: Song = list_view.highlighted_child.song_data
+        if isinstance(self.player, RemotePlayer):
+            self.player.enqueue(song.path)
+        else:
+            self.play_queue.enqueue(song.path)
+        self.status_text = f"Playing next: {song.title}"
+
+    def on_list_view_selected(self, event: ListView.Selected) -> None:
+        """当列表项通过 Enter 被选择时触发。
+        在播放列表中按回车时，开始播放当前高亮歌曲。
+        """
+        if event.list_view.id == "playlist_listview":
+            # 如果是鼠标单击导致的选中，Textual 同样会派发 Selected 事件。
+            # 为了避免单击即播放，这里检测最近一次点击时间并忽略该事件，
+            # 仅保留键盘 Enter 或双击触发的播放。
+            if (time.time() - self.last_click_time) < 0.3 and (self.last_clicked_item is getattr(event, 'item', None)):
+                event.stop()
+                return
+            self.action_select_song()
+            event.stop()
+
+    def action_quit(self) -> None:
+        self.status_text = "Saving current playlist..."
+        self.playlist.save_m3u(self.current_playlist_path)
+        self.download_scheduler.shutdown()
+        if self.file_watcher: self.file_watcher.stop()
+        self._checkpoint_queue(force=True)
+        if self.player: self.player.quit()
+        self.exit("Playlist saved. Goodbye!")
+    
+    def add_path_to_playlist(self, path: str):
+        if os.path.isdir(path) or path.lower().endswith(PLAYLIST_EXTENSIONS):
+            self.pop_screen() # 目录和歌单在后台导入，先返回主屏幕
+            self.start_import(path)
+            return
+
+        added_count = 0
+        initial_count = len(self.playlist.songs)
+
+        if os.path.isfile(path):
+            if any(path.lower().endswith(ext) for ext in SUPPORTED_EXTENSIONS):
+                if not any(song.path == path for song in self.playlist.songs):
+                    title = os.path.splitext(os.path.basename(path))[0]
+                    self.playlist.songs.append(Song(title=title, path=path))
+        
+        added_count = len(self.playlist.songs) - initial_count
+        if added_count > 0:
+            self.status_text = f"Added {added_count} song(s). Press 's' to save."
+            self._update_playlist_view()
+        else:
+            self.status_text = "No new songs were added."
+        self.pop_screen() # 添加后自动返回主屏幕
+
+    # --- 文件系统变化 ---
+
+    def on_files_changed(self, events) -> None:
+        """把文件监视器合并后的变化（watcher.FileEvent 列表）同步到播放列表和文件浏览器。"""
+        from .watcher import CREATED, DELETED, MOVED, OVERFLOW
+        songs = self.playlist.songs
+        missing_before = len(self.missing_paths)
+        moved = 0
+        changed_dirs: set[str] = set()
+
+        if any(event.kind == OVERFLOW for event in events):
+            # 事件丢失，只能逐个核对（仍然只是 stat，不重新扫描目录）
+            self.missing_paths = {song.path for song in songs if not os.path.exists(song.path)}
+            changed_dirs.add("*")
+        else:
+            by_path: dict[str, list[Song]] = {}
+            for song in songs:
+                by_path.setdefault(song.path, []).append(song)
+
+            def affected(path: str, is_dir: bool) -> list[Song]:
+                if not is_dir:
+                    return by_path.get(path, [])
+                prefix = path + os.sep
+                return [song for song in songs if song.path.startswith(prefix)]
+
+            for event in events:
+                changed_dirs.add(os.path.dirname(event.path))
+                if event.kind == MOVED:
+                    changed_dirs.add(os.path.dirname(event.dest))
+                    for song in affected(event.path, event.is_dir):
+                        new_path = event.dest + song.path[len(event.path):]
+                        self.missing_paths.discard(song.path)
+                        song.path = new_path
+                        by_path.setdefault(new_path, []).append(song)
+                        moved += 1
+                elif event.kind == DELETED:
+                    self.missing_paths.update(song.path for song in affected(event.path, event.is_dir))
+                elif event.kind == CREATED:
+                    self.missing_paths.difference_update(song.path for song in affected(event.path, event.is_dir))
+
+        list_view = self.query_one("#playlist_listview", ListView)
+        for item in list_view.children:
+            if isinstance(item, SongItem):
+                item.set_class(item.song_data.path in self.missing_paths, "missing")
+        if moved:
+            self._sync_daemon_playlist()
+            self.play_queue.sync()
+        newly_missing = len(self.missing_paths) - missing_before
+        if moved or newly_missing:
+            parts = []
+            if moved: parts.append(f"{moved} moved")
+            if newly_missing > 0: parts.append(f"{newly_missing} missing")
+            elif newly_missing < 0: parts.append(f"{-newly_missing} restored")
+            self.status_text = f"Files changed on disk: {', '.join(parts)}."
+
+        if isinstance(self.screen, FileBrowserScreen):
+            self.screen.refresh_if_changed(changed_dirs)
+
+    # --- 目录导入 ---
+
+    def start_import(self, root: str) -> None:
+        """在后台线程中递归扫描目录（或流式解析歌单），分批追加到播放列表。按 'x' 取消。"""
+        self.import_generation += 1
+        self.import_seen_paths = {song.path for song in self.playlist.songs}
+        self.import_added = 0
+        self.import_scanned = 0
+        self.status_text = f"Importing {os.path.basename(root) or root}... (press 'x' to cancel)"
+        self.run_worker(partial(self.import_worker, root, self.import_generation), group="import", thread=True,
+                        exclusive=True, exit_on_error=False)
+
+    def import_worker(self, root: str, generation: int) -> None:
+        worker = get_current_worker()
+        start = time.perf_counter()
+        if os.path.isdir(root):
+            from .library import scan_in_batches
+            batches = ([Song(title=os.path.splitext(os.path.basename(p))[0], path=p) for p in paths]
+                       for paths in scan_in_batches(root, IMPORT_BATCH_SIZE, cancelled=lambda: worker.is_cancelled))
+        else:
+            from .m3u import iter_m3u_batches
+            # stat 放在工作线程里做，不阻塞界面
+            batches = ([Song(title=e.title, path=e.path, duration=e.duration) for e in entries if os.path.exists(e.path)]
+                       for entries in iter_m3u_batches(root, IMPORT_BATCH_SIZE))
+        for batch in batches:
+            if worker.is_cancelled: break
+            self.call_from_thread(self._on_import_batch, batch, generation)
+        metrics.histogram("library.import.ms").observe((time.perf_counter() - start) * 1000)
+        if not worker.is_cancelled:
+            self.call_from_thread(self._on_import_finished, False, generation)
+
+    def _on_import_batch(self, songs: list[Song], generation: int) -> None:
+        """追加一批歌曲。只向列表末尾追加新条目，不重建整个视图。"""
+        if generation != self.import_generation: return # 已取消或被新的导入取代
+        self.import_scanned += len(songs)
+        new_songs = []
+        for song in songs:
+            if song.path in self.import_seen_paths: continue
+            self.import_seen_paths.add(song.path)
+            new_songs.append(song)
+        if new_songs:
+            list_view = self.query_one("#playlist_listview", ListView)
+            if not self.playlist.songs:
+                list_view.clear() # 去掉 "Playlist is empty." 占位项
+            self.playlist.songs.extend(new_songs)
+            list_view.extend(SongItem(song) for song in new_songs)
+            self.import_added += len(new_songs)
+        self.status_text = (f"Importing... {self.import_scanned} file(s) found, "
+                            f"{self.import_added} added (press 'x' to cancel)")
+
+    def _on_import_finished(self, cancelled: bool, generation: int) -> None:
+        if generation != self.import_generation: return
+        self._sync_daemon_playlist()
+        self.play_queue.sync()
+        self._analyze_loudness()
+        metrics.gauge("playlist.size").set(len(self.playlist.songs))
+        verb = "Import cancelled" if cancelled else "Import finished"
+        if self.import_added > 0:
+            self.status_text = f"{verb}: added {self.import_added} song(s). Press 's' to save."
+        else:
+            self.status_text = f"{verb}: no new songs were added."
+
+    def action_cancel_import(self) -> None:
+        if not any(w.group == "import" and w.is_running for w in self.workers):
+            return
+        self.workers.cancel_group(self, "import")
+        self._on_import_finished(True, self.import_generation)
+        self.import_generation += 1
@@ -0,0 +1,202 @@
+import os
+import sys
+import json
+import time
+import threading
+from dataclasses import dataclass, asdict
+from typing import Callable, Optional, TextIO
+
+from . import providers
+from .scheduler import BULK, DownloadScheduler, Job
+
+# 批量下载的结果状态
+OK = "ok"
+CACHED = "cached"
+NOT_FOUND = "not_found"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+
+@dataclass
+class BatchItem:
+    """输入中的一行：搜索关键词，或者 (provider, 歌曲 ID)。"""
+    line: str
+    query: str = ""
+    song_id: str = ""
+    provider: str = "dda5"
+
+
+@dataclass
+class BatchResult:
+    item: str
+    status: str
+    title: str = ""
+    path: str = ""
+    id: str = ""
+    provider: str = ""
+    error: str = ""
+    seconds: float = 0.0
+
+
+def _is_provider(name: str) -> bool:
+    try:
+        providers.get_provider(name)
+    except providers.downloader.DownloaderError:
+        return False
+    return True
+
+
+def read_items(stream: TextIO, ids: bool = False) -> list[BatchItem]:
+    """
+    读取输入，每行一首。空行和以 # 开头的行被忽略。
+    ids=True 时每行是歌曲 ID，可以写成 PROVIDER:ID 指定来源；否则每行是搜索关键词。
+    """
+    items = []
+    for raw in stream:
+        line = raw.strip()
+        if not line or line.startswith("#"):
+            continue
+        if not ids:
+            items.append(BatchItem(line, query=line))
+            continue
+        provider, sep, song_id = line.partition(":")
+        if sep and _is_provider(provider):
+            items.append(BatchItem(line, song_id=song_id.strip(), provider=provider))
+        else:
+            items.append(BatchItem(line, song_id=line))
+    return items
+
+
+def _pick(query: str, songs: list[dict]) -> Optional[dict]:
+    """优先选标题与关键词完全一致（忽略大小写和空白）的结果，否则取第一条。"""
+    key = "".join(query.split()).casefold()
+    for song in songs:
+        if "".join(song.get("title", "").split()).casefold() == key:
+            return song
+    return songs[0] if songs else None
+
+
+def process_item(item: BatchItem, download_dir: str, job: Job) -> BatchResult:
+    """流水线的一个任务：搜索（或直接用 ID）-> 解析 -> 下载 -> 转封装。"""
+    start = time.perf_counter()
+    result = BatchResult(item=item.line, status=FAILED)
+    try:
+        if item.song_id:
+            song_data = {"id": item.song_id, "provider": item.provider}
+        else:
+            songs: list[dict] = []
+            errors: list[str] = []
+
+            def on_update(update) -> None:
+                songs.extend(update.songs)
+                if update.error is not None:
+                    errors.append(f"{update.provider}: {update.error}" if update.provider else str(update.error))
+
+            providers.search_all(item.query, 1, on_update)
+            song_data = _pick(item.query, songs)
+            if song_data is None:
+                # 所有来源都出错时算失败（下次可以重试），否则是确实没搜到
+                result.status = FAILED if errors else NOT_FOUND
+                result.error = "; ".join(errors)
+                return result
+        result.id = song_data["id"]
+        result.provider = song_data.get("provider", "dda5")
+        job.throttle(0)   # 排队期间被取消时尽早退出
+        result.title, result.path, cached = providers.fetch(song_data, download_dir, on_chunk=job.throttle)
+        result.status = CACHED if cached else OK
+    except Exception as e:
+        result.status = CANCELLED if job.cancelled else FAILED
+        result.error = str(e) or type(e).__name__
+    finally:
+        result.seconds = round(time.perf_counter() - start, 3)
+    return result
+
+
+def run_batch(items: list[BatchItem], download_dir: str, jobs: int,
+              on_result: Callable[[BatchResult], None]) -> list[BatchResult]:
+    """
+    用下载调度器并发处理所有条目（最多 jobs 个同时进行，共享 MPVS_BANDWIDTH_LIMIT 带宽上限）。
+    每完成一条调用一次 on_result；返回按输入顺序排列的结果。按 Ctrl+C 取消剩余任务。
+    """
+    scheduler = DownloadScheduler.from_env()
+    scheduler.max_workers = max(1, jobs)
+    done = threading.Event()
+    lock = threading.Lock()
+
+    def task(item: BatchItem, job: Job) -> BatchResult:
+        result = process_item(item, download_dir, job)
+        with lock:
+            on_result(result)
+        return result
+
+    submitted = scheduler.submit_batch([lambda job, item=item: task(item, job) for item in items],
+                                       BULK, lambda _jobs: done.set())
+    try:
+        while not done.wait(0.2):
+            pass
+    except KeyboardInterrupt:
+        scheduler.shutdown()
+        for job in submitted:
+            scheduler.cancel(job)
+        done.wait(5)
+    results = []
+    for item, job in zip(items, submitted):
+        if isinstance(job.result, BatchResult):
+            results.append(job.result)
+        else:
+            results.append(BatchResult(item=item.line, status=CANCELLED,
+                                       error=str(job.error or "") or "cancelled"))
+    return results
+
+
+def run_cli(source: str, jobs: int, ids: bool, as_json: bool, m3u_path: Optional[str],
+            download_dir: str, quiet: bool) -> int:
+    """`mpvs fetch` 的实现。进度写到 stderr，--json 时把结果数组写到 stdout。"""
+    if source == "-":
+        items = read_items(sys.stdin, ids)
+    else:
+        with open(source, "r", encoding="utf-8") as f:
+            items = read_items(f, ids)
+    if not items:
+        print("mpvs: nothing to fetch", file=sys.stderr)
+        return 0
+    os.makedirs(download_dir, exist_ok=True)
+
+    finished = [0]
+
+    def on_result(result: BatchResult) -> None:
+        finished[0] += 1
+        if quiet:
+            return
+        detail = result.path if result.status in (OK, CACHED) else result.error
+        print(f"[{finished[0]}/{len(items)}] {result.status:<9} {result.item}"
+              + (f" -> {detail}" if detail else ""), file=sys.stderr, flush=True)
+
+    results = run_batch(items, download_dir, jobs, on_result)
+
+    fetched = [r for r in results if r.status in (OK, CACHED)]
+    appended = 0
+    if m3u_path and fetched:
+        from .m3u import M3UEntry, append_entries
+        appended = append_entries(os.path.expanduser(m3u_path),
+                                  [M3UEntry(path=r.path, title=r.title) for r in fetched])
+
+    # 刚下载的和目标歌单中的歌曲不会被磁盘配额淘汰
+    from .quota import maintain, playlist_paths
+    protected = {r.path for r in fetched} | (playlist_paths(os.path.expanduser(m3u_path)) if m3u_path else set())
+    report = maintain(download_dir, protected)
+    if report.evicted and not quiet:
+        print(f"mpvs: download quota: evicted {report.evicted} song(s), "
+              f"freed {report.freed / 1024 / 1024:.1f} MB", file=sys.stderr)
+
+    if as_json:
+        json.dump([asdict(r) for r in results], sys.stdout, ensure_ascii=False, indent=2)
+        sys.stdout.write("\n")
+    if not quiet:
+        counts = {status: sum(1 for r in results if r.status == status)
+                  for status in (OK, CACHED, NOT_FOUND, FAILED, CANCELLED)}
+        summary = ", ".join(f"{n} {status}" for status, n in counts.items() if n)
+        if m3u_path:
+            summary += f"; {appended} added to {m3u_path}"
+        print(f"mpvs: {summary}", file=sys.stderr)
+    return 0 if len(fetched) == len(results) else 1
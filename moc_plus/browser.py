@@ -30,7 +30,7 @@ class FileBrowserScreen(Screen):
         list_view.clear()
 
         # 定义我们关心的文件扩展名
-        music_extensions = {".mp3", ".flac", ".wav", ".aac", ".ogg", ".m4a", ".m3u"}
+        music_extensions = {".mp3", ".flac", ".wav", ".aac", ".ogg", ".m4a", ".m3u", ".m3u8"}
 
         # 添加返回上级目录的选项
         parent_item = ListItem(Static("[..]"))
@@ -58,6 +58,16 @@ class FileBrowserScreen(Screen):
         
         list_view.extend(items)
 
+    def refresh_if_changed(self, changed_dirs: set[str]) -> None:
+        """文件监视器报告当前目录有变化时重新列出，并尽量保持光标位置。"""
+        if "*" not in changed_dirs and str(self.current_path) not in changed_dirs:
+            return
+        list_view = self.query_one(ListView)
+        previous_index = list_view.index
+        self.load_directory()
+        if previous_index is not None:
+            self.call_after_refresh(setattr, list_view, "index", min(previous_index, len(list_view.children) - 1))
+
     def on_list_view_selected(self, event: ListView.Selected) -> None:
         """当用户按回车时调用。"""
         if hasattr(event.item, 'data'):
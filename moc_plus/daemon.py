@@ -0,0 +1,293 @@
+import os
+import queue
+import selectors
+import signal
+import contextlib
+from typing import TYPE_CHECKING, Any, Callable, Optional
+
+from .ipc import ControlServer
+from .playlist import Playlist, Song
+from .playqueue import CHECKPOINT_INTERVAL, PlayQueue
+
+if TYPE_CHECKING:
+    from .player import Player
+
+
+class Daemon:
+    """
+    后台播放守护进程的事件循环。
+
+    信号、mpv 事件和控制请求都只负责把事件投递到队列，并通过自管道 (self-pipe)
+    唤醒主循环；真正的处理统一在主线程中串行执行，因此 current_index 不会被并发修改。
+    正在播放时主循环每隔几秒醒来写一次播放位置检查点；没有曲目或已暂停时一直阻塞在
+    selector 上，暂停的那一刻写一次检查点即可。
+    """
+
+    def __init__(self, player: "Player", playlist: Playlist, play_queue: Optional[PlayQueue] = None):
+        self.player = player
+        self.playlist = playlist
+        self.songs = playlist.songs
+        self.queue = play_queue if play_queue is not None else PlayQueue(self.songs)
+        self.current_index = playlist.current_selection_index if self.songs else 0
+        self.current_path: Optional[str] = None
+        # 由 mpv 的暂停事件更新；不能直接读 player.is_paused()，它与本事件的先后顺序不确定
+        self._paused = False
+
+        self._events: "queue.SimpleQueue[tuple[str, tuple]]" = queue.SimpleQueue()
+        self._running = False
+        self._selector = selectors.DefaultSelector()
+        self._wake_r, self._wake_w = os.pipe()
+        os.set_blocking(self._wake_r, False)
+        os.set_blocking(self._wake_w, False)
+        self._selector.register(self._wake_r, selectors.EVENT_READ, self._drain_wakeup)
+
+        self._handlers: dict[str, Callable[..., None]] = {
+            "next": self._on_next,
+            "previous": self._on_previous,
+            "track-end": self._on_track_end,
+            "pause-changed": self._on_pause_changed,
+            "quit": self._on_quit,
+        }
+        self._request_handlers: dict[str, Callable[[dict], dict]] = {
+            "status": self._request_status,
+            "playlist": self._request_playlist,
+            "set_playlist": self._request_set_playlist,
+            "play": self._request_play,
+            "toggle_pause": self._request_toggle_pause,
+            "next": self._request_next,
+            "previous": self._request_previous,
+            "shuffle": self._request_shuffle,
+            "enqueue": self._request_enqueue,
+            "stop": self._request_stop,
+            "quit": self._request_quit,
+        }
+
+    # --- 线程/信号安全的入口 ---
+
+    def post(self, kind: str, *args: Any) -> None:
+        """投递一个事件并唤醒主循环。可在任意线程或信号处理函数中调用。"""
+        self._events.put((kind, args))
+        with contextlib.suppress(BlockingIOError, OSError):
+            os.write(self._wake_w, b"\0")
+
+    def add_reader(self, fileobj, callback: Callable[[Any], None]) -> None:
+        """在主循环中监听一个可读的文件对象（例如控制套接字）。"""
+        self._selector.register(fileobj, selectors.EVENT_READ, callback)
+
+    def remove_reader(self, fileobj) -> None:
+        with contextlib.suppress(KeyError, ValueError):
+            self._selector.unregister(fileobj)
+
+    def add_handler(self, kind: str, handler: Callable[..., None]) -> None:
+        """注册（或覆盖）某类事件的处理函数。"""
+        self._handlers[kind] = handler
+
+    # --- 播放控制（仅在主循环中调用） ---
+
+    def play_by_index(self, new_index: int, start: float = 0.0) -> bool:
+        if not self.songs:
+            return False
+        self.current_index = self.queue.jump(new_index % len(self.songs))
+        return self._play_current(start)
+
+    def _play_current(self, start: float = 0.0) -> bool:
+        song = self.songs[self.current_index]
+        if not os.path.exists(song.path):
+            return False
+        self.player.play(song.path, start=start)
+        self.current_path = song.path
+        self._checkpoint(force=True)
+        return True
+
+    def _advance(self, backwards: bool = False) -> bool:
+        index = self.queue.advance(backwards)
+        if index is None:
+            return False
+        self.current_index = index
+        return self._play_current()
+
+    def start(self) -> bool:
+        """
+        优先从检查点恢复（同一首歌、同一位置）；否则播放当前选中的歌曲。
+        没有可播放的歌曲时返回 False。
+        """
+        self._analyze_loudness()
+        restored = self.queue.restore()
+        if restored is not None:
+            index, position, _paused = restored
+            self.current_index = index
+            if self._play_current(start=position):
+                return True
+        return self.play_by_index(self.current_index)
+
+    def _analyze_loudness(self) -> None:
+        analyze = getattr(self.player, "analyze", None)
+        if analyze is not None:
+            analyze([song.path for song in self.songs])
+
+    def _checkpoint(self, force: bool = False, paused: Optional[bool] = None) -> None:
+        with contextlib.suppress(Exception):
+            if paused is None:
+                paused = self.player.is_paused()
+            self.queue.checkpoint(self.player.get_current_time(), paused, force=force)
+
+    def stop(self) -> None:
+        """请求主循环退出。"""
+        self.post("quit")
+
+    # --- 主循环 ---
+
+    def run(self) -> None:
+        signal.signal(signal.SIGTERM, lambda _s, _f: self.post("quit"))
+        signal.signal(signal.SIGINT, lambda _s, _f: self.post("quit"))
+        with contextlib.suppress(Exception):
+            signal.signal(signal.SIGUSR1, lambda _s, _f: self.post("next"))
+            signal.signal(signal.SIGUSR2, lambda _s, _f: self.post("previous"))
+        with contextlib.suppress(Exception):
+            self.player.on_track_end(lambda: self.post("track-end"))
+        with contextlib.suppress(Exception):
+            self.player.on_pause_change(lambda paused: self.post("pause-changed", paused))
+
+        server: Optional[ControlServer] = None
+        with contextlib.suppress(OSError):
+            server = ControlServer(self)
+
+        self._running = True
+        try:
+            while self._running:
+                # 没有曲目或已暂停时无限期阻塞；否则定期醒来记录播放位置（位置不变时不写盘）
+                idle = self.current_path is None or self._paused
+                timeout = None if idle else CHECKPOINT_INTERVAL
+                for key, _mask in self._selector.select(timeout):
+                    key.data(key.fileobj)
+                self._dispatch_pending()
+                self._checkpoint()
+        finally:
+            self._checkpoint(force=True)
+            if server is not None:
+                server.close()
+            self.close()
+
+    def close(self) -> None:
+        self._running = False
+        self._selector.close()
+        for fd in (self._wake_r, self._wake_w):
+            with contextlib.suppress(OSError):
+                os.close(fd)
+
+    def _drain_wakeup(self, fd: int) -> None:
+        with contextlib.suppress(BlockingIOError, InterruptedError):
+            while os.read(fd, 4096):
+                pass
+
+    def _dispatch_pending(self) -> None:
+        while self._running:
+            try:
+                kind, args = self._events.get_nowait()
+            except queue.Empty:
+                return
+            handler: Optional[Callable[..., None]] = self._handlers.get(kind)
+            if handler is not None:
+                handler(*args)
+
+    # --- 事件处理 ---
+
+    def _on_next(self) -> None:
+        self._advance()
+
+    def _on_previous(self) -> None:
+        self._advance(backwards=True)
+
+    def _on_track_end(self) -> None:
+        self._advance()
+
+    def _on_pause_changed(self, paused: bool) -> None:
+        self._paused = paused
+        if paused:
+            # 暂停期间主循环不再定期醒来，在这里记下暂停时的位置
+            self._checkpoint(force=True, paused=True)
+
+    def _on_quit(self) -> None:
+        self._running = False
+
+    # --- 控制请求（由 ControlServer 在主循环中调用） ---
+
+    def handle_request(self, request: dict) -> dict:
+        handler = self._request_handlers.get(request.get("cmd", ""))
+        if handler is None:
+            return {"ok": False, "error": f"unknown command: {request.get('cmd')}"}
+        return handler(request)
+
+    def _request_status(self, _request: dict) -> dict:
+        return {
+            "ok": True,
+            "index": self.current_index,
+            "path": self.current_path,
+            "title": self.player.get_current_song_title(),
+            "time": self.player.get_current_time(),
+            "paused": self.player.is_paused(),
+            "duration": self.player.get_duration(),
+            "shuffle": self.queue.shuffle,
+        }
+
+    def _request_playlist(self, _request: dict) -> dict:
+        return {
+            "ok": True,
+            "index": self.current_index,
+            "songs": [[song.title, song.path] for song in self.songs],
+        }
+
+    def _request_set_playlist(self, request: dict) -> dict:
+        # 原地替换，保持 self.songs 与 playlist.songs 为同一个列表
+        self.songs[:] = [Song(title=title, path=path) for title, path in request.get("songs", [])]
+        if self.current_path is not None:
+            for i, song in enumerate(self.songs):
+                if song.path == self.current_path:
+                    self.current_index = i
+                    break
+            else:
+                self.current_index = min(int(request.get("index", 0)), max(len(self.songs) - 1, 0))
+        self.queue.sync()
+        self._analyze_loudness()
+        return {"ok": True}
+
+    def _request_play(self, request: dict) -> dict:
+        path = request.get("path", "")
+        start = float(request.get("start") or 0.0)
+        index = self.queue.index_of(path)
+        if index is not None:
+            self.play_by_index(index, start=start)
+        else:
+            self.player.play(path, start=start)
+            self.current_path = path
+        return {"ok": True}
+
+    def _request_toggle_pause(self, _request: dict) -> dict:
+        self.player.toggle_pause()
+        return {"ok": True}
+
+    def _request_next(self, _request: dict) -> dict:
+        self._on_next()
+        return {"ok": True}
+
+    def _request_previous(self, _request: dict) -> dict:
+        self._on_previous()
+        return {"ok": True}
+
+    def _request_shuffle(self, request: dict) -> dict:
+        enabled = request.get("enabled")
+        self.queue.set_shuffle(not self.queue.shuffle if enabled is None else bool(enabled))
+        self._checkpoint(force=True)
+        return {"ok": True, "shuffle": self.queue.shuffle}
+
+    def _request_enqueue(self, request: dict) -> dict:
+        self.queue.enqueue(request.get("path", ""))
+        return {"ok": True, "up_next": len(self.queue.up_next)}
+
+    def _request_stop(self, _request: dict) -> dict:
+        self.player.stop()
+        return {"ok": True}
+
+    def _request_quit(self, _request: dict) -> dict:
+        self._on_quit()
+        return {"ok": True}
@@ -4,21 +4,23 @@ import os
 import re
 import subprocess
 import shutil
+import hashlib
+import time
 from urllib.parse import quote, urlparse
-from bs4 import BeautifulSoup
-from typing import List, Dict, Tuple, Optional, Any
+from typing import List, Dict, Tuple, Optional, Any, Callable
 
-# --- 日志配置 ---
-# 创建一个唯一的日志文件，避免被缓存
-log_file = os.path.join(os.path.dirname(__file__), 'downloader.log')
-# 每次启动时都清空日志
-if os.path.exists(log_file):
-    os.remove(log_file)
-logging.basicConfig(filename=log_file, level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+from . import metrics
+from .logs import setup_logging, span
+from .scheduler import DownloadCancelled
+from .store import get_store
+
+logger = logging.getLogger(__name__)
 
 
 # --- 配置 ---
-BASE_URL = "https://www.dda5.com"
+DEFAULT_BASE_URL = "https://www.dda5.com"
+# 可以通过环境变量 MPVS_BASE_URL 指向镜像站或本地的替身服务器（用于离线基准测试）
+BASE_URL = os.environ.get("MPVS_BASE_URL", DEFAULT_BASE_URL).rstrip("/")
 SEARCH_URL = f"{BASE_URL}/so.php"
 PLAY_API_URL = f"{BASE_URL}/style/js/play.php"
 
@@ -29,6 +31,14 @@ HEADERS = {
     'Content-Type': 'application/x-www-form-urlencoded; charset=UTF-8',
 }
 
+def set_base_url(base_url: str) -> None:
+    """在运行时切换站点地址，同时更新搜索/播放接口和 Referer。"""
+    global BASE_URL, SEARCH_URL, PLAY_API_URL
+    BASE_URL = base_url.rstrip("/")
+    SEARCH_URL = f"{BASE_URL}/so.php"
+    PLAY_API_URL = f"{BASE_URL}/style/js/play.php"
+    HEADERS['Referer'] = f"{BASE_URL}/"
+
 # --- 核心功能 (已重构为库) ---
 
 class DownloaderError(Exception):
@@ -49,25 +59,30 @@ def search_songs(keyword: str, page: int = 1) -> Tuple[List[Dict[str, str]], int
     :return: (歌曲列表, 总页数, 总歌曲数)
     :raises: NetworkError, ParseError
     """
-    logging.info(f"开始搜索，关键词: '{keyword}', 页码: {page}")
+    # BeautifulSoup/lxml 只有搜索才需要，推迟导入以加快启动
+    from bs4 import BeautifulSoup
+
+    setup_logging()
+    metrics.counter("search.requests").inc()
+    logger.info("开始搜索，关键词: '%s', 页码: %d", keyword, page)
     songs = []
     total_pages = 0
     total_songs = 0
     try:
         encoded_keyword = quote(keyword)
         url = f"{SEARCH_URL}?wd={encoded_keyword}&page={page}"
-        logging.info(f"请求URL: {url}")
-        
-        response = requests.get(url, headers=HEADERS, timeout=15)
-        logging.info(f"收到响应，状态码: {response.status_code}")
+        logger.info("请求URL: %s", url)
+
+        with span("search.request", url=url) as s:
+            response = requests.get(url, headers=HEADERS, timeout=15)
+            s["status"] = response.status_code
+            s["bytes"] = len(response.content)
         response.raise_for_status()
-        
-        logging.info("开始使用lxml解析HTML...")
-        soup = BeautifulSoup(response.text, 'lxml')
-        logging.info("HTML解析完成。")
-        
-        song_list_items = soup.select('div.play_list ul li')
-        logging.info(f"找到 {len(song_list_items)} 个歌曲项目。")
+
+        with span("search.parse", parser="lxml") as s:
+            soup = BeautifulSoup(response.text, 'lxml')
+            song_list_items = soup.select('div.play_list ul li')
+            s["items"] = len(song_list_items)
         for item in song_list_items:
             title_element = item.select_one('div.name a.url')
             if title_element:
@@ -94,13 +109,15 @@ def search_songs(keyword: str, page: int = 1) -> Tuple[List[Dict[str, str]], int
             pagedata_div = soup.select_one("div.pagedata span")
             if pagedata_div: total_songs = int(pagedata_div.get_text(strip=True))
         
-        logging.info(f"搜索完成。找到歌曲: {len(songs)}, 总页数: {total_pages}, 总歌曲: {total_songs}")
+        logger.info("搜索完成。找到歌曲: %d, 总页数: %d, 总歌曲: %d", len(songs), total_pages, total_songs)
 
     except requests.exceptions.RequestException as e:
-        logging.error(f"网络请求期间发生错误: {e}")
+        metrics.counter("search.errors").inc()
+        logger.error("网络请求期间发生错误: %s", e)
         raise NetworkError(f"网络请求错误: {e}") from e
     except Exception as e:
-        logging.error(f"处理期间发生未知错误: {e}", exc_info=True)
+        metrics.counter("search.errors").inc()
+        logger.error("处理期间发生未知错误: %s", e, exc_info=True)
         raise ParseError(f"解析时发生错误: {e}") from e
         
     return songs, total_pages, total_songs
@@ -110,13 +127,18 @@ def get_song_info(song_id: str) -> Optional[Dict[str, Any]]:
     获取歌曲的完整信息 (URL, 歌词等)。
     :raises: NetworkError, ParseError
     """
+    setup_logging()
     try:
         data = {'id': song_id, 'type': 'dance'}
-        response = requests.post(PLAY_API_URL, headers=HEADERS, data=data, timeout=10)
+        with span("info.request", song_id=song_id) as s:
+            response = requests.post(PLAY_API_URL, headers=HEADERS, data=data, timeout=10)
+            s["status"] = response.status_code
         response.raise_for_status()
-        json_data = response.json()
+        with span("info.decode", song_id=song_id, bytes=len(response.content)):
+            json_data = response.json()
         
         if json_data.get('msg') == 1:
+            json_data.setdefault('id', song_id)
             return json_data
         else:
             raise ParseError(f"API未返回成功状态。ID: {song_id}, 响应: {json_data}")
@@ -126,76 +148,122 @@ def get_song_info(song_id: str) -> Optional[Dict[str, Any]]:
     except ValueError as e:
         raise ParseError(f"无法解析来自API的响应: {response.text}") from e
 
-def download_song_and_lrc(song_info: Dict[str, Any], download_dir: str) -> str:
+def find_downloaded(song_id: str, download_dir: str) -> Optional[str]:
+    """
+    O(1) 查询某个歌曲 ID 是否已经下载过，不发起任何网络请求。
+    :return: 已下载文件的路径，未下载时返回 None。
+    """
+    entry = get_store(download_dir).lookup(song_id)
+    if entry is None:
+        return None
+    metrics.counter("download.cache_hits").inc()
+    return entry.path
+
+def download_song_and_lrc(song_info: Dict[str, Any], download_dir: str,
+                          on_chunk: Optional[Callable[[int], None]] = None) -> str:
     """
     下载并智能处理歌曲和歌词。
+    音频按内容哈希存入下载目录的内容寻址存储，下载目录中只保留以标题命名的链接。
+    :param on_chunk: 每写入一块数据后以字节数调用，可以阻塞（限速/暂停）或抛异常（取消）。
     :return: 最终保存的音频文件路径。
     :raises: DownloaderError, NetworkError, IOError
     """
+    setup_logging()
     if not song_info or not song_info.get('url'):
         raise DownloaderError("歌曲信息无效或缺少下载链接。")
 
     title = song_info.get('title', '未知歌曲')
     safe_title = re.sub(r'[\\/*?:\"<>|]', "_", title)
     url = song_info['url']
-    
+    # 没有 ID 时退化为按 URL 区分
+    song_id = str(song_info.get('id') or url)
+
     path = urlparse(url).path
     original_ext = os.path.splitext(path)[1].lower() or ".tmp"
     final_ext = '.mp3' if original_ext == '.mp3' else '.aac'
-    final_audio_path = os.path.join(download_dir, f"{safe_title}{final_ext}")
-    
+
     if not os.path.exists(download_dir):
         os.makedirs(download_dir)
+    store = get_store(download_dir)
 
     # --- 音频处理 ---
-    if os.path.exists(final_audio_path):
-        # 文件已存在，直接返回路径
-        return final_audio_path
+    entry = store.lookup(song_id)
+    if entry is not None:
+        # 已下载过，直接返回路径
+        metrics.counter("download.cache_hits").inc()
+        return entry.path
+    metrics.counter("download.cache_misses").inc()
 
-    temp_download_path = os.path.join(download_dir, f"{safe_title}.downloading")
+    temp_download_path = store.new_temp_path(".downloading")
+    temp_final_path = None
     try:
-        response = requests.get(url, stream=True, timeout=60)
-        response.raise_for_status()
-        
-        with open(temp_download_path, 'wb') as f:
-            for chunk in response.iter_content(chunk_size=8192):
-                f.write(chunk)
+        with span("download.bytes", title=safe_title) as s:
+            start = time.perf_counter()
+            response = requests.get(url, stream=True, timeout=60)
+            response.raise_for_status()
+            total_bytes = 0
+            digest = hashlib.sha256()
+            with open(temp_download_path, 'wb') as f:
+                for chunk in response.iter_content(chunk_size=8192):
+                    f.write(chunk)
+                    digest.update(chunk)
+                    total_bytes += len(chunk)
+                    if on_chunk is not None:
+                        on_chunk(len(chunk))
+            elapsed = time.perf_counter() - start
+            s["bytes"] = total_bytes
+            s["bytes_per_s"] = int(total_bytes / elapsed) if elapsed > 0 else 0
+            metrics.counter("download.bytes").inc(total_bytes)
+            metrics.histogram("download.bytes_per_s").observe(s["bytes_per_s"])
 
         if final_ext == '.mp3':
-            os.rename(temp_download_path, final_audio_path)
+            sha256 = digest.hexdigest()
+            temp_final_path = temp_download_path
         else:
             ffmpeg_path = shutil.which('ffmpeg')
             if ffmpeg_path:
-                command = [ffmpeg_path, '-i', temp_download_path, '-c:a', 'copy', final_audio_path, '-y', '-hide_banner', '-loglevel', 'error']
-                result = subprocess.run(command, capture_output=True, text=True, encoding='utf-8', errors='ignore')
+                temp_final_path = store.new_temp_path(final_ext)
+                command = [ffmpeg_path, '-i', temp_download_path, '-c:a', 'copy', temp_final_path, '-y', '-hide_banner', '-loglevel', 'error']
+                with span("download.remux", title=safe_title, ext=original_ext) as s:
+                    result = subprocess.run(command, capture_output=True, text=True, encoding='utf-8', errors='ignore')
+                    s["returncode"] = result.returncode
                 if result.returncode == 0:
                     os.remove(temp_download_path)
+                    # 转封装后的内容变了，需要重新计算哈希
+                    sha256 = None
                 else:
-                    os.rename(temp_download_path, os.path.join(download_dir, f"{safe_title}{original_ext}"))
+                    final_original_path = os.path.join(download_dir, f"{safe_title}{original_ext}")
+                    os.rename(temp_download_path, final_original_path)
+                    # 登记下来，之后成功下载这首歌时由 quota.clean_orphans 清理
+                    store.record_leftover(song_id, final_original_path)
                     raise DownloaderError(f"ffmpeg提取失败: {result.stderr}")
             else:
                 final_original_path = os.path.join(download_dir, f"{safe_title}{original_ext}")
                 os.rename(temp_download_path, final_original_path)
+                store.record_leftover(song_id, final_original_path)
                 raise DownloaderError(f"未找到ffmpeg，文件已保存为原始格式: {os.path.basename(final_original_path)}")
 
+        # --- 收入存储，并保存歌词 ---
+        entry = store.add(song_id, title, safe_title, temp_final_path, final_ext,
+                          sha256=sha256, lrc_content=song_info.get('lrc'))
+
+    except DownloadCancelled:
+        # 调度器取消任务（Job.throttle 抛出）不是下载失败，原样交给调用方
+        metrics.counter("download.cancelled").inc()
+        _remove_temp_files(temp_download_path, temp_final_path)
+        raise
     except requests.exceptions.RequestException as e:
-        if os.path.exists(temp_download_path): os.remove(temp_download_path)
+        metrics.counter("download.failed").inc()
+        _remove_temp_files(temp_download_path, temp_final_path)
         raise NetworkError(f"下载 '{safe_title}' 时出错: {e}") from e
     except Exception as e:
-        if os.path.exists(temp_download_path): os.remove(temp_download_path)
+        metrics.counter("download.failed").inc()
+        _remove_temp_files(temp_download_path, temp_final_path)
         raise DownloaderError(f"处理 '{safe_title}' 时发生未知错误: {e}") from e
 
-    # --- 保存歌词 ---
-    lrc_content = song_info.get('lrc')
-    if lrc_content:
-        lrc_path = os.path.join(download_dir, f"{safe_title}.lrc")
-        if not os.path.exists(lrc_path):
-            try:
-                with open(lrc_path, 'w', encoding='utf-8') as f:
-                    f.write(lrc_content)
-            except IOError as e:
-                # 不把这个当成致命错误，只返回警告
-                # warnings.warn(f"保存歌词时出错: {e}")
-                pass # 在TUI应用中，暂时忽略歌词保存失败
-
-    return final_audio_path
+    return entry.path
+
+def _remove_temp_files(*paths: Optional[str]) -> None:
+    for path in paths:
+        if path and os.path.exists(path):
+            os.remove(path)
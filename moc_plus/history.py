@@ -0,0 +1,260 @@
+import os
+import time
+import queue
+import sqlite3
+import threading
+import contextlib
+from dataclasses import dataclass
+from typing import Optional
+
+from . import metrics
+
+HISTORY_DB_PATH = os.path.expanduser("~/.mpvs/history.db")
+# 听了不到时长的这个比例就被切走，算作跳过
+SKIP_FRACTION = 0.5
+# 不知道时长时，听了不到这么多秒就被切走算作跳过
+SKIP_SECONDS = 30.0
+
+# 结束原因
+EOF = "eof"            # 自然播放完
+REPLACED = "replaced"  # 被切到别的曲目
+QUIT = "quit"          # 播放器退出（不算跳过）
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS tracks (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    title TEXT NOT NULL DEFAULT ''
+);
+CREATE TABLE IF NOT EXISTS plays (
+    id INTEGER PRIMARY KEY,
+    track_id INTEGER NOT NULL,
+    started REAL NOT NULL,
+    listened REAL NOT NULL,
+    duration REAL,
+    skipped INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS plays_by_track ON plays(track_id, started);
+CREATE TABLE IF NOT EXISTS track_stats (
+    track_id INTEGER PRIMARY KEY,
+    plays INTEGER NOT NULL,
+    skips INTEGER NOT NULL,
+    listened REAL NOT NULL,
+    last_played REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS track_stats_by_plays ON track_stats(plays DESC);
+CREATE TABLE IF NOT EXISTS transitions (
+    from_id INTEGER NOT NULL,
+    to_id INTEGER NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (from_id, to_id)
+) WITHOUT ROWID;
+"""
+
+
+@dataclass
+class PlayEvent:
+    """一次播放：从开始到被切走/播完/退出。"""
+    path: str
+    title: str
+    started: float
+    listened: float
+    duration: Optional[float]
+    skipped: bool
+
+
+def is_skip(listened: float, duration: Optional[float], reason: str) -> bool:
+    if reason != REPLACED:
+        return False
+    if duration:
+        return listened < duration * SKIP_FRACTION
+    return listened < SKIP_SECONDS
+
+
+def _connect(db_path: str) -> sqlite3.Connection:
+    conn = sqlite3.connect(db_path, timeout=5.0)
+    # WAL：写入只追加到日志，读者（统计界面、另一个进程）不会被阻塞；
+    # synchronous=NORMAL 下进程崩溃不会丢失已提交的事务
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+
+class PlayHistory:
+    """
+    只追加的播放记录，保存在 SQLite (WAL) 数据库 ~/.mpvs/history.db 中。
+
+    start() / end() 只在内存中记下当前曲目，把完整的 PlayEvent 投递到队列，
+    由后台写线程成批写入，调用者（UI 线程、mpv 事件线程、守护进程主循环）从不等待磁盘。
+    写入 plays 的同时在同一事务里增量更新 track_stats 和 transitions 两张汇总表，
+    “最常播放”“跳过率”“下一首可能是什么”等查询不需要扫描几百万条事件。
+    """
+
+    def __init__(self, db_path: str = HISTORY_DB_PATH):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._current: Optional[tuple[str, str, float]] = None   # (path, title, 开始时间)
+        self._queue: "queue.SimpleQueue[Optional[PlayEvent]]" = queue.SimpleQueue()
+        self._writer: Optional[threading.Thread] = None
+
+    # --- 记录（任意线程） ---
+
+    def start(self, path: str, title: str = "") -> None:
+        """开始播放 path。上一首应先通过 end() 结束。"""
+        with self._lock:
+            self._current = (path, title or os.path.splitext(os.path.basename(path))[0], time.time())
+
+    def end(self, position: float, duration: Optional[float], reason: str) -> None:
+        """结束当前曲目。position 为结束时的播放位置（秒）。"""
+        with self._lock:
+            current, self._current = self._current, None
+        if current is None:
+            return
+        path, title, started = current
+        listened = duration if reason == EOF and duration else max(position or 0.0, 0.0)
+        self._post(PlayEvent(path, title, started, round(listened, 3), duration,
+                             is_skip(listened, duration, reason)))
+
+    def _post(self, event: PlayEvent) -> None:
+        # end() 可能同时在 mpv 事件线程和 UI / 守护进程线程中调用，写线程只能启动一个
+        with self._lock:
+            if self._writer is None:
+                self._writer = threading.Thread(target=self._write_loop, name="play-history", daemon=True)
+                self._writer.start()
+        self._queue.put(event)
+
+    def close(self, timeout: float = 2.0) -> None:
+        """等待已投递的记录写完。"""
+        with self._lock:
+            writer, self._writer = self._writer, None
+        if writer is not None:
+            self._queue.put(None)
+            writer.join(timeout)
+
+    # --- 写线程 ---
+
+    def _write_loop(self) -> None:
+        try:
+            os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+            conn = _connect(self.db_path)
+            conn.executescript(_SCHEMA)
+        except (OSError, sqlite3.Error):
+            metrics.counter("history.errors").inc()
+            return
+        previous_track: Optional[int] = None
+        try:
+            while True:
+                event = self._queue.get()
+                if event is None:
+                    return
+                batch = [event]
+                # 把同时到达的记录合并到一个事务里
+                with contextlib.suppress(queue.Empty):
+                    while True:
+                        event = self._queue.get_nowait()
+                        if event is None:
+                            break
+                        batch.append(event)
+                try:
+                    with conn:
+                        for item in batch:
+                            previous_track = self._insert(conn, item, previous_track)
+                    metrics.counter("history.events").inc(len(batch))
+                except sqlite3.Error:
+                    metrics.counter("history.errors").inc()
+                if event is None:
+                    return
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _insert(conn: sqlite3.Connection, event: PlayEvent, previous_track: Optional[int]) -> int:
+        conn.execute("INSERT INTO tracks (path, title) VALUES (?, ?) "
+                     "ON CONFLICT(path) DO UPDATE SET title = excluded.title", (event.path, event.title))
+        track_id = conn.execute("SELECT id FROM tracks WHERE path = ?", (event.path,)).fetchone()[0]
+        conn.execute("INSERT INTO plays (track_id, started, listened, duration, skipped) VALUES (?, ?, ?, ?, ?)",
+                     (track_id, event.started, event.listened, event.duration, int(event.skipped)))
+        conn.execute("INSERT INTO track_stats (track_id, plays, skips, listened, last_played) VALUES (?, 1, ?, ?, ?) "
+                     "ON CONFLICT(track_id) DO UPDATE SET plays = plays + 1, skips = skips + excluded.skips, "
+                     "listened = listened + excluded.listened, last_played = excluded.last_played",
+                     (track_id, int(event.skipped), event.listened, event.started))
+        if previous_track is not None and previous_track != track_id:
+            conn.execute("INSERT INTO transitions (from_id, to_id, count) VALUES (?, ?, 1) "
+                         "ON CONFLICT(from_id, to_id) DO UPDATE SET count = count + 1",
+                         (previous_track, track_id))
+        return track_id
+
+
+# --- 查询（只读，可在任意线程中调用） ---
+
+@dataclass
+class TrackStats:
+    path: str
+    title: str
+    plays: int
+    skips: int
+    listened: float
+    last_played: float
+
+    @property
+    def skip_rate(self) -> float:
+        return self.skips / self.plays if self.plays else 0.0
+
+
+def _query(db_path: str, sql: str, params: tuple = ()) -> list[tuple]:
+    if not os.path.exists(db_path):
+        return []
+    try:
+        conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True, timeout=5.0)
+        try:
+            return conn.execute(sql, params).fetchall()
+        finally:
+            conn.close()
+    except sqlite3.Error:
+        # 数据库还没建表（还没有任何播放记录）
+        return []
+
+
+_STATS_COLUMNS = "t.path, t.title, s.plays, s.skips, s.listened, s.last_played"
+
+
+def top_tracks(limit: int = 20, db_path: str = HISTORY_DB_PATH) -> list[TrackStats]:
+    """播放次数最多的曲目（走 track_stats 的 plays 索引）。"""
+    rows = _query(db_path, f"SELECT {_STATS_COLUMNS} FROM track_stats s JOIN tracks t ON t.id = s.track_id "
+                           "ORDER BY s.plays DESC LIMIT ?", (limit,))
+    return [TrackStats(*row) for row in rows]
+
+
+def most_skipped(limit: int = 20, min_plays: int = 3, db_path: str = HISTORY_DB_PATH) -> list[TrackStats]:
+    """跳过率最高的曲目（至少播放过 min_plays 次）。"""
+    rows = _query(db_path, f"SELECT {_STATS_COLUMNS} FROM track_stats s JOIN tracks t ON t.id = s.track_id "
+                           "WHERE s.plays >= ? AND s.skips > 0 "
+                           "ORDER BY CAST(s.skips AS REAL) / s.plays DESC, s.plays DESC LIMIT ?",
+                  (min_plays, limit))
+    return [TrackStats(*row) for row in rows]
+
+
+def recently_played(limit: int = 20, db_path: str = HISTORY_DB_PATH) -> list[PlayEvent]:
+    """最近的播放记录，新的在前（按主键倒序，不需要排序）。"""
+    rows = _query(db_path, "SELECT t.path, t.title, p.started, p.listened, p.duration, p.skipped "
+                           "FROM plays p JOIN tracks t ON t.id = p.track_id ORDER BY p.id DESC LIMIT ?", (limit,))
+    return [PlayEvent(path, title, started, listened, duration, bool(skipped))
+            for path, title, started, listened, duration, skipped in rows]
+
+
+def totals(db_path: str = HISTORY_DB_PATH) -> tuple[int, int, float]:
+    """(总播放次数, 总跳过次数, 总收听秒数)。"""
+    rows = _query(db_path, "SELECT COALESCE(SUM(plays), 0), COALESCE(SUM(skips), 0), "
+                           "COALESCE(SUM(listened), 0) FROM track_stats")
+    return rows[0] if rows else (0, 0, 0.0)
+
+
+def likely_next(path: str, limit: int = 5, db_path: str = HISTORY_DB_PATH) -> list[str]:
+    """
+    以往在 path 之后最常播放的曲目，可用于预取（歌词、响度分析等）。
+    只查 transitions 的主键前缀，与事件总数无关。
+    """
+    rows = _query(db_path, "SELECT t.path FROM transitions x JOIN tracks t ON t.id = x.to_id "
+                           "WHERE x.from_id = (SELECT id FROM tracks WHERE path = ?) "
+                           "ORDER BY x.count DESC LIMIT ?", (path, limit))
+    return [row[0] for row in rows]
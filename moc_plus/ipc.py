@@ -0,0 +1,222 @@
+import os
+import json
+import socket
+import time
+import itertools
+import contextlib
+from typing import Any, Optional
+
+from . import metrics
+
+SOCKET_PATH = os.path.expanduser("~/.mpvs/mpvs.sock")
+
+# 协议：UNIX 套接字上按行分隔的 JSON。每个请求 {"cmd": ..., "id": n, ...} 对应一行响应，
+# 响应中原样带回 id，客户端据此确认读到的是本次请求的响应。
+
+
+class IPCError(Exception):
+    """与后台守护进程通信失败"""
+    pass
+
+
+class ControlServer:
+    """
+    守护进程一侧的控制套接字。
+    监听套接字和所有连接都注册到 Daemon 的 selector 中，请求在主循环里串行处理。
+    """
+
+    def __init__(self, daemon, path: str = SOCKET_PATH):
+        self.daemon = daemon
+        self.path = path
+        self._buffers: dict[socket.socket, bytes] = {}
+
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._sock.bind(path)
+        os.chmod(path, 0o600)
+        self._sock.listen(8)
+        self._sock.setblocking(False)
+        daemon.add_reader(self._sock, self._on_accept)
+
+    def close(self) -> None:
+        for conn in list(self._buffers):
+            self._drop(conn)
+        self.daemon.remove_reader(self._sock)
+        self._sock.close()
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(self.path)
+
+    def _on_accept(self, sock: socket.socket) -> None:
+        with contextlib.suppress(BlockingIOError):
+            conn, _addr = sock.accept()
+            self._buffers[conn] = b""
+            self.daemon.add_reader(conn, self._on_readable)
+
+    def _drop(self, conn: socket.socket) -> None:
+        self.daemon.remove_reader(conn)
+        self._buffers.pop(conn, None)
+        conn.close()
+
+    def _on_readable(self, conn: socket.socket) -> None:
+        try:
+            data = conn.recv(65536)
+        except OSError:
+            data = b""
+        if not data:
+            self._drop(conn)
+            return
+        buffer = self._buffers[conn] + data
+        *lines, self._buffers[conn] = buffer.split(b"\n")
+        for line in lines:
+            if not line.strip():
+                continue
+            request = None
+            try:
+                request = json.loads(line)
+                response = self.daemon.handle_request(request)
+            except Exception as e:
+                response = {"ok": False, "error": str(e)}
+            if isinstance(request, dict) and "id" in request:
+                response["id"] = request["id"]
+            try:
+                conn.sendall(json.dumps(response, ensure_ascii=False).encode("utf-8") + b"\n")
+            except OSError:
+                self._drop(conn)
+                return
+
+
+class ControlClient:
+    """
+    客户端一侧的控制连接（阻塞式，一问一答）。
+    任何通信错误（包括超时）后连接即作废：迟到的响应会留在缓冲区里，被当成下一个请求的响应。
+    作废后 closed 为 True，调用方应重新连接。
+    """
+
+    def __init__(self, path: str = SOCKET_PATH, timeout: float = 2.0):
+        self.path = path
+        self.timeout = timeout
+        self.closed = False
+        self._ids = itertools.count(1)
+        self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._sock.settimeout(timeout)
+        try:
+            self._sock.connect(path)
+        except OSError as e:
+            self._sock.close()
+            raise IPCError(f"无法连接守护进程: {e}") from e
+        self._reader = self._sock.makefile("rb")
+
+    @classmethod
+    def try_connect(cls, path: str = SOCKET_PATH) -> Optional["ControlClient"]:
+        """如果有守护进程在运行则返回连接，否则返回 None。"""
+        if not os.path.exists(path):
+            return None
+        try:
+            return cls(path)
+        except IPCError:
+            return None
+
+    def request(self, cmd: str, **params: Any) -> dict:
+        if self.closed:
+            raise IPCError("与守护进程的连接已关闭")
+        request_id = next(self._ids)
+        payload = dict(params, cmd=cmd, id=request_id)
+        start = time.perf_counter()
+        try:
+            self._sock.sendall(json.dumps(payload, ensure_ascii=False).encode("utf-8") + b"\n")
+            line = self._reader.readline()
+        except OSError as e:   # 包括 socket.timeout
+            self.close()
+            raise IPCError(f"与守护进程通信失败: {e}") from e
+        if not line:
+            self.close()
+            raise IPCError("守护进程已关闭连接")
+        metrics.histogram("ipc.request.ms").observe((time.perf_counter() - start) * 1000)
+        try:
+            response = json.loads(line)
+        except ValueError as e:
+            self.close()
+            raise IPCError(f"无法解析守护进程的响应: {e}") from e
+        if not isinstance(response, dict) or response.get("id") != request_id:
+            self.close()
+            raise IPCError("守护进程的响应与请求不对应")
+        if not response.get("ok"):
+            raise IPCError(response.get("error", "未知错误"))
+        return response
+
+    def close(self) -> None:
+        self.closed = True
+        with contextlib.suppress(OSError):
+            self._reader.close()
+            self._sock.close()
+
+
+class RemotePlayer:
+    """
+    与 Player 接口一致的瘦客户端：所有操作都转发给后台守护进程中唯一的 mpv 实例。
+    守护进程不可达时，查询类方法返回默认值而不是抛出异常。
+    连接出错作废后，下一个请求会先重新连接（失败的那个请求不重发，避免重复执行）。
+    """
+
+    def __init__(self, client: ControlClient):
+        self.client = client
+
+    def _request(self, cmd: str, **params: Any) -> Optional[dict]:
+        try:
+            if self.client.closed:
+                self.client = ControlClient(self.client.path, self.client.timeout)
+            return self.client.request(cmd, **params)
+        except IPCError:
+            return None
+
+    def get_status(self) -> dict:
+        return self._request("status") or {}
+
+    def get_current_time(self) -> float:
+        return float(self.get_status().get("time") or 0.0)
+
+    def get_current_song_title(self) -> Optional[str]:
+        return self.get_status().get("title")
+
+    def is_paused(self) -> bool:
+        return bool(self.get_status().get("paused", True))
+
+    def get_duration(self) -> Optional[float]:
+        return self.get_status().get("duration")
+
+    def get_playlist(self) -> tuple[list[tuple[str, str]], int]:
+        """获取守护进程中的播放列表 ([(title, path), ...], 当前索引)。"""
+        response = self._request("playlist") or {}
+        return [tuple(s) for s in response.get("songs", [])], int(response.get("index", 0))
+
+    def set_playlist(self, songs: list[tuple[str, str]], index: int) -> None:
+        self._request("set_playlist", songs=songs, index=index)
+
+    def play(self, filepath: str, start: float = 0.0):
+        self._request("play", path=filepath, start=start)
+
+    def next(self) -> None:
+        self._request("next")
+
+    def previous(self) -> None:
+        self._request("previous")
+
+    def set_shuffle(self, enabled: Optional[bool] = None) -> bool:
+        """设置（enabled 为 None 时切换）随机播放，返回新的状态。"""
+        response = self._request("shuffle", enabled=enabled) or {}
+        return bool(response.get("shuffle"))
+
+    def enqueue(self, filepath: str) -> None:
+        self._request("enqueue", path=filepath)
+
+    def toggle_pause(self):
+        self._request("toggle_pause")
+
+    def stop(self):
+        self._request("stop")
+
+    def quit(self):
+        # 客户端退出时只断开连接，守护进程继续播放
+        self.client.close()
@@ -0,0 +1,40 @@
+import json
+import contextlib
+from typing import Iterator
+
+try:
+    import fcntl
+except ImportError:     # Windows：没有 flock，只能保证进程内互斥
+    fcntl = None
+
+
+def parse_jsonl(data: bytes) -> tuple[list[dict], int]:
+    """
+    解析只追加的 JSON Lines 数据（存储索引、响度缓存）中完整的行。
+    :return: (记录列表, 已解析的字节数)。末尾没有换行的一行不计入，留到下次读取；
+             无法解析的行跳过——崩溃时可能留下半行，之后的追加会接在它后面。
+    """
+    end = data.rfind(b"\n") + 1
+    records = []
+    for line in data[:end].splitlines():
+        try:
+            record = json.loads(line)
+        except ValueError:
+            continue
+        if isinstance(record, dict):
+            records.append(record)
+    return records, end
+
+
+@contextlib.contextmanager
+def file_lock(lock_path: str) -> Iterator[None]:
+    """
+    对 lock_path 加排他的 flock，与其他进程（TUI、守护进程、mpvs fetch）互斥。
+    不能直接锁数据文件本身：重写时 os.replace 会换掉 inode。
+    """
+    if fcntl is None:
+        yield
+        return
+    with open(lock_path, "a") as f:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        yield   # 关闭文件即释放 flock
@@ -0,0 +1,71 @@
+import os
+import re
+from typing import Callable, Iterator, Optional
+
+from .playlist import SUPPORTED_EXTENSIONS
+
+_DIGITS = re.compile(r"(\d+)")
+
+
+def natural_sort_key(name: str) -> list:
+    """自然排序：'Track 2' 排在 'Track 10' 前面。"""
+    return [int(part) if part.isdigit() else part.casefold() for part in _DIGITS.split(name)]
+
+
+def iter_audio_files(root: str, cancelled: Optional[Callable[[], bool]] = None) -> Iterator[list[str]]:
+    """
+    用 os.scandir 深度优先遍历目录树，每个目录产出一次该目录下（自然排序后的）音频文件列表。
+    跳过隐藏文件/目录，并通过 (st_dev, st_ino) 防止符号链接造成的循环。
+    :param cancelled: 返回 True 时尽快停止遍历。
+    """
+    extensions = {ext.lower() for ext in SUPPORTED_EXTENSIONS}
+    visited: set[tuple[int, int]] = set()
+    stack = [root]
+    while stack:
+        if cancelled is not None and cancelled():
+            return
+        directory = stack.pop()
+        try:
+            st = os.stat(directory)
+        except OSError:
+            continue
+        if (st.st_dev, st.st_ino) in visited:
+            continue
+        visited.add((st.st_dev, st.st_ino))
+
+        files: list[os.DirEntry] = []
+        subdirs: list[os.DirEntry] = []
+        try:
+            with os.scandir(directory) as it:
+                for entry in it:
+                    if entry.name.startswith('.'):
+                        continue
+                    try:
+                        if entry.is_dir():
+                            subdirs.append(entry)
+                        elif os.path.splitext(entry.name)[1].lower() in extensions and entry.is_file():
+                            files.append(entry)
+                    except OSError:
+                        continue
+        except OSError:
+            continue
+
+        if files:
+            files.sort(key=lambda e: natural_sort_key(e.name))
+            yield [e.path for e in files]
+        # 逆序入栈，使子目录按自然顺序被访问
+        subdirs.sort(key=lambda e: natural_sort_key(e.name), reverse=True)
+        stack.extend(e.path for e in subdirs)
+
+
+def scan_in_batches(root: str, batch_size: int = 500,
+                    cancelled: Optional[Callable[[], bool]] = None) -> Iterator[list[str]]:
+    """把 iter_audio_files 的结果重新切分为固定大小的批次，便于分批追加到播放列表。"""
+    batch: list[str] = []
+    for paths in iter_audio_files(root, cancelled):
+        batch.extend(paths)
+        while len(batch) >= batch_size:
+            yield batch[:batch_size]
+            batch = batch[batch_size:]
+    if batch and not (cancelled is not None and cancelled()):
+        yield batch
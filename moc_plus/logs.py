@@ -0,0 +1,98 @@
+import os
+import time
+import queue
+import atexit
+import logging
+import threading
+import contextlib
+import logging.handlers
+from typing import Any, Iterator, Optional
+
+from . import metrics
+
+LOG_DIR = os.path.expanduser("~/.mpvs")
+LOG_FILE = os.path.join(LOG_DIR, "mpvs.log")
+LOG_MAX_BYTES = 1024 * 1024
+LOG_BACKUP_COUNT = 3
+
+# 所有模块都挂在 "moc_plus" 这个根 logger 下
+logger = logging.getLogger("moc_plus")
+timing_logger = logging.getLogger("moc_plus.timing")
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_lock = threading.Lock()
+
+
+class _StructuredFormatter(logging.Formatter):
+    """在普通消息后追加 key=value 形式的结构化字段（来自 extra={"fields": {...}}）。"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        message = super().format(record)
+        fields = getattr(record, "fields", None)
+        if fields:
+            message += " " + " ".join(f"{k}={v}" for k, v in fields.items())
+        return message
+
+
+def setup_logging(log_file: str = LOG_FILE) -> None:
+    """
+    配置非阻塞的日志管道（可重复调用）。
+    调用方只把记录放进队列，由后台的 QueueListener 线程负责格式化并写入轮转文件，
+    网络/下载线程不会因为磁盘 I/O 而阻塞。
+    """
+    global _listener
+    with _lock:
+        if _listener is not None:
+            return
+        os.makedirs(os.path.dirname(log_file), exist_ok=True)
+        file_handler = logging.handlers.RotatingFileHandler(
+            log_file, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT, encoding="utf-8"
+        )
+        file_handler.setFormatter(_StructuredFormatter("%(asctime)s - %(levelname)s - %(name)s - %(message)s"))
+
+        log_queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+        logger.addHandler(logging.handlers.QueueHandler(log_queue))
+        logger.setLevel(logging.INFO)
+        # 不向 root logger 传播，避免 Textual 或其他库的 handler 重复输出
+        logger.propagate = False
+
+        _listener = logging.handlers.QueueListener(log_queue, file_handler, respect_handler_level=True)
+        _listener.start()
+        atexit.register(shutdown_logging)
+
+
+def shutdown_logging() -> None:
+    """停止后台写日志线程，并把队列中剩余的记录写完。"""
+    global _listener
+    with _lock:
+        if _listener is None:
+            return
+        _listener.stop()
+        for handler in list(logger.handlers):
+            logger.removeHandler(handler)
+        _listener = None
+
+
+@contextlib.contextmanager
+def span(name: str, log: logging.Logger = timing_logger, **fields: Any) -> Iterator[dict]:
+    """
+    计时区间。结束时记录一条 "span <name>" 日志，附带 duration_ms 和调用方补充的字段：
+
+        with span("download.bytes", song_id=sid) as s:
+            ...
+            s["bytes"] = total
+
+    出现异常时额外记录 error 字段，并照常向上抛出。
+    耗时同时记入指标注册表中名为 "<name>.ms" 的直方图。
+    """
+    start = time.perf_counter()
+    try:
+        yield fields
+    except BaseException as e:
+        fields["error"] = type(e).__name__
+        raise
+    finally:
+        fields["duration_ms"] = round((time.perf_counter() - start) * 1000, 2)
+        metrics.histogram(f"{name}.ms").observe(fields["duration_ms"])
+        if log.isEnabledFor(logging.INFO):
+            log.info("span %s", name, extra={"fields": fields})
@@ -0,0 +1,304 @@
+import os
+import re
+import json
+import time
+import queue
+import shutil
+import itertools
+import threading
+import subprocess
+import contextlib
+from dataclasses import dataclass, asdict
+from typing import Iterable, Optional
+
+from . import metrics
+from .jsonl import file_lock, parse_jsonl
+
+LOUDNESS_CACHE_PATH = os.path.expanduser("~/.mpvs/loudness.jsonl")
+# ReplayGain 2.0 的参考响度
+DEFAULT_TARGET_LUFS = -18.0
+# 增益后真峰值不超过 -1 dBTP，避免削波
+PEAK_CEILING_DB = -1.0
+# 安静的曲目最多提升这么多，避免把底噪放大
+MAX_BOOST_DB = 12.0
+# 单个文件分析的超时（秒）
+ANALYSIS_TIMEOUT = 600
+
+# 分析优先级：数值越小越优先
+NOW_PLAYING = 0
+BACKGROUND = 1
+
+_INTEGRATED_RE = re.compile(r"^\s*I:\s*(-?[\d.]+|-?inf)\s+LUFS", re.MULTILINE)
+_PEAK_RE = re.compile(r"^\s*Peak:\s*(-?[\d.]+|-?inf)\s+dBFS", re.MULTILINE)
+
+
+@dataclass
+class LoudnessInfo:
+    """一个文件的分析结果。lufs 为 None 表示 ffmpeg 无法解析该文件（同样缓存，不再重试）。"""
+    path: str
+    mtime_ns: int
+    size: int
+    lufs: Optional[float] = None
+    peak: Optional[float] = None   # 真峰值，dBFS
+
+
+def compute_gain(info: LoudnessInfo, target: float = DEFAULT_TARGET_LUFS) -> Optional[float]:
+    """把 info 调整到 target LUFS 所需的增益 (dB)；受峰值和最大提升量限制。"""
+    if info.lufs is None or info.lufs == float("-inf"):
+        return None
+    gain = target - info.lufs
+    if info.peak is not None and info.peak != float("-inf"):
+        gain = min(gain, PEAK_CEILING_DB - info.peak)
+    return min(gain, MAX_BOOST_DB)
+
+
+def parse_ebur128(output: str) -> tuple[Optional[float], Optional[float]]:
+    """从 ffmpeg ebur128 滤镜的 Summary 中取出 (integrated LUFS, true peak dBFS)。"""
+    integrated = _INTEGRATED_RE.findall(output)
+    peak = _PEAK_RE.findall(output)
+    # 逐帧日志中也有 "I:"，Summary 在最后
+    return (float(integrated[-1]) if integrated else None,
+            float(peak[-1]) if peak else None)
+
+
+def _stat(path: str) -> Optional[os.stat_result]:
+    try:
+        return os.stat(path)
+    except OSError:
+        return None
+
+
+class LoudnessAnalyzer:
+    """
+    后台响度 (ReplayGain) 分析。
+
+    * 每个文件用 ffmpeg 的 ebur128 滤镜计算积分响度和真峰值。真正的计算在 ffmpeg
+      子进程中进行，工作线程只负责启动和等待，因此 jobs 个线程即可占满 jobs 个核；
+      子进程以较低的优先级 (nice 10) 运行，不会与 mpv 争抢 CPU；
+    * 结果按 (路径, mtime, 大小) 缓存在只追加的 ~/.mpvs/loudness.jsonl 中，
+      文件被重新下载或修改后自动失效；
+    * scan() 把整个曲库交给后台的预处理线程（stat 和查缓存都不在调用者线程中进行），
+      prioritize() 让即将播放的曲目插队。
+
+    播放时只查缓存：没有结果时以原音量播放，绝不等待分析。
+    """
+
+    def __init__(self, cache_path: str = LOUDNESS_CACHE_PATH, jobs: Optional[int] = None,
+                 target: float = DEFAULT_TARGET_LUFS, ffmpeg: Optional[str] = None):
+        self.cache_path = cache_path
+        # TUI 和守护进程可能同时使用同一个缓存文件，追加和压缩都持有这个文件锁
+        self.lock_path = f"{cache_path}.lock"
+        self.jobs = max(1, jobs or os.cpu_count() or 1)
+        self.target = target
+        self.ffmpeg = ffmpeg if ffmpeg is not None else shutil.which("ffmpeg")
+        self._cache: dict[str, LoudnessInfo] = {}
+        self._lock = threading.Lock()
+        self._queue: "queue.PriorityQueue[tuple[int, int, str]]" = queue.PriorityQueue()
+        self._seq = itertools.count()
+        self._pending: set[str] = set()
+        self._active: set[str] = set()   # 正在分析的文件
+        self._submitted: set[str] = set()   # 已经交给 scan() 的路径
+        self._scans: "queue.SimpleQueue[Optional[list[str]]]" = queue.SimpleQueue()
+        self._threads: list[threading.Thread] = []
+        self._procs: set[subprocess.Popen] = set()
+        self._stopped = False
+        self._load_cache()
+
+    @classmethod
+    def from_env(cls) -> Optional["LoudnessAnalyzer"]:
+        """
+        目标响度由 MPVS_LOUDNESS_TARGET（LUFS，默认 -18）设置，设为 off 时关闭音量均衡；
+        并发数由 MPVS_ANALYSIS_JOBS 设置，默认等于 CPU 核数。
+        """
+        target = os.environ.get("MPVS_LOUDNESS_TARGET", "").strip()
+        if target.lower() in ("off", "0", "false", "no"):
+            return None
+        try:
+            target_lufs = float(target) if target else DEFAULT_TARGET_LUFS
+        except ValueError:
+            target_lufs = DEFAULT_TARGET_LUFS
+        jobs = int(os.environ.get("MPVS_ANALYSIS_JOBS", "0") or 0)
+        return cls(jobs=jobs or None, target=target_lufs)
+
+    # --- 缓存 ---
+
+    def _load_cache(self) -> None:
+        if not os.path.exists(self.cache_path):
+            return
+        with contextlib.suppress(OSError), file_lock(self.lock_path):
+            # 读取和压缩在同一把锁内：压缩时不会丢掉另一个进程刚追加的记录
+            with open(self.cache_path, "rb") as f:
+                data = f.read()
+            records, _consumed = parse_jsonl(data)
+            for record in records:
+                with contextlib.suppress(TypeError):
+                    info = LoudnessInfo(**record)
+                    self._cache[info.path] = info
+            if data.count(b"\n") > 2 * len(self._cache) + 100:
+                # 过期记录太多时压缩一次
+                self._rewrite_cache()
+
+    def _rewrite_cache(self) -> None:
+        # 调用方持有 file_lock(self.lock_path)
+        tmp_path = f"{self.cache_path}.tmp"
+        with contextlib.suppress(OSError):
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                for info in self._cache.values():
+                    f.write(json.dumps(asdict(info), ensure_ascii=False) + "\n")
+            os.replace(tmp_path, self.cache_path)
+
+    def _store(self, info: LoudnessInfo) -> None:
+        with self._lock:
+            self._cache[info.path] = info
+            with contextlib.suppress(OSError):
+                os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+                with file_lock(self.lock_path), open(self.cache_path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(asdict(info), ensure_ascii=False) + "\n")
+
+    def lookup(self, path: str, st: Optional[os.stat_result] = None) -> Optional[LoudnessInfo]:
+        """返回与文件当前 mtime/大小一致的缓存结果。"""
+        info = self._cache.get(path)
+        if info is None:
+            return None
+        st = st or _stat(path)
+        if st is None or st.st_mtime_ns != info.mtime_ns or st.st_size != info.size:
+            return None
+        return info
+
+    def gain_for(self, path: str) -> Optional[float]:
+        """
+        播放 path 时应用的增益 (dB)。未分析过时返回 None 并让它插队分析，
+        下次播放即可生效。
+        """
+        info = self.lookup(path)
+        if info is None:
+            metrics.counter("loudness.cache_misses").inc()
+            self.prioritize(path)
+            return None
+        metrics.counter("loudness.cache_hits").inc()
+        return compute_gain(info, self.target)
+
+    # --- 调度 ---
+
+    def scan(self, paths: Iterable[str]) -> None:
+        """
+        在后台分析 paths 中所有尚未缓存的文件。立即返回。
+        播放列表每次变化都会整体传进来，之前已经提交过的路径直接跳过，只有新增的路径交给预处理线程；
+        之后被修改的文件在播放时由 prioritize() 重新分析。
+        """
+        if self.ffmpeg is None or self._stopped:
+            return
+        with self._lock:
+            paths = [path for path in paths if path not in self._submitted]
+            self._submitted.update(paths)
+        if not paths:
+            return
+        self._ensure_threads()
+        self._scans.put(paths)
+
+    def prioritize(self, path: str) -> None:
+        """让 path 排在所有后台任务之前分析。"""
+        if self.ffmpeg is None or self._stopped:
+            return
+        self._ensure_threads()
+        with self._lock:
+            # 即使已在后台队列中也再排一次：高优先级的这一份先被取出
+            self._pending.add(path)
+        self._queue.put((NOW_PLAYING, next(self._seq), path))
+
+    def _ensure_threads(self) -> None:
+        # scan() 和 prioritize() 可能在不同线程中同时第一次调用
+        with self._lock:
+            if self._threads:
+                return
+            self._threads.append(threading.Thread(target=self._feed, name="loudness-feed", daemon=True))
+            for n in range(self.jobs):
+                self._threads.append(threading.Thread(target=self._work, name=f"loudness-{n}", daemon=True))
+            for thread in self._threads:
+                thread.start()
+
+    def _claim(self, path: str) -> bool:
+        """把 path 标记为待分析；已经在队列中时返回 False。"""
+        with self._lock:
+            if path in self._pending:
+                return False
+            self._pending.add(path)
+            return True
+
+    def _feed(self) -> None:
+        """把 scan() 交来的路径过滤成待分析的任务。"""
+        while True:
+            paths = self._scans.get()
+            if paths is None or self._stopped:
+                return
+            for path in paths:
+                st = _stat(path)
+                if st is None or self.lookup(path, st) is not None:
+                    continue
+                if self._claim(path):
+                    self._queue.put((BACKGROUND, next(self._seq), path))
+            metrics.gauge("loudness.queue_depth").set(self._queue.qsize())
+
+    def _work(self) -> None:
+        while True:
+            _priority, _seq, path = self._queue.get()
+            if self._stopped:
+                return
+            metrics.gauge("loudness.queue_depth").set(self._queue.qsize())
+            with self._lock:
+                # 插队的任务可能与后台任务重复，正在分析的文件不再分析第二遍
+                if path in self._active:
+                    continue
+                self._active.add(path)
+            try:
+                st = _stat(path)
+                if st is not None and self.lookup(path, st) is None:
+                    self._store(self.analyze(path, st))
+            except Exception:
+                # 分析失败（超时、被 stop() 终止等）不缓存，下次启动时重试
+                metrics.counter("loudness.errors").inc()
+            finally:
+                with self._lock:
+                    self._active.discard(path)
+                    self._pending.discard(path)
+
+    def analyze(self, path: str, st: os.stat_result) -> LoudnessInfo:
+        """同步分析一个文件（在工作线程中调用）。"""
+        command = [self.ffmpeg, "-hide_banner", "-nostats", "-nostdin", "-threads", "1",
+                   "-i", path, "-vn", "-sn", "-af", "ebur128=peak=true",
+                   "-f", "null", "-"]
+        start = time.perf_counter()
+        proc = subprocess.Popen(command, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+                                stderr=subprocess.PIPE, text=True, encoding="utf-8", errors="ignore")
+        with self._lock:
+            self._procs.add(proc)
+        with contextlib.suppress(OSError, AttributeError):
+            os.setpriority(os.PRIO_PROCESS, proc.pid, 10)
+        try:
+            _out, err = proc.communicate(timeout=ANALYSIS_TIMEOUT)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+            proc.communicate()
+            raise
+        finally:
+            with self._lock:
+                self._procs.discard(proc)
+        metrics.histogram("loudness.analysis.ms").observe((time.perf_counter() - start) * 1000)
+        if self._stopped:
+            raise RuntimeError("loudness analysis stopped")
+        lufs, peak = parse_ebur128(err) if proc.returncode == 0 else (None, None)
+        metrics.counter("loudness.analyzed").inc()
+        return LoudnessInfo(path=path, mtime_ns=st.st_mtime_ns, size=st.st_size, lufs=lufs, peak=peak)
+
+    def stop(self) -> None:
+        """停止所有分析并终止正在运行的 ffmpeg。"""
+        self._stopped = True
+        with self._lock:
+            procs = list(self._procs)
+        for proc in procs:
+            with contextlib.suppress(OSError):
+                proc.kill()
+        if self._threads:
+            self._scans.put(None)
+            for _ in range(self.jobs):
+                self._queue.put((-1, next(self._seq), ""))
@@ -0,0 +1,202 @@
+import os
+import mmap
+import codecs
+from dataclasses import dataclass
+from typing import Iterator, Optional
+from urllib.parse import unquote, urlparse
+
+# 分块读取的大小
+CHUNK_SIZE = 1024 * 1024
+# 非 UTF-8 的 .m3u 通常来自 Windows 下的中文播放器
+LEGACY_ENCODING = "gb18030"
+
+
+@dataclass
+class M3UEntry:
+    """歌单中的一条记录。duration 为 #EXTINF 中的秒数，未知（-1 或缺失）时为 None。"""
+    path: str
+    title: str
+    duration: Optional[float] = None
+
+
+def _detect_bom(head: bytes) -> Optional[str]:
+    if head.startswith(codecs.BOM_UTF8):
+        return "utf-8-sig"
+    if head.startswith(codecs.BOM_UTF16_LE) or head.startswith(codecs.BOM_UTF16_BE):
+        return "utf-16"
+    return None
+
+
+def _decode_block(raw: bytes, legacy: bool) -> str:
+    """优先按 UTF-8 解码；.m3u（非 .m3u8）文件中解码失败的块退回到本地编码。"""
+    try:
+        return raw.decode("utf-8")
+    except UnicodeDecodeError:
+        return raw.decode(LEGACY_ENCODING if legacy else "utf-8", errors="replace")
+
+
+def _iter_raw_blocks(f, use_mmap: bool, chunk_size: int, offset: int = 0) -> Iterator[bytes]:
+    """
+    按块读取文件，每块都在换行符处截断，保证不会把一行（或一个多字节字符）切成两半。
+    UTF-8 和 GB18030 的多字节序列中都不会出现 0x0A，所以按 b"\n" 对齐是安全的。
+    """
+    if use_mmap:
+        try:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # 空文件不能 mmap
+            return
+        with mm:
+            start = offset
+            size = len(mm)
+            while start < size:
+                end = min(start + chunk_size, size)
+                if end < size:
+                    newline = mm.rfind(b"\n", start, end)
+                    end = newline + 1 if newline != -1 else (mm.find(b"\n", end) + 1 or size)
+                yield mm[start:end]
+                start = end
+        return
+
+    f.seek(offset)
+    remainder = b""
+    while True:
+        chunk = f.read(chunk_size)
+        if not chunk:
+            break
+        block = remainder + chunk
+        newline = block.rfind(b"\n")
+        if newline == -1:
+            remainder = block
+            continue
+        remainder = block[newline + 1:]
+        yield block[:newline + 1]
+    if remainder:
+        yield remainder
+
+
+def _iter_line_blocks(filepath: str, use_mmap: bool, chunk_size: int) -> Iterator[list[str]]:
+    """产出已解码的行列表，每块一个列表。"""
+    with open(filepath, "rb") as f:
+        bom = _detect_bom(f.read(4))
+        if bom == "utf-16":
+            # UTF-16 无法按字节切行，交给文本层解码
+            with open(filepath, "r", encoding="utf-16") as text:
+                while True:
+                    lines = text.readlines(chunk_size)
+                    if not lines:
+                        return
+                    yield lines
+        offset = len(codecs.BOM_UTF8) if bom == "utf-8-sig" else 0
+        legacy = not filepath.lower().endswith(".m3u8")
+        for raw in _iter_raw_blocks(f, use_mmap, chunk_size, offset):
+            yield _decode_block(raw, legacy).splitlines()
+
+
+def _parse_extinf(line: str) -> tuple[Optional[float], str]:
+    """'#EXTINF:123 tvg-id="x",Artist - Title' -> (123.0, 'Artist - Title')"""
+    info, _, title = line[8:].partition(",")
+    try:
+        duration = float(info.split(" ", 1)[0])
+    except ValueError:
+        return None, title.strip()
+    return (duration if duration >= 0 else None), title.strip()
+
+
+def _resolve_path(location: str, base_dir: str) -> str:
+    if location[0] == "/":
+        return location
+    if location.startswith("file://"):
+        return unquote(urlparse(location).path)
+    if "://" in location:
+        # 网络地址原样保留
+        return location
+    if location[0] == "~":
+        return os.path.expanduser(location)
+    if os.sep == "/" and "\\" in location:
+        # Windows 播放器导出的相对路径
+        location = location.replace("\\", "/")
+    return os.path.normpath(os.path.join(base_dir, location))
+
+
+def iter_m3u_blocks(filepath: str, use_mmap: bool = False, chunk_size: int = CHUNK_SIZE) -> Iterator[list[M3UEntry]]:
+    """
+    流式解析 .m3u / .m3u8 歌单，每读入一块就产出这一块中的 M3UEntry 列表。
+
+    * 按块（或 mmap）读取，内存占用与歌单大小无关；
+    * 识别 UTF-8 / UTF-16 BOM，.m3u 中非 UTF-8 的块按 GB18030 解码；
+    * 相对路径相对于歌单所在目录解析，支持 file:// URL；
+    * 解析 #EXTINF 中的时长和标题。
+
+    这里不检查文件是否存在，由调用方决定。
+    """
+    base_dir = os.path.dirname(os.path.abspath(filepath))
+    duration: Optional[float] = None
+    title = ""
+    for lines in _iter_line_blocks(filepath, use_mmap, chunk_size):
+        entries = []
+        for line in lines:
+            line = line.strip()
+            if not line:
+                continue
+            if line[0] == "#":
+                if line.startswith("#EXTINF:"):
+                    duration, title = _parse_extinf(line)
+                continue
+            path = _resolve_path(line, base_dir)
+            if not title:
+                title = os.path.splitext(os.path.basename(path))[0]
+            entries.append(M3UEntry(path, title, duration))
+            duration, title = None, ""
+        if entries:
+            yield entries
+
+
+def iter_m3u(filepath: str, use_mmap: bool = False, chunk_size: int = CHUNK_SIZE) -> Iterator[M3UEntry]:
+    """逐条产出歌单中的 M3UEntry。"""
+    for entries in iter_m3u_blocks(filepath, use_mmap, chunk_size):
+        yield from entries
+
+
+def iter_m3u_batches(filepath: str, batch_size: int = 1000, use_mmap: bool = False) -> Iterator[list[M3UEntry]]:
+    """把解析结果按 batch_size 重新分组，便于分批追加到播放列表。"""
+    pending: list[M3UEntry] = []
+    for entries in iter_m3u_blocks(filepath, use_mmap):
+        pending.extend(entries)
+        while len(pending) >= batch_size:
+            yield pending[:batch_size]
+            del pending[:batch_size]
+    if pending:
+        yield pending
+
+
+def append_entries(filepath: str, entries: list[M3UEntry]) -> int:
+    """
+    把条目追加到歌单末尾（文件不存在时新建），已在歌单中的路径会被跳过。
+    只追加写入，不重写已有内容。
+    :return: 实际追加的条数。
+    """
+    existing = {entry.path for entry in iter_m3u(filepath)} if os.path.exists(filepath) else set()
+    new_entries = []
+    for entry in entries:
+        if entry.path not in existing:
+            existing.add(entry.path)
+            new_entries.append(entry)
+    if not new_entries:
+        return 0
+    os.makedirs(os.path.dirname(os.path.abspath(filepath)), exist_ok=True)
+    needs_header = not os.path.exists(filepath) or os.path.getsize(filepath) == 0
+    needs_newline = False
+    if not needs_header:
+        with open(filepath, "rb") as f:
+            f.seek(-1, os.SEEK_END)
+            needs_newline = f.read(1) != b"\n"
+    with open(filepath, "a", encoding="utf-8") as f:
+        if needs_header:
+            f.write("#EXTM3U\n")
+        if needs_newline:
+            f.write("\n")
+        for entry in new_entries:
+            duration = -1 if entry.duration is None else int(round(entry.duration))
+            f.write(f"#EXTINF:{duration},{entry.title}\n{entry.path}\n")
+    return len(new_entries)
@@ -3,447 +3,35 @@ import sys
 import signal
 import argparse
 import contextlib
-import re
-import threading
-import time
-from functools import partial
-from typing import Optional
 
-from textual.app import App, ComposeResult
-from textual.containers import VerticalScroll
-from textual.message import Message
-from textual.reactive import var
-from textual.screen import Screen
-from textual.widgets import (Footer, Header, Input, ListItem, ListView,
-                             Static)
-
-# 导入我们自己的模块
-from . import downloader
-from .browser import FileBrowserScreen
-from .player import Player
-from .playlist import Playlist, Song, SUPPORTED_EXTENSIONS
-
-# --- 自定义 ListItem 和消息 ---
-class SongItem(ListItem):
-    class Clicked(Message):
-        def __init__(self, item: "SongItem") -> None:
-            self.item = item
-            super().__init__()
-    def __init__(self, song: Song):
-        super().__init__(Static(song.title))
-        self.song_data = song
-    def on_click(self) -> None:
-        self.post_message(self.Clicked(self))
-
-# --- 歌词屏幕 ---
-class LyricsScreen(Screen):
-    BINDINGS = [("escape", "app.pop_screen", "Back"), ("l", "app.pop_screen", "Back"), ("left", "decrease_offset", "Offset -0.1s"), ("right", "increase_offset", "Offset +0.1s")]
-    def __init__(self, player: Player, current_song: Optional[Song] = None):
-        super().__init__(); self.player = player; self.current_song = current_song
-        self.lyrics: list[tuple[float, str]] = []; self.current_line_index = -1; self.lyrics_offset = 0.0
-        self.update_timer = self.set_interval(1 / 10, self.update_highlight, pause=True)
-    def _parse_lrc(self, lrc_content: str) -> list[tuple[float, str]]:
-        parsed_lyrics = [];
-        for line in lrc_content.splitlines():
-            match = re.match(r'\[(\d{2}):(\d{2})\.(\d{2,3})\](.*)', line)
-            if match:
-                minutes, seconds, ms, text = match.groups()
-                ms_normalized = ms.ljust(3, '0')
-                time_in_seconds = int(minutes) * 60 + int(seconds) + int(ms_normalized) / 1000.0
-                parsed_lyrics.append((time_in_seconds, text.strip()))
-        return sorted(parsed_lyrics)
-    def update_highlight(self) -> None:
-        if not self.lyrics: return
-        current_time = self.player.get_current_time() - self.lyrics_offset; new_line_index = -1
-        for i, (time, text) in enumerate(self.lyrics):
-            if current_time >= time: new_line_index = i
-        if new_line_index != self.current_line_index:
-            self.current_line_index = new_line_index; new_content = ""
-            for i, (time, text) in enumerate(self.lyrics):
-                line_text = text or '♪'
-                if i == self.current_line_index: new_content += f"[reverse]{line_text}[/reverse]\n"
-                else: new_content += f"{line_text}\n"
-            self.query_one("#lyrics_text", Static).update(new_content)
-    def action_increase_offset(self): self.lyrics_offset += 0.1; self.app.sub_title = f"Offset: {self.lyrics_offset:.1f}s"
-    def action_decrease_offset(self): self.lyrics_offset -= 0.1; self.app.sub_title = f"Offset: {self.lyrics_offset:.1f}s"
-    def compose(self) -> ComposeResult:
-        yield Header(name="Lyrics Viewer");
-        with VerticalScroll(id="lyrics_container"): yield Static("Loading lyrics...", id="lyrics_text")
-        yield Footer()
-    def on_mount(self) -> None:
-        lyrics_widget = self.query_one("#lyrics_text", Static)
-        if not self.current_song: lyrics_widget.update("No song is currently playing."); return
-        self.app.sub_title = self.current_song.title
-        lrc_path = os.path.splitext(self.current_song.path)[0] + ".lrc"
-        if os.path.exists(lrc_path):
-            try:
-                with open(lrc_path, 'r', encoding='utf-8') as f: lrc_content = f.read()
-                self.lyrics = self._parse_lrc(lrc_content)
-                if not self.lyrics: lyrics_widget.update(lrc_content or "Invalid format.")
-                else: self.update_timer.resume()
-            except Exception as e: lyrics_widget.update(f"Error reading lyrics file:\n{e}")
-        else: lyrics_widget.update("No lyrics file (.lrc) found for this song.")
-    def on_unmount(self) -> None: self.update_timer.pause()
-
-# --- 命令屏幕 ---
-class CommandScreen(Screen):
-    BINDINGS = [("escape", "app.pop_screen", "Back")]
-    def __init__(self, prompt: str, initial_value: str, callback):
-        super().__init__(); self.prompt = prompt; self.initial_value = initial_value; self.callback = callback
-    def compose(self) -> ComposeResult:
-        yield Static(self.prompt, id="command_prompt"); yield Input(self.initial_value, id="command_input"); yield Footer()
-    def on_mount(self) -> None: self.query_one(Input).focus()
-    def on_input_submitted(self, event: Input.Submitted) -> None:
-        self.app.pop_screen();
-        if self.callback: self.callback(event.value)
-
-# --- 搜索屏幕 ---
-class SearchScreen(Screen):
-    BINDINGS = [
-        ("escape", "app.pop_screen", "Back"),
-        ("n", "next_page", "Next Page"),
-        ("p", "previous_page", "Prev Page"),
-        ("a", "download_all", "Download All"),
-    ]
-
-    def __init__(self):
-        super().__init__()
-        self.current_page = 1
-        self.total_pages = 1
-        self.current_query = ""
-        self.last_click_time = 0
-        self.last_clicked_item = None
-
-    def compose(self) -> ComposeResult:
-        yield Header(name="Search Online Music")
-        yield Input(placeholder="Enter song or artist name...")
-        with VerticalScroll(id="search_results_view"):
-            yield ListView(id="search_results_list")
-        yield Footer()
-
-    def on_mount(self) -> None:
-        self.query_one(Input).focus()
-
-    def start_search(self, query: str, page: int = 1) -> None:
-        self.query_one("#search_results_list", ListView).clear()
-        self.query_one(Input).disabled = True
-        self.app.sub_title = f"Searching for '{query}' on page {page}..."
-        thread = threading.Thread(target=self.search_worker, args=[query, page])
-        thread.start()
-
-    def on_input_submitted(self, event: Input.Submitted) -> None:
-        self.current_query = event.value
-        self.current_page = 1
-        self.total_pages = 1
-        self.start_search(self.current_query, self.current_page)
-
-    def search_worker(self, query: str, page: int):
-        try:
-            result = downloader.search_songs(query, page)
-        except Exception as e:
-            result = e
-        self.app.call_from_thread(self.app.on_search_finished, result)
-
-    def download_worker(self, songs_to_download: list[dict]):
-        downloaded_songs = []
-        errors = []
-        download_dir = self.app.downloads_dir
-        for song_data in songs_to_download:
-            try:
-                song_info = downloader.get_song_info(song_data["id"])
-                final_path = downloader.download_song_and_lrc(song_info, download_dir)
-                new_song = Song(title=song_info['title'], path=final_path)
-                downloaded_songs.append(new_song)
-            except Exception as e:
-                self.app.log(f"Download failed for {song_data.get('title', 'N/A')}: {e}")
-                errors.append(song_data["title"])
-        
-        result = (downloaded_songs, errors)
-        self.app.call_from_thread(self.app.on_download_finished, result)
-
-    def _trigger_download(self, item: ListItem):
-        if not hasattr(item, "song_data"): return
-        song_data = item.song_data
-        self.app.sub_title = f"Downloading '{song_data['title']}'..."
-        thread = threading.Thread(target=self.download_worker, args=[[song_data]])
-        thread.start()
-
-    def on_list_view_highlighted(self, event: ListView.Highlighted) -> None:
-        if event.item and hasattr(event.item, "song_data"):
-            self.app.sub_title = f"Selected: {event.item.song_data['title']}"
-
-    def on_song_item_clicked(self, event: SongItem.Clicked) -> None:
-        current_click_time = time.time()
-        if (current_click_time - self.last_click_time < 0.5) and (self.last_clicked_item is event.item):
-            self._trigger_download(event.item)
-        self.last_click_time = current_click_time
-        self.last_clicked_item = event.item
-
-    def action_next_page(self) -> None:
-        if self.current_page < self.total_pages:
-            self.current_page += 1
-            self.start_search(self.current_query, self.current_page)
-
-    def action_previous_page(self) -> None:
-        if self.current_page > 1:
-            self.current_page -= 1
-            self.start_search(self.current_query, self.current_page)
-
-    def action_download_all(self) -> None:
-        list_view = self.query_one("#search_results_list", ListView)
-        songs_on_page = [child.song_data for child in list_view.children if hasattr(child, "song_data")]
-        if not songs_on_page: return
-        self.app.sub_title = f"Queueing {len(songs_on_page)} songs for download..."
-        thread = threading.Thread(target=self.download_worker, args=[songs_on_page])
-        thread.start()
-
-# --- 主应用 ---
-class MocPlusApp(App):
-    BINDINGS = [
-        ("q", "quit", "Quit"),
-        ("/", "push_screen('search')", "Search"),
-        ("p", "toggle_pause", "Play/Pause"),
-        ("space", "toggle_pause", "Play/Pause"),
-        ("l", "toggle_lyrics", "Show Lyrics"),
-        ("delete", "delete_song", "Delete Song"),
-        ("c", "clear_playlist", "Clear Playlist"),
-        ("s", "show_save_screen", "Save Playlist"),
-        ("o", "push_screen('browser')", "Open..."),
-        ("enter", "select_song", "Play Selected"),
-    ]
-    SCREENS = {"search": SearchScreen, "command": CommandScreen, "lyrics": LyricsScreen, "browser": FileBrowserScreen}
-    CSS_PATH = "tui.css"
-    status_text = var("STATUS: Welcome to MOC-Plus!")
-
-    def __init__(self):
-        super().__init__()
-        self.player: Optional[Player] = None
-        self.playlist = Playlist()
-        
-        # --- 路径管理 ---
-        self.config_dir = os.path.expanduser("~/.mpvs")
-        self.default_playlist_path = os.path.join(self.config_dir, "default.m3u")
-        self.current_playlist_path = self.default_playlist_path
-        self.downloads_dir = os.path.expanduser('~/music/mpvs')
-        
-        # --- 状态变量 ---
-        self.last_click_time = 0
-        self.last_clicked_item = None
-
-        # --- 初始化检查 ---
-        os.makedirs(self.config_dir, exist_ok=True)
-        os.makedirs(self.downloads_dir, exist_ok=True)
-        if not os.path.exists(self.default_playlist_path):
-            with open(self.default_playlist_path, "w", encoding="utf-8") as f:
-                f.write("#EXTM3U\n")
-
-    def compose(self) -> ComposeResult:
-        yield Header(name="MOC-Plus Terminal Player")
-        yield Static(id="status_bar")
-        with VerticalScroll(id="playlist_view"):
-            yield ListView(id="playlist_listview")
-        yield Footer()
-
-    def on_mount(self) -> None:
-        try:
-            self.player = Player()
-        except RuntimeError as e:
-            # mpv 未安装等情况时给出提示，但仍允许浏览/管理播放列表
-            self.player = None
-            self.status_text = str(e)
-        self.action_load_playlist(self.default_playlist_path)
-        self.query_one("#playlist_listview").focus()
-
-    def on_search_finished(self, result) -> None:
-        if not isinstance(self.screen, SearchScreen): return
-        search_screen = self.screen
-        list_view = search_screen.query_one("#search_results_list", ListView)
-        input_widget = search_screen.query_one(Input)
-        input_widget.disabled = False
-        if isinstance(result, Exception):
-            self.sub_title = f"Search failed: {result}"
-            list_view.append(ListItem(Static(f"Error: {result}")))
-        else:
-            search_results, total_pages, total_songs = result
-            search_screen.total_pages = total_pages
-            self.sub_title = f"Found {total_songs} songs | Page {search_screen.current_page}/{total_pages}"
-            if not search_results:
-                list_view.append(ListItem(Static("No results found.")))
-            else:
-                for song in search_results:
-                    list_item = SongItem(Song(title=song['title'], path=""))
-                    list_item.song_data = song
-                    list_view.append(list_item)
-        list_view.focus()
-
-    def on_download_finished(self, result) -> None:
-        downloaded_songs, errors = result
-        added_count = 0
-        for song in downloaded_songs:
-            if not any(p_song.path == song.path for p_song in self.playlist.songs):
-                self.playlist.songs.append(song)
-                added_count += 1
-        
-        downloaded_count = len(downloaded_songs)
-        if errors:
-            self.sub_title = f"Completed. Downloaded {downloaded_count}. {len(errors)} failed."
-        else:
-            self.sub_title = f"Successfully downloaded {downloaded_count} song(s)."
-
-        if isinstance(self.screen, SearchScreen):
-            self.pop_screen()
-
-        self._update_playlist_view()
-        if added_count > 0:
-            self.status_text = f"Added {added_count} new song(s). Press 's' to save."
-        else:
-            self.status_text = "Download complete. No new songs added to playlist."
-
-    def _update_playlist_view(self):
-        list_view = self.query_one("#playlist_listview", ListView)
-        previous_index = list_view.index
-        list_view.clear()
-        if not self.playlist.songs:
-            list_view.append(ListItem(Static("Playlist is empty.")))
-        else:
-            for song in self.playlist.songs:
-                list_view.append(SongItem(song))
-            if previous_index is not None:
-                list_view.index = min(previous_index, len(self.playlist.songs) - 1)
-
-    def action_clear_playlist(self) -> None:
-        self.playlist.clear()
-        self.playlist.save_m3u(self.current_playlist_path)
-        self._update_playlist_view()
-        self.status_text = f"Playlist cleared and saved to {os.path.basename(self.current_playlist_path)}"
-
-    def action_show_save_screen(self):
-        self.push_screen(CommandScreen("Save playlist as:", self.current_playlist_path, self.action_save_playlist))
-
-    def action_load_playlist(self, path: str):
-        self.current_playlist_path = path
-        self.playlist.load_m3u(self.current_playlist_path)
-        self._update_playlist_view()
-        self.status_text = f"Loaded playlist from {os.path.basename(self.current_playlist_path)}"
-
-    def action_save_playlist(self, path: str):
-        self.current_playlist_path = path
-        self.playlist.save_m3u(self.current_playlist_path)
-        self.status_text = f"Playlist saved to {os.path.basename(self.current_playlist_path)}"
-
-    def action_toggle_lyrics(self) -> None:
-        if isinstance(self.screen, LyricsScreen):
-            self.pop_screen()
-        else:
-            list_view = self.query_one("#playlist_listview", ListView)
-            if list_view.highlighted_child and hasattr(list_view.highlighted_child, 'song_data'):
-                current_song = list_view.highlighted_child.song_data
-                self.push_screen(LyricsScreen(self.player, current_song))
-            else:
-                self.status_text = "Select a song to show lyrics."
-
-    def action_delete_song(self) -> None:
-        list_view = self.query_one("#playlist_listview", ListView)
-        if list_view.highlighted_child is None: return
-        index_to_delete = list_view.index
-        if index_to_delete is None: return
-        self.playlist.delete_song(index_to_delete)
-        self._update_playlist_view()
-        if self.playlist.songs:
-            new_index = min(index_to_delete, len(self.playlist.songs) - 1)
-            list_view.index = new_index
-        self.status_text = "Song removed. Press 's' to save changes."
-
-    def action_toggle_pause(self) -> None:
-        if self.player: self.player.toggle_pause()
-
-    def on_list_view_highlighted(self, event: ListView.Highlighted) -> None:
-        if event.list_view.id == "playlist_listview":
-            if event.item and hasattr(event.item, 'song_data'):
-                self.status_text = f"Selected: {event.item.song_data.title}"
-            # 同步内部播放列表选择索引以保持一致
-            if event.list_view.index is not None:
-                self.playlist.current_selection_index = event.list_view.index
-
-    def on_song_item_clicked(self, event: SongItem.Clicked) -> None:
-        if isinstance(event.item.parent, ListView) and event.item.parent.id == "search_results_list":
-            current_click_time = time.time()
-            if (current_click_time - self.last_click_time < 0.5) and (self.last_clicked_item is event.item):
-                if hasattr(event.item, "song_data"):
-                    self.screen._trigger_download(event.item)
-            self.last_click_time = current_click_time
-            self.last_clicked_item = event.item
-            return
-
-        if isinstance(event.item.parent, ListView) and event.item.parent.id == "playlist_listview":
-            current_click_time = time.time()
-            if (current_click_time - self.last_click_time < 0.5) and (self.last_clicked_item is event.item):
-                if hasattr(event.item, 'song_data'):
-                    self.action_select_song()
-            self.last_click_time = current_click_time
-            self.last_clicked_item = event.item
-
-    def action_select_song(self) -> None:
-        list_view = self.query_one("#playlist_listview", ListView)
-        if list_view.highlighted_child and hasattr(list_view.highlighted_child, 'song_data'):
-            song_to_play: Song = list_view.highlighted_child.song_data
-            if not os.path.exists(song_to_play.path):
-                self.status_text = "File not found. It may have been moved or deleted."
-                return
-            if self.player:
-                self.player.play(song_to_play.path)
-                self.status_text = f"Playing: {song_to_play.title}"
-
-    def on_list_view_selected(self, event: ListView.Selected) -> None:
-        """当列表项通过 Enter 被选择时触发。
-        在播放列表中按回车时，开始播放当前高亮歌曲。
-        """
-        if event.list_view.id == "playlist_listview":
-            # 如果是鼠标单击导致的选中，Textual 同样会派发 Selected 事件。
-            # 为了避免单击即播放，这里检测最近一次点击时间并忽略该事件，
-            # 仅保留键盘 Enter 或双击触发的播放。
-            if (time.time() - self.last_click_time) < 0.3 and (self.last_clicked_item is getattr(event, 'item', None)):
-                event.stop()
-                return
-            self.action_select_song()
-            event.stop()
-
-    def watch_status_text(self, new_text: str) -> None:
-        self.query_one("#status_bar", Static).update(new_text)
-
-    def action_quit(self) -> None:
-        self.status_text = "Saving current playlist..."
-        self.playlist.save_m3u(self.current_playlist_path)
-        if self.player: self.player.quit()
-        self.exit("Playlist saved. Goodbye!")
-    
-    def add_path_to_playlist(self, path: str):
-        added_count = 0
-        initial_count = len(self.playlist.songs)
-
-        if os.path.isfile(path):
-            if path.lower().endswith(".m3u"):
-                self.playlist.load_m3u(path, append=True)
-            elif any(path.lower().endswith(ext) for ext in SUPPORTED_EXTENSIONS):
-                if not any(song.path == path for song in self.playlist.songs):
-                    title = os.path.splitext(os.path.basename(path))[0]
-                    self.playlist.songs.append(Song(title=title, path=path))
-        
-        added_count = len(self.playlist.songs) - initial_count
-        if added_count > 0:
-            self.status_text = f"Added {added_count} song(s). Press 's' to save."
-            self._update_playlist_view()
-        else:
-            self.status_text = "No new songs were added."
-        self.pop_screen() # 添加后自动返回主屏幕
+# 这里只导入标准库：-n / -x 等控制命令只需要发送信号，
+# Textual、下载器和 mpv 都在真正需要时才导入，以保证命令行启动足够快。
 
 def main():
     parser = argparse.ArgumentParser(prog="mpvs", description="MPVS Terminal Music Player")
     parser.add_argument("-p", "--play", action="store_true", help="Start playing in background (daemon mode)")
     parser.add_argument("-x", "--exit", action="store_true", help="Stop the background daemon if running")
     parser.add_argument("-n", "--next", action="store_true", help="Tell daemon to play next track")
+    parser.add_argument("-b", "--prev", action="store_true", help="Tell daemon to play previous track")
+    subparsers = parser.add_subparsers(dest="command")
+    fetch_parser = subparsers.add_parser(
+        "fetch", help="Download songs in bulk without the TUI",
+        description="Search (or look up by id), download and remux every song listed in FILE, "
+                    "one per line. Blank lines and lines starting with # are ignored.")
+    fetch_parser.add_argument("file", nargs="?", default="-", help="Input file (default: stdin)")
+    fetch_parser.add_argument("-j", "--jobs", type=int, default=4, help="Concurrent downloads (default: 4)")
+    fetch_parser.add_argument("--ids", action="store_true", help="Lines are song ids (ID or PROVIDER:ID), not search queries")
+    fetch_parser.add_argument("--json", action="store_true", help="Print results as JSON on stdout")
+    fetch_parser.add_argument("--m3u", metavar="PATH", help="Append downloaded songs to this playlist")
+    fetch_parser.add_argument("--dir", default="~/music/mpvs", help="Download directory (default: ~/music/mpvs)")
+    fetch_parser.add_argument("-q", "--quiet", action="store_true", help="No progress output")
     args = parser.parse_args()
 
+    if args.command == "fetch":
+        from .batch import run_cli
+        sys.exit(run_cli(args.file, args.jobs, args.ids, args.json, args.m3u,
+                         os.path.expanduser(args.dir), args.quiet))
+
     config_dir = os.path.expanduser("~/.mpvs")
     os.makedirs(config_dir, exist_ok=True)
     pid_file = os.path.join(config_dir, "mpvs.pid")
@@ -516,16 +104,17 @@ def main():
             print(f"mpvs: failed to stop daemon: {e}")
         return
 
-    if args.next:
+    if args.next or args.prev:
         pid = read_pid()
         if not pid or not is_process_running(pid):
             print("mpvs: no running daemon found")
             return
+        sig, name = (signal.SIGUSR1, "NEXT") if args.next else (signal.SIGUSR2, "PREVIOUS")
         try:
-            os.kill(pid, signal.SIGUSR1)
-            print("mpvs: sent NEXT to daemon")
+            os.kill(pid, sig)
+            print(f"mpvs: sent {name} to daemon")
         except Exception as e:
-            print(f"mpvs: failed to send NEXT: {e}")
+            print(f"mpvs: failed to send {name}: {e}")
         return
 
     if args.play:
@@ -539,62 +128,29 @@ def main():
         daemonize()
         write_pid()
 
-        # Graceful shutdown handler
-        shutting_down = {"flag": False}
-        def handle_term(_signum, _frame):
-            shutting_down["flag"] = True
-        signal.signal(signal.SIGTERM, handle_term)
-        signal.signal(signal.SIGINT, handle_term)
+        from .daemon import Daemon
+        from .playlist import Playlist
 
         # Headless playback: load playlist and play current selection if exists
         try:
+            from .player import Player
             player = Player()
-        except RuntimeError:
+        except (RuntimeError, OSError):
             # mpv not installed; nothing to do
             remove_pid()
             return
 
-        playlist = Playlist()
-        songs = playlist.songs
-        current_index = playlist.current_selection_index if songs else 0
-
-        def play_by_index(new_index: int) -> None:
-            nonlocal current_index
-            if not songs:
-                return
-            current_index = new_index % len(songs)
-            song = songs[current_index]
-            if os.path.exists(song.path):
-                player.play(song.path)
-
-        current_song = songs[current_index] if songs else None
-        if current_song and os.path.exists(current_song.path):
-            player.play(current_song.path)
-        else:
+        daemon = Daemon(player, Playlist())
+        if not daemon.start():
             # Nothing to play; exit daemon
+            with contextlib.suppress(Exception):
+                player.quit()
             remove_pid()
             return
 
-        # Auto-advance when a file ends
-        try:
-            @player.mpv.event_callback('end-file')  # type: ignore[attr-defined]
-            def _on_end_file(_event):
-                if songs:
-                    play_by_index(current_index + 1)
-        except Exception:
-            pass
-
-        # Handle NEXT track via SIGUSR1
-        def handle_next(_signum, _frame):
-            if songs:
-                play_by_index(current_index + 1)
-        with contextlib.suppress(Exception):
-            signal.signal(signal.SIGUSR1, handle_next)
-
-        # Keep the daemon alive until signaled to exit
+        # Signals, mpv events and control requests are serialized by the event loop
         try:
-            while not shutting_down["flag"]:
-                time.sleep(0.5)
+            daemon.run()
         finally:
             with contextlib.suppress(Exception):
                 player.quit()
@@ -602,6 +158,7 @@ def main():
         return
 
     # Default: run TUI app (foreground)
+    from .app import MocPlusApp
     app = MocPlusApp()
     app.run()
 
@@ -0,0 +1,160 @@
+import json
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Optional, Union
+
+# 直方图只保留最近的若干个样本来计算分位数，内存占用固定
+HISTOGRAM_WINDOW = 1024
+
+
+class Counter:
+    """单调递增的计数器。"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: int = 1) -> None:
+        with self._lock:
+            self._value += amount
+
+    @property
+    def value(self) -> int:
+        return self._value
+
+    def snapshot(self) -> dict:
+        return {"type": "counter", "value": self._value}
+
+
+class Gauge:
+    """可增可减的瞬时值（例如队列深度）。"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._value: float = 0
+        self._lock = threading.Lock()
+
+    def set(self, value: float) -> None:
+        self._value = value
+
+    def inc(self, amount: float = 1) -> None:
+        with self._lock:
+            self._value += amount
+
+    def dec(self, amount: float = 1) -> None:
+        with self._lock:
+            self._value -= amount
+
+    @property
+    def value(self) -> float:
+        return self._value
+
+    def snapshot(self) -> dict:
+        return {"type": "gauge", "value": self._value}
+
+
+class Histogram:
+    """
+    记录数值分布。总数、总和、最值是全量统计；分位数基于最近 HISTOGRAM_WINDOW 个样本。
+    """
+
+    def __init__(self, name: str, window: int = HISTOGRAM_WINDOW):
+        self.name = name
+        self._recent: deque[float] = deque(maxlen=window)
+        self._count = 0
+        self._sum = 0.0
+        self._min: Optional[float] = None
+        self._max: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        with self._lock:
+            self._recent.append(value)
+            self._count += 1
+            self._sum += value
+            self._min = value if self._min is None else min(self._min, value)
+            self._max = value if self._max is None else max(self._max, value)
+
+    @property
+    def count(self) -> int:
+        return self._count
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            recent = sorted(self._recent)
+            count, total = self._count, self._sum
+            low, high = self._min, self._max
+
+        def quantile(q: float) -> Optional[float]:
+            if not recent:
+                return None
+            return recent[min(len(recent) - 1, int(q * len(recent)))]
+
+        return {
+            "type": "histogram",
+            "count": count,
+            "sum": total,
+            "mean": total / count if count else None,
+            "min": low,
+            "max": high,
+            "p50": quantile(0.50),
+            "p95": quantile(0.95),
+            "last": self._recent[-1] if self._recent else None,
+        }
+
+
+Metric = Union[Counter, Gauge, Histogram]
+
+
+class Registry:
+    """按名称管理所有指标。同名指标只会创建一次，可在任意线程中使用。"""
+
+    def __init__(self):
+        self._metrics: dict[str, Metric] = {}
+        self._lock = threading.Lock()
+        self.started_at = time.time()
+
+    def _get(self, name: str, kind: type) -> Any:
+        metric = self._metrics.get(name)
+        if metric is None:
+            with self._lock:
+                metric = self._metrics.setdefault(name, kind(name))
+        if not isinstance(metric, kind):
+            raise TypeError(f"metric '{name}' is a {type(metric).__name__}, not {kind.__name__}")
+        return metric
+
+    def counter(self, name: str) -> Counter:
+        return self._get(name, Counter)
+
+    def gauge(self, name: str) -> Gauge:
+        return self._get(name, Gauge)
+
+    def histogram(self, name: str) -> Histogram:
+        return self._get(name, Histogram)
+
+    def snapshot(self) -> dict[str, dict]:
+        with self._lock:
+            metrics = dict(self._metrics)
+        return {name: metrics[name].snapshot() for name in sorted(metrics)}
+
+    def dump_json(self, path: str) -> str:
+        """把当前快照写入 JSON 文件，便于离线分析。"""
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        payload = {
+            "timestamp": time.time(),
+            "uptime_s": time.time() - self.started_at,
+            "metrics": self.snapshot(),
+        }
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(payload, f, ensure_ascii=False, indent=2)
+        return path
+
+
+# 进程内全局注册表
+REGISTRY = Registry()
+counter = REGISTRY.counter
+gauge = REGISTRY.gauge
+histogram = REGISTRY.histogram
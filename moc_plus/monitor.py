@@ -0,0 +1,132 @@
+import os
+import time
+from rich.markup import escape
+from textual.app import ComposeResult
+from textual.containers import VerticalScroll
+from textual.screen import Screen
+from textual.widgets import Footer, Header, Static
+
+from . import history, metrics
+
+
+def _format_value(value) -> str:
+    if value is None:
+        return "-"
+    if isinstance(value, float):
+        return f"{value:,.2f}"
+    return f"{value:,}"
+
+
+class MetricsScreen(Screen):
+    """实时显示指标注册表中的计数器、瞬时值和直方图。"""
+    BINDINGS = [
+        ("escape", "app.pop_screen", "Back"),
+        ("m", "app.pop_screen", "Back"),
+        ("d", "dump_snapshot", "Dump JSON"),
+    ]
+
+    REFRESH_INTERVAL = 1.0
+
+    def __init__(self, registry: metrics.Registry = metrics.REGISTRY):
+        super().__init__()
+        self.registry = registry
+        self.dump_dir = os.path.expanduser("~/.mpvs/metrics")
+
+    def compose(self) -> ComposeResult:
+        yield Header(name="Performance Metrics")
+        with VerticalScroll(id="metrics_view"):
+            yield Static("Collecting metrics...", id="metrics_text")
+        yield Footer()
+
+    def on_mount(self) -> None:
+        self.refresh_metrics()
+        self.set_interval(self.REFRESH_INTERVAL, self.refresh_metrics)
+
+    def refresh_metrics(self) -> None:
+        snapshot = self.registry.snapshot()
+        if not snapshot:
+            self.query_one("#metrics_text", Static).update("No metrics recorded yet.")
+            return
+        scalars, histograms = [], []
+        for name, data in snapshot.items():
+            if data["type"] == "histogram":
+                histograms.append(
+                    f"{name:<32} n={data['count']:<6} last={_format_value(data['last']):>12} "
+                    f"p50={_format_value(data['p50']):>12} p95={_format_value(data['p95']):>12} "
+                    f"max={_format_value(data['max']):>12}"
+                )
+            else:
+                scalars.append(f"{name:<32} {_format_value(data['value']):>14}")
+
+        lines = ["[b]Counters & gauges[/b]", *scalars, "", "[b]Histograms[/b]", *histograms]
+        # 缓存命中率由计数器推导
+        hits = snapshot.get("download.cache_hits", {}).get("value", 0)
+        misses = snapshot.get("download.cache_misses", {}).get("value", 0)
+        if hits + misses:
+            lines += ["", f"download cache hit rate: {hits / (hits + misses):.1%}"]
+        self.query_one("#metrics_text", Static).update("\n".join(lines))
+
+    def action_dump_snapshot(self) -> None:
+        path = os.path.join(self.dump_dir, time.strftime("metrics-%Y%m%d-%H%M%S.json"))
+        try:
+            self.registry.dump_json(path)
+            self.app.ui.set("sub_title", f"Metrics snapshot saved to {path}")
+        except OSError as e:
+            self.app.ui.set("sub_title", f"Failed to save metrics: {e}")
+
+
+def _format_duration(seconds: float) -> str:
+    seconds = int(seconds or 0)
+    return f"{seconds // 3600}:{seconds // 60 % 60:02d}:{seconds % 60:02d}" if seconds >= 3600 \
+        else f"{seconds // 60}:{seconds % 60:02d}"
+
+
+class StatsScreen(Screen):
+    """播放统计：最常播放、最近播放、跳过率。查询在线程中执行，不阻塞界面。"""
+    BINDINGS = [
+        ("escape", "app.pop_screen", "Back"),
+        ("h", "app.pop_screen", "Back"),
+        ("r", "refresh_stats", "Refresh"),
+    ]
+
+    LIMIT = 15
+
+    def __init__(self, db_path: str = history.HISTORY_DB_PATH):
+        super().__init__()
+        self.db_path = db_path
+
+    def compose(self) -> ComposeResult:
+        yield Header(name="Listening Statistics")
+        with VerticalScroll(id="stats_view"):
+            yield Static("Loading play history...", id="stats_text")
+        yield Footer()
+
+    def on_screen_resume(self) -> None:
+        # 每次打开都重新查询
+        self.action_refresh_stats()
+
+    def action_refresh_stats(self) -> None:
+        self.run_worker(self.stats_worker, group="stats", thread=True, exclusive=True, exit_on_error=False)
+
+    def stats_worker(self) -> None:
+        start = time.perf_counter()
+        plays, skips, listened = history.totals(self.db_path)
+        top = history.top_tracks(self.LIMIT, db_path=self.db_path)
+        recent = history.recently_played(self.LIMIT, db_path=self.db_path)
+        skipped = history.most_skipped(self.LIMIT, db_path=self.db_path)
+        metrics.histogram("history.query.ms").observe((time.perf_counter() - start) * 1000)
+        if not plays:
+            text = "No plays recorded yet."
+        else:
+            lines = [f"{plays:,} plays, {skips:,} skipped ({skips / plays:.1%}), "
+                     f"{_format_duration(listened)} listened", "", "[b]Top tracks[/b]"]
+            lines += [f"{s.plays:>6}  {escape(s.title)}" for s in top]
+            lines += ["", "[b]Recently played[/b]"]
+            lines += [f"{time.strftime('%m-%d %H:%M', time.localtime(e.started))}  "
+                      f"{_format_duration(e.listened):>7}  {escape(e.title)}{'  (skipped)' if e.skipped else ''}"
+                      for e in recent]
+            if skipped:
+                lines += ["", "[b]Most skipped[/b]"]
+                lines += [f"{s.skip_rate:>6.0%}  {escape(s.title)} ({s.skips}/{s.plays})" for s in skipped]
+            text = "\n".join(lines)
+        self.app.call_from_thread(self.query_one("#stats_text", Static).update, text)
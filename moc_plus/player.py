@@ -1,6 +1,10 @@
 import mpv
 import os
-from typing import Optional
+
+from . import metrics, store
+from .history import EOF, QUIT, REPLACED, PlayHistory
+from .loudness import LoudnessAnalyzer
+from typing import Callable, Iterable, Optional
 
 class Player:
     """
@@ -17,6 +21,11 @@ class Player:
         self._current_time: float = 0.0
         self._is_paused: bool = True
         self._current_song_title: Optional[str] = None
+        self._duration: Optional[float] = None
+        # 响度均衡；MPVS_LOUDNESS_TARGET=off 时为 None
+        self.loudness = LoudnessAnalyzer.from_env()
+        # 播放记录，在后台线程中写入 ~/.mpvs/history.db
+        self.history = PlayHistory()
 
         # 注册回调函数，当 mpv 的属性变化时，会自动调用这些方法
         @self.mpv.property_observer('time-pos')
@@ -34,6 +43,18 @@ class Player:
             """当曲目名称更新时由mpv回调"""
             self._current_song_title = value
 
+        @self.mpv.property_observer('duration')
+        def _duration_observer(_name, value):
+            """曲目时长；卸载文件时变为 None，这里保留最后一个有效值供播放记录使用"""
+            if value is not None:
+                self._duration = value
+
+        @self.mpv.event_callback('end-file')
+        def _history_end_callback(event):
+            data = event.data
+            if data is None or data.reason == mpv.MpvEventEndFile.EOF:
+                self.history.end(self._current_time, self._duration, EOF)
+
     def get_current_time(self) -> float:
         return self._current_time
 
@@ -43,15 +64,69 @@ class Player:
     def is_paused(self) -> bool:
         return self._is_paused
 
-    def play(self, filepath: str):
+    def get_duration(self) -> Optional[float]:
+        return self._duration
+
+    def play(self, filepath: str, start: float = 0.0):
+        """
+        播放文件。start 为起始位置（秒），用于从检查点恢复。
+        已分析过响度的曲目通过单文件的 af 选项施加增益，切歌后自动失效，不会叠加。
+        """
         if not os.path.exists(filepath): return
-        self.mpv.play(filepath)
+        # 此时 time-pos 仍是上一首被切走时的位置
+        self.history.end(self._current_time, self._duration, REPLACED)
+        self._duration = None
+        options = {}
+        if start > 0:
+            options["start"] = f"{start:.3f}"
+        gain = self.loudness.gain_for(filepath) if self.loudness else None
+        if gain is not None:
+            options["af"] = f"lavfi=[volume={gain:.2f}dB]"
+        if options:
+            self.mpv.loadfile(filepath, **options)
+        else:
+            self.mpv.play(filepath)
+        metrics.counter("player.tracks_started").inc()
+        self.history.start(filepath)
+        # 供下载目录的磁盘配额按最近播放时间淘汰
+        try: store.record_play(filepath)
+        except OSError: pass
+
+    def analyze(self, paths: Iterable[str]):
+        """在后台分析这些文件的响度，供之后播放时使用。"""
+        if self.loudness: self.loudness.scan(paths)
 
     def toggle_pause(self):
         self.mpv.pause = not self.mpv.pause
 
     def stop(self):
+        self.history.end(self._current_time, self._duration, QUIT)
         self.mpv.stop()
 
+    def on_track_end(self, callback: Callable[[], None]):
+        """
+        注册曲目自然播放结束时的回调。
+        注意：回调在 mpv 的事件线程中执行，调用方需要自行把它转交到自己的线程。
+        """
+        @self.mpv.event_callback('end-file')
+        def _end_file_callback(event):
+            data = event.data
+            # 切歌 (play 替换当前文件) 同样会触发 end-file，这里只关心自然结束
+            if data is None or data.reason == mpv.MpvEventEndFile.EOF:
+                callback()
+
+    def on_pause_change(self, callback: Callable[[bool], None]):
+        """
+        注册暂停状态变化时的回调 callback(paused)。
+        与 on_track_end 一样，回调在 mpv 的事件线程中执行。
+        """
+        @self.mpv.property_observer('pause')
+        def _pause_callback(_name, value):
+            callback(value if value is not None else True)
+
     def quit(self):
+        if self.loudness: self.loudness.stop()
+        store.flush_all()
+        self.history.end(self._current_time, self._duration, QUIT)
+        self.history.close()
         self.mpv.quit()
\ No newline at end of file
@@ -1,5 +1,8 @@
 import os
 from dataclasses import dataclass, field
+from typing import Iterator, Optional
+
+from .m3u import iter_m3u_batches
 
 SUPPORTED_EXTENSIONS = ['.mp3', '.flac', '.wav', '.aac', '.ogg', '.m4a']
 
@@ -8,6 +11,7 @@ class Song:
     """一个简单的数据类，用于存储歌曲信息。"""
     title: str
     path: str
+    duration: Optional[float] = None  # 秒，来自 #EXTINF，未知时为 None
 
 @dataclass
 class Playlist:
@@ -56,16 +60,26 @@ class Playlist:
         with open(filepath, 'w', encoding='utf-8') as f:
             f.write('#EXTM3U\n')
             for song in self.songs:
-                f.write(f'#EXTINF:-1,{song.title}\n')
+                duration = -1 if song.duration is None else int(round(song.duration))
+                f.write(f'#EXTINF:{duration},{song.title}\n')
                 f.write(f'{song.path}\n')
 
-    def load_m3u(self, filepath: str, append: bool = False):
+    def load_m3u(self, filepath: str, append: bool = False, use_mmap: bool = False):
         """
-        从 .m3u 文件加载播放列表。
+        从 .m3u / .m3u8 文件加载播放列表。
         
-        :param filepath: .m3u 文件的路径。
+        :param filepath: 歌单文件的路径。
         :param append: 如果为 True，则追加到现有列表，否则覆盖。
         """
+        for _batch in self.iter_load_m3u(filepath, append=append, use_mmap=use_mmap):
+            pass
+
+    def iter_load_m3u(self, filepath: str, append: bool = False, batch_size: int = 1000,
+                      use_mmap: bool = False) -> Iterator[list[Song]]:
+        """
+        增量加载歌单：每解析出一批就追加到 self.songs，并产出这批新增的歌曲。
+        不存在的本地文件和重复路径会被跳过。
+        """
         if not append:
             self.songs.clear()
             self.current_selection_index = 0
@@ -75,22 +89,18 @@ class Playlist:
         if not os.path.exists(filepath):
             return
 
-        with open(filepath, 'r', encoding='utf-8') as f:
-            title = ""
-            for line in f:
-                line = line.strip()
-                if not line or line.startswith('#EXTM3U'):
+        # 用集合去重，避免每追加一首都线性扫描整个列表 (大歌单下是 O(n²))
+        existing_paths = {song.path for song in self.songs}
+        for entries in iter_m3u_batches(filepath, batch_size, use_mmap=use_mmap):
+            added = []
+            for entry in entries:
+                if entry.path in existing_paths or not os.path.exists(entry.path):
                     continue
-                if line.startswith('#EXTINF:'):
-                    title = line.split(',', 1)[-1]
-                elif not line.startswith('#'):
-                    path = line
-                    if os.path.exists(path):
-                        if not title:
-                            title = os.path.splitext(os.path.basename(path))[0]
-                        if not any(song.path == path for song in self.songs):
-                            self.songs.append(Song(title=title, path=path))
-                    title = ""
+                existing_paths.add(entry.path)
+                added.append(Song(title=entry.title, path=entry.path, duration=entry.duration))
+            if added:
+                self.songs.extend(added)
+                yield added
 
     def delete_song(self, index: int):
         """按索引删除一首歌曲。"""
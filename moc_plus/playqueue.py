@@ -0,0 +1,313 @@
+import os
+import json
+import time
+import random
+import contextlib
+from collections import deque
+from typing import Optional
+
+from .playlist import Song
+
+QUEUE_STATE_PATH = os.path.expanduser("~/.mpvs/queue.json")
+# "上一首" 最多能回退的曲目数
+HISTORY_SIZE = 100
+# 播放位置检查点的最小间隔（秒）
+CHECKPOINT_INTERVAL = 5.0
+
+
+def fisher_yates(n: int, rng: random.Random) -> list[int]:
+    """生成 0..n-1 的一个均匀随机排列（Fisher–Yates 洗牌）。"""
+    order = list(range(n))
+    for i in range(n - 1, 0, -1):
+        j = rng.randrange(i + 1)
+        order[i], order[j] = order[j], order[i]
+    return order
+
+
+class PlayQueue:
+    """
+    TUI 和守护进程共用的播放队列。
+
+    * 播放顺序是播放列表下标的一个排列：顺序模式下是恒等排列（不实际生成），
+      随机模式下用 Fisher–Yates 洗牌，一轮之内每首只出现一次；播放列表增删时
+      在原排列上增删（见 sync()），只有切换随机模式或新的一轮开始时才重新洗牌；
+    * up_next 是用户手动排队的“下一首播放”，优先于播放顺序；
+    * history 是有界的已播放记录，供“上一首”使用；
+    * checkpoint() 定期把当前曲目和播放位置原子地写入 ~/.mpvs/queue.json，
+      重启后 restore() 只需读取这个小文件即可从断点继续。
+
+    history / up_next / current 记录的是路径而不是下标，播放列表增删后仍然有效。
+    修改 songs 之后需要调用 sync()。
+    """
+
+    def __init__(self, songs: list[Song], state_path: str = QUEUE_STATE_PATH,
+                 history_size: int = HISTORY_SIZE):
+        self.songs = songs
+        self.state_path = state_path
+        self.shuffle = False
+        self.current: Optional[str] = None
+        self.history: deque[str] = deque(maxlen=history_size)
+        self.up_next: deque[str] = deque()
+        self._seed = 0
+        self._anchor: Optional[int] = None
+        self._order: Optional[list[int]] = None   # None 表示顺序播放
+        self._where: list[int] = []               # _order 的逆排列
+        self._spliced = False                     # _order 被 sync() 增删过，无法再由种子还原
+        self._pos = -1                            # 当前曲目在播放顺序中的位置
+        self._index: dict[str, int] = {}
+        # 上次 sync() 时的播放列表（对象和路径），用于把旧排列映射到新下标
+        self._synced_songs: list[Song] = []
+        self._synced_paths: list[str] = []
+        self._last_checkpoint = 0.0
+        self._last_state: Optional[dict] = None
+        self.sync()
+
+    # --- 播放顺序 ---
+
+    def _build_index(self) -> None:
+        self._index = {}
+        for i, song in enumerate(self.songs):
+            self._index.setdefault(song.path, i)
+
+    def _reshuffle(self, seed: int, anchor: Optional[int]) -> None:
+        """按种子重新洗牌；anchor（当前曲目）被换到第一位，切换随机模式时不会跳歌。"""
+        self._seed, self._anchor = seed, anchor
+        order = fisher_yates(len(self.songs), random.Random(seed))
+        if anchor is not None and order:
+            k = order.index(anchor)
+            order[0], order[k] = order[k], order[0]
+        self._set_order(order)
+        self._spliced = False
+
+    def _set_order(self, order: list[int]) -> None:
+        self._order = order
+        self._where = [0] * len(order)
+        for position, index in enumerate(order):
+            self._where[index] = position
+
+    def _splice(self, old_songs: list[Song], old_paths: list[str]) -> None:
+        """
+        把旧排列映射到新的播放列表：已删除的曲目去掉，新增的曲目随机插入本轮
+        尚未播放的部分，已播放部分和其余曲目的相对顺序不变。
+
+        旧曲目先按对象匹配（文件被移动时 Song.path 原地更新），再按原来的路径匹配
+        （守护进程收到新播放列表时会重建 Song 对象）；同一路径出现多次时按出现顺序配对。
+        """
+        new_of_old: list[Optional[int]] = [None] * len(old_songs)
+        matched = [False] * len(self.songs)
+        old_by_id = {id(song): i for i, song in enumerate(old_songs)}
+        for j, song in enumerate(self.songs):
+            i = old_by_id.get(id(song))
+            if i is not None and new_of_old[i] is None:
+                new_of_old[i], matched[j] = j, True
+        unmatched: dict[str, deque[int]] = {}
+        for i, path in enumerate(old_paths):
+            if new_of_old[i] is None:
+                unmatched.setdefault(path, deque()).append(i)
+        added = []
+        for j, song in enumerate(self.songs):
+            if matched[j]:
+                continue
+            candidates = unmatched.get(song.path)
+            if candidates:
+                new_of_old[candidates.popleft()] = j
+            else:
+                added.append(j)
+
+        played, upcoming = [], []
+        for position, i in enumerate(self._order):
+            j = new_of_old[i]
+            if j is not None:
+                (played if position <= self._pos else upcoming).append(j)
+        # 随机排列的新曲目与剩余曲目随机交错，等价于把它们插入均匀随机的位置
+        random.shuffle(added)
+        total = len(upcoming) + len(added)
+        slots = set(random.sample(range(total), len(added)))
+        rest, fresh = iter(upcoming), iter(added)
+        self._set_order(played + [next(fresh) if k in slots else next(rest) for k in range(total)])
+        self._spliced = True
+        # 当前位置的曲目被删除时停在它之前，下一首照常是原来的下一首
+        self._pos = len(played) - 1
+
+    def _at(self, position: int) -> int:
+        return position if self._order is None else self._order[position]
+
+    def _position_of(self, index: int) -> int:
+        return index if self._order is None else self._where[index]
+
+    def index_of(self, path: Optional[str]) -> Optional[int]:
+        return None if path is None else self._index.get(path)
+
+    def sync(self) -> None:
+        """
+        播放列表被修改后重建索引。随机模式下不重新洗牌，而是在原排列上增删（见 _splice），
+        一轮之内每首仍然只播放一次。播放列表没有变化时什么都不做。
+        """
+        paths = [song.path for song in self.songs]
+        if paths == self._synced_paths:
+            self._synced_songs = list(self.songs)
+            return
+        old_songs, old_paths = self._synced_songs, self._synced_paths
+        self._synced_songs, self._synced_paths = list(self.songs), paths
+        self._build_index()
+        if self.shuffle and self._order is not None and len(self._order) == len(old_paths):
+            self._splice(old_songs, old_paths)
+            return
+        current = self.index_of(self.current)
+        if self.shuffle:
+            self._reshuffle(random.randrange(1 << 30), current)
+        self._pos = self._position_of(current) if current is not None else -1
+
+    def set_shuffle(self, enabled: bool) -> None:
+        if enabled == self.shuffle:
+            return
+        self.shuffle = enabled
+        current = self.index_of(self.current)
+        if enabled:
+            self._reshuffle(random.randrange(1 << 30), current)
+        else:
+            self._order, self._where = None, []
+        self._pos = self._position_of(current) if current is not None else -1
+
+    # --- 导航 ---
+
+    def _set_current(self, index: int, remember: bool = True) -> int:
+        path = self.songs[index].path
+        if remember and self.current is not None and self.current != path:
+            self.history.append(self.current)
+        self.current = path
+        return index
+
+    def enqueue(self, path: str) -> None:
+        """排到“下一首播放”队列末尾。"""
+        self.up_next.append(path)
+
+    def jump(self, index: int) -> Optional[int]:
+        """用户直接选中某首歌。"""
+        if not 0 <= index < len(self.songs):
+            return None
+        self._pos = self._position_of(index)
+        return self._set_current(index)
+
+    def next(self) -> Optional[int]:
+        """前进到下一首并返回其下标；播放列表为空时返回 None。"""
+        while self.up_next:
+            index = self._index.get(self.up_next.popleft())
+            if index is not None:
+                return self._set_current(index)
+        n = len(self.songs)
+        if n == 0:
+            return None
+        position = self._pos + 1
+        if position >= n:
+            position = 0
+            if self.shuffle:
+                # 新的一轮重新洗牌，并避免与上一轮最后一首重复
+                last = self.index_of(self.current)
+                self._reshuffle(random.randrange(1 << 30), None)
+                if n > 1 and self._order[0] == last:
+                    self._order[0], self._order[1] = self._order[1], self._order[0]
+                    self._where[self._order[0]], self._where[self._order[1]] = 0, 1
+        self._pos = position
+        return self._set_current(self._at(position))
+
+    def previous(self) -> Optional[int]:
+        """回到上一首。当前曲目被放回 up_next 队首，之后的“下一首”会回到它。"""
+        while self.history:
+            index = self._index.get(self.history.pop())
+            if index is not None:
+                if self.current is not None:
+                    self.up_next.appendleft(self.current)
+                return self._set_current(index, remember=False)
+        n = len(self.songs)
+        if n == 0:
+            return None
+        # 没有历史时按播放顺序后退一首
+        self._pos = (self._pos - 1) % n
+        return self._set_current(self._at(self._pos), remember=False)
+
+    def advance(self, backwards: bool = False) -> Optional[int]:
+        """next() / previous()，并跳过已经不存在的文件（最多尝试一整轮）。"""
+        step = self.previous if backwards else self.next
+        for _ in range(len(self.songs) + len(self.up_next)):
+            index = step()
+            if index is None or os.path.exists(self.songs[index].path):
+                return index
+        return None
+
+    # --- 检查点 ---
+
+    def checkpoint(self, position: float, paused: bool = False, force: bool = False) -> bool:
+        """
+        记录当前曲目和播放位置。距离上次写入不足 CHECKPOINT_INTERVAL 秒时跳过（force 除外）。
+        写入临时文件后原子重命名，崩溃时不会留下半个文件。
+        """
+        now = time.monotonic()
+        if not force and now - self._last_checkpoint < CHECKPOINT_INTERVAL:
+            return False
+        state = {
+            "current": self.current,
+            "position": round(position or 0.0, 3),
+            "paused": paused,
+            "shuffle": self.shuffle,
+            "seed": self._seed,
+            "anchor": self._anchor,
+            "count": len(self.songs),
+            "pos": self._pos,
+            "history": list(self.history),
+            "up_next": list(self.up_next),
+        }
+        if self._spliced:
+            # 增删过的排列无法由种子还原，直接保存
+            state["order"] = list(self._order)
+        if state == self._last_state:
+            # 暂停中：什么都没变，不写盘
+            return False
+        self._last_checkpoint = now
+        self._last_state = state
+        state = dict(state, saved_at=time.time())
+        tmp_path = f"{self.state_path}.tmp"
+        try:
+            os.makedirs(os.path.dirname(self.state_path), exist_ok=True)
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(state, f, ensure_ascii=False)
+            os.replace(tmp_path, self.state_path)
+        except OSError:
+            with contextlib.suppress(OSError):
+                os.remove(tmp_path)
+            return False
+        return True
+
+    def restore(self) -> Optional[tuple[int, float, bool]]:
+        """
+        从检查点恢复队列状态。
+        :return: (曲目下标, 播放位置秒数, 当时是否暂停)；没有可用的检查点时返回 None。
+        """
+        try:
+            with open(self.state_path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return None
+        self.history.extend(p for p in state.get("history", []) if p in self._index)
+        self.up_next.extend(p for p in state.get("up_next", []) if p in self._index)
+        self.current = state.get("current")
+        index = self.index_of(self.current)
+        if state.get("shuffle"):
+            self.shuffle = True
+            order = state.get("order")
+            if state.get("count") == len(self.songs) and order is not None:
+                if sorted(order) == list(range(len(self.songs))):
+                    self._set_order(order)
+                    self._spliced = True
+                else:
+                    self._reshuffle(random.randrange(1 << 30), index)
+            elif state.get("count") == len(self.songs):
+                # 播放列表没变：用同一个种子还原出同一个播放顺序
+                self._reshuffle(int(state.get("seed", 0)), state.get("anchor"))
+            else:
+                self._reshuffle(random.randrange(1 << 30), index)
+        if index is None:
+            self.current = None
+            return None
+        self._pos = self._position_of(index)
+        return index, float(state.get("position") or 0.0), bool(state.get("paused"))
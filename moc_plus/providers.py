@@ -0,0 +1,189 @@
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+
+from . import downloader, metrics
+
+
+class SearchProvider:
+    """
+    在线音乐来源的接口。一个 provider 负责三件事：
+    search (关键词 -> 歌曲列表)、resolve (歌曲 ID -> 下载信息)、download (下载到本地)。
+
+    search 返回的每首歌都是 {'title', 'id', 'provider'} 字典，可以另带 'artist' 和 'url'（用于跨来源去重）。
+    """
+    name = ""
+    # 单个 provider 的搜索超时（秒），超时后结果被忽略，不影响其他 provider
+    timeout = 15.0
+
+    def search(self, keyword: str, page: int = 1) -> tuple[List[Dict[str, str]], int, int]:
+        """:return: (歌曲列表, 总页数, 总歌曲数)"""
+        raise NotImplementedError
+
+    def resolve(self, song_id: str) -> Dict[str, Any]:
+        """返回包含 url/title/lrc 的歌曲信息，其中 'id' 为 store_key(song_id)。"""
+        raise NotImplementedError
+
+    def download(self, song_info: Dict[str, Any], download_dir: str,
+                 on_chunk: Optional[Callable[[int], None]] = None) -> str:
+        return downloader.download_song_and_lrc(song_info, download_dir, on_chunk=on_chunk)
+
+    def store_key(self, song_id: str) -> str:
+        """下载存储中使用的键。加上 provider 名称前缀，避免不同来源的 ID 冲突。"""
+        return f"{self.name}:{song_id}"
+
+
+class Dda5Provider(SearchProvider):
+    """基于 dda5.com 网页和 play.php 接口的来源（最初唯一的实现）。"""
+    name = "dda5"
+
+    def search(self, keyword: str, page: int = 1) -> tuple[List[Dict[str, str]], int, int]:
+        songs, total_pages, total_songs = downloader.search_songs(keyword, page)
+        return [dict(song, provider=self.name) for song in songs], total_pages, total_songs
+
+    def resolve(self, song_id: str) -> Dict[str, Any]:
+        song_info = downloader.get_song_info(song_id)
+        song_info['id'] = self.store_key(song_id)
+        return song_info
+
+    def store_key(self, song_id: str) -> str:
+        # 保持与旧索引兼容：dda5 的 ID 不加前缀
+        return song_id
+
+
+# --- 注册表 ---
+
+_providers: Dict[str, SearchProvider] = {}
+
+
+def register_provider(provider: SearchProvider) -> None:
+    _providers[provider.name] = provider
+
+
+def get_provider(name: str) -> SearchProvider:
+    try:
+        return _providers[name]
+    except KeyError:
+        raise downloader.DownloaderError(f"未知的音乐来源: {name}") from None
+
+
+def enabled_providers() -> List[SearchProvider]:
+    """启用的来源。可以用环境变量 MPVS_PROVIDERS（逗号分隔的名称）限定，默认全部启用。"""
+    names = [n.strip() for n in os.environ.get("MPVS_PROVIDERS", "").split(",") if n.strip()]
+    if not names:
+        return list(_providers.values())
+    return [_providers[n] for n in names if n in _providers]
+
+
+register_provider(Dda5Provider())
+
+
+def fetch(song_data: Dict[str, str], download_dir: str,
+          on_chunk: Optional[Callable[[int], None]] = None) -> tuple[str, str, bool]:
+    """
+    把一条搜索结果下载到本地（界面和命令行批量下载共用）。
+    先查本地索引，已下载过的歌曲不再发起任何网络请求。
+    :return: (标题, 文件路径, 是否命中本地索引)
+    """
+    provider = get_provider(song_data.get("provider", "dda5"))
+    final_path = downloader.find_downloaded(provider.store_key(song_data["id"]), download_dir)
+    if final_path:
+        return song_data.get("title") or os.path.splitext(os.path.basename(final_path))[0], final_path, True
+    song_info = provider.resolve(song_data["id"])
+    final_path = provider.download(song_info, download_dir, on_chunk=on_chunk)
+    metrics.counter("download.completed").inc()
+    return song_info["title"], final_path, False
+
+
+# --- 并发分发 ---
+
+@dataclass
+class SearchUpdate:
+    """某个 provider 返回后推送给界面的一次增量结果。"""
+    provider: str
+    songs: List[Dict[str, str]] = field(default_factory=list)   # 去重后新增的歌曲
+    error: Optional[Exception] = None
+    total_pages: int = 0        # 目前为止各来源中的最大页数
+    total_songs: int = 0        # 目前为止各来源的歌曲总数之和
+    first: bool = False         # 本次搜索的第一条更新
+    done: bool = False          # 所有来源都已返回（或超时）
+    pending: int = 0            # 仍在等待的来源数量
+
+
+def _dedup_key(song: Dict[str, str]) -> str:
+    """
+    跨来源判断“同一首歌”的键：有直链时按直链，否则按歌手 + 标题（忽略空白和大小写）。
+    dda5 的标题本身就包含歌手。
+    """
+    if song.get('url'):
+        return "url:" + song['url']
+    text = f"{song.get('artist', '')}\0{song.get('title', '')}"
+    return "".join(text.split()).casefold()
+
+
+def search_all(keyword: str, page: int, on_update: Callable[[SearchUpdate], None],
+               providers: Optional[List[SearchProvider]] = None) -> SearchUpdate:
+    """
+    并发查询所有启用的来源，每个来源一返回就通过 on_update 推送去重后的新增结果。
+    只在来源之间去重：同一来源返回的同名歌曲（不同版本、现场版等）全部保留。
+    各来源有独立的超时；慢的来源不会拖住其他来源的结果。
+    :return: 最后一次推送的 SearchUpdate（done=True）。
+    """
+    providers = enabled_providers() if providers is None else providers
+    if not providers:
+        update = SearchUpdate(provider="", error=downloader.DownloaderError("没有启用的音乐来源"),
+                              first=True, done=True)
+        on_update(update)
+        return update
+
+    seen: Dict[str, str] = {}   # 去重键 -> 最先返回它的来源
+    total_pages = 0
+    total_songs = 0
+    first = True
+    start = time.monotonic()
+    pool = ThreadPoolExecutor(max_workers=len(providers), thread_name_prefix="search")
+    futures = {pool.submit(p.search, keyword, page): p for p in providers}
+    pending = set(futures)
+    last_update = SearchUpdate(provider="", first=True, done=True)
+    try:
+        while pending:
+            now = time.monotonic()
+            next_deadline = min(start + futures[f].timeout for f in pending)
+            finished, _ = wait(pending, timeout=max(0.0, next_deadline - now), return_when=FIRST_COMPLETED)
+            if not finished:
+                # 最早到期的来源超时
+                finished = {f for f in pending if start + futures[f].timeout <= time.monotonic()}
+            for future in finished:
+                pending.discard(future)
+                provider = futures[future]
+                update = SearchUpdate(provider=provider.name)
+                elapsed_ms = (time.monotonic() - start) * 1000
+                if not future.done():
+                    update.error = TimeoutError(f"{provider.name} 搜索超时 ({provider.timeout:g}s)")
+                    metrics.counter(f"provider.{provider.name}.timeouts").inc()
+                elif future.exception() is not None:
+                    update.error = future.exception()
+                    metrics.counter(f"provider.{provider.name}.errors").inc()
+                else:
+                    songs, pages, count = future.result()
+                    metrics.histogram(f"provider.{provider.name}.latency.ms").observe(elapsed_ms)
+                    total_pages = max(total_pages, pages)
+                    total_songs += count
+                    for song in songs:
+                        owner = seen.setdefault(_dedup_key(song), provider.name)
+                        if owner == provider.name:
+                            update.songs.append(song)
+                update.total_pages = total_pages
+                update.total_songs = total_songs
+                update.first = first
+                update.pending = len(pending)
+                update.done = not pending
+                first = False
+                on_update(update)
+                last_update = update
+    finally:
+        # 超时的来源仍在后台线程中运行，不等待它们
+        pool.shutdown(wait=False, cancel_futures=True)
+    return last_update
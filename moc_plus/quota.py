@@ -0,0 +1,182 @@
+import os
+import re
+import time
+import contextlib
+from dataclasses import dataclass
+from typing import Iterable, Optional
+
+from . import metrics
+from .store import DownloadStore, StoreEntry, get_store
+
+DEFAULT_PLAYLIST_PATH = os.path.expanduser("~/.mpvs/default.m3u")
+# 超出配额时一直淘汰到配额的这个比例，避免之后每下载一首就淘汰一次
+LOW_WATER = 0.9
+# 临时文件超过这么久（秒）没有修改才算孤儿：守护进程或 mpvs fetch 可能正在下载
+ORPHAN_AGE = 3600
+
+_SIZE_RE = re.compile(r"^\s*([\d.]+)\s*([KMGT]?)i?B?\s*$", re.IGNORECASE)
+_UNITS = {"": 1024 ** 2, "K": 1024, "M": 1024 ** 2, "G": 1024 ** 3, "T": 1024 ** 4}
+
+
+def parse_size(text: str) -> Optional[int]:
+    """解析 '500M'、'5G'、'1.5GB' 这样的大小；不带单位时按 MB 计。无法解析或为 0 时返回 None。"""
+    match = _SIZE_RE.match(text or "")
+    if not match:
+        return None
+    size = int(float(match.group(1)) * _UNITS[match.group(2).upper()])
+    return size or None
+
+
+def playlist_paths(*m3u_paths: str) -> set[str]:
+    """读取歌单中引用的所有路径（歌单不存在时忽略）。"""
+    from .m3u import iter_m3u
+    paths = set()
+    for m3u_path in m3u_paths:
+        with contextlib.suppress(OSError):
+            paths.update(os.path.abspath(entry.path) for entry in iter_m3u(m3u_path))
+    return paths
+
+
+@dataclass
+class CleanupReport:
+    evicted: int = 0
+    orphans: int = 0
+    freed: int = 0
+
+
+def _remove_if_stale(path: str, cutoff: float) -> Optional[int]:
+    """删除 cutoff 之前修改过的文件，返回释放的字节数；没有删除时返回 None（空文件被删除时返回 0）。"""
+    try:
+        st = os.stat(path)
+        if st.st_mtime > cutoff:
+            return None
+        os.remove(path)
+    except OSError:
+        return None
+    return st.st_size
+
+
+def clean_orphans(store: DownloadStore, protected: Iterable[str] = (),
+                  max_age: float = ORPHAN_AGE) -> tuple[int, int]:
+    """
+    清理失败或中断的下载留下的文件：
+      * .store/tmp/ 中的临时文件；
+      * 下载目录中的 *.downloading（旧版本的临时文件）；
+      * 下载器登记过的原始格式残留（见 DownloadStore.record_leftover），且这首歌之后已成功下载。
+        没登记过的文件一律不动，即使与某首歌同名；登记后被替换过（inode 或大小不同）的文件也不动。
+    只看 .store/tmp 和下载目录本身这两层，不递归；protected 中的文件不删。返回 (文件数, 字节数)。
+    """
+    protected = {os.path.abspath(path) for path in protected}
+    cutoff = time.time() - max_age
+    count = freed = 0
+    with contextlib.suppress(OSError):
+        for entry in os.scandir(store.tmp_dir):
+            if entry.is_file(follow_symlinks=False):
+                size = _remove_if_stale(entry.path, cutoff)
+                if size is not None:
+                    count, freed = count + 1, freed + size
+
+    with contextlib.suppress(OSError):
+        for entry in os.scandir(store.download_dir):
+            if (entry.name.endswith(".downloading") and entry.is_file(follow_symlinks=False)
+                    and os.path.abspath(entry.path) not in protected):
+                size = _remove_if_stale(entry.path, cutoff)
+                if size is not None:
+                    count, freed = count + 1, freed + size
+
+    forget = []
+    for path, info in store.leftovers().items():
+        try:
+            st = os.lstat(path)
+        except FileNotFoundError:
+            forget.append(path)
+            continue
+        except OSError:
+            continue
+        if st.st_ino != info.get("ino") or st.st_size != info.get("size"):
+            # 已被用户替换成别的文件，不再归我们管
+            forget.append(path)
+            continue
+        if path in protected or store.lookup(info.get("song_id", "")) is None:
+            continue
+        size = _remove_if_stale(path, cutoff)
+        if size is not None:
+            forget.append(path)
+            count, freed = count + 1, freed + size
+    store.forget_leftovers(forget)
+    return count, freed
+
+
+class QuotaManager:
+    """
+    下载目录的磁盘配额。
+
+    用量直接由存储索引中的对象大小求和（同一对象只算一次），不遍历目录；
+    超出配额时按最近播放时间（见 DownloadStore.last_access）从旧到新淘汰，
+    正在被播放列表引用的歌曲不会被淘汰。淘汰会同时删除歌词。
+    """
+
+    def __init__(self, store: DownloadStore, quota: Optional[int]):
+        self.store = store
+        self.quota = quota
+
+    @classmethod
+    def from_env(cls, download_dir: str) -> "QuotaManager":
+        """配额由环境变量 MPVS_DOWNLOAD_QUOTA 设置（例如 5G、500M），未设置时不限制。"""
+        return cls(get_store(download_dir), parse_size(os.environ.get("MPVS_DOWNLOAD_QUOTA", "")))
+
+    def usage(self) -> int:
+        return sum({e.sha256: e.size for e in self.store.entries()}.values())
+
+    def enforce(self, protected: Iterable[str] = ()) -> tuple[list[StoreEntry], int]:
+        """超出配额时淘汰最久未播放的歌曲。返回 (被淘汰的记录, 释放的字节数)。"""
+        if not self.quota:
+            return [], 0
+        # 守护进程或 mpvs fetch 可能刚下载过，按最新的索引计算用量和挑选淘汰对象
+        self.store.refresh()
+        usage = self.usage()
+        metrics.gauge("downloads.usage_bytes").set(usage)
+        if usage <= self.quota:
+            return [], 0
+        # 合并其他进程（守护进程）记录的播放时间
+        self.store.flush_access()
+        protected = {os.path.abspath(path) for path in protected}
+        groups: dict[str, list[StoreEntry]] = {}
+        for entry in self.store.entries():
+            groups.setdefault(entry.sha256, []).append(entry)
+        candidates = [
+            (max(self.store.last_access(e) for e in group), group)
+            for group in groups.values()
+            if not any(e.path in protected for e in group)
+        ]
+        candidates.sort(key=lambda item: item[0])
+
+        target = int(self.quota * LOW_WATER)
+        victims: list[StoreEntry] = []
+        for _when, group in candidates:
+            if usage <= target:
+                break
+            victims.extend(group)
+            usage -= group[0].size
+        if not victims:
+            return [], 0
+        freed = self.store.remove(victims)
+        metrics.counter("downloads.evicted").inc(len(victims))
+        metrics.gauge("downloads.usage_bytes").set(usage)
+        return victims, freed
+
+
+def maintain(download_dir: str, protected: Iterable[str] = (), clean: bool = True) -> CleanupReport:
+    """
+    清理孤儿临时文件（clean=True 时）并执行配额。应在后台线程中调用。
+    除了 protected，默认播放列表 ~/.mpvs/default.m3u 中的歌曲也不会被删除。
+    """
+    manager = QuotaManager.from_env(download_dir)
+    protected = set(protected) | playlist_paths(DEFAULT_PLAYLIST_PATH)
+    report = CleanupReport()
+    if clean:
+        report.orphans, report.freed = clean_orphans(manager.store, protected)
+    victims, freed = manager.enforce(protected)
+    report.evicted = len(victims)
+    report.freed += freed
+    return report
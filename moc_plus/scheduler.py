@@ -0,0 +1,248 @@
+import os
+import heapq
+import itertools
+import threading
+import time
+from typing import Any, Callable, Optional
+
+from . import metrics
+
+# 优先级：数值越小越优先
+INTERACTIVE = 0   # 用户刚刚双击/回车要听的那一首
+BULK = 1          # 整页下载
+PREFETCH = 2      # 后台预取
+
+PRIORITY_NAMES = {INTERACTIVE: "interactive", BULK: "bulk", PREFETCH: "prefetch"}
+
+
+class DownloadCancelled(Exception):
+    """任务在传输过程中被取消"""
+    pass
+
+
+class TokenBucket:
+    """
+    令牌桶限速器。rate 为每秒字节数，None 或 0 表示不限速。
+    consume() 在令牌不足时阻塞调用线程，直到攒够令牌。
+    """
+
+    def __init__(self, rate: Optional[float], burst: Optional[float] = None):
+        self.rate = rate or 0
+        self.capacity = burst or self.rate
+        self._tokens = self.capacity
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def consume(self, amount: int) -> None:
+        if not self.rate:
+            return
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+            self._last = now
+            self._tokens -= amount
+            deficit = -self._tokens
+        # 在锁外等待，令牌为负表示“预支”，后续调用者会排在后面
+        if deficit > 0:
+            time.sleep(deficit / self.rate)
+
+
+class Job:
+    """一个排队中的下载任务，类似一个简化版的 Future。"""
+
+    def __init__(self, fn: Callable[["Job"], Any], priority: int,
+                 callback: Optional[Callable[["Job"], None]] = None):
+        self.fn = fn
+        self.priority = priority
+        self.callback = callback
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+        self.cancelled = False
+        self.done = threading.Event()
+        self._throttle: Optional[Callable[[int], None]] = None
+
+    def throttle(self, nbytes: int) -> None:
+        """传输过程中每收到一块数据就调用一次：可能暂停（让路给高优先级任务）或限速。"""
+        if self.cancelled:
+            raise DownloadCancelled()
+        if self._throttle is not None:
+            self._throttle(nbytes)
+
+    def cancel(self) -> None:
+        """取消任务。排队中的任务不会开始；正在传输的任务在下一个数据块时中止。"""
+        self.cancelled = True
+
+
+class DownloadScheduler:
+    """
+    按优先级调度下载任务。
+
+    * BULK / PREFETCH 任务进入优先级队列，由固定数量的工作线程按优先级取出执行；
+    * INTERACTIVE 任务不排队，立即在独立线程中开始；
+    * 只要有更高优先级的任务正在传输，低优先级任务在每个数据块之间暂停，
+      直到高优先级任务结束（只看“正在运行”的任务，避免占着工作线程互相等待）；
+    * 所有任务共享一个全局令牌桶，实现总带宽上限。
+    """
+
+    def __init__(self, max_workers: int = 3, bandwidth_limit: Optional[float] = None):
+        self.max_workers = max_workers
+        self.bucket = TokenBucket(bandwidth_limit)
+        self._queue: list[tuple[int, int, Job]] = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._running: dict[int, int] = {p: 0 for p in PRIORITY_NAMES}
+        self._active: set[Job] = set()   # 正在执行的任务，shutdown() 时一并取消
+        # 存活的工作线程数。线程在持有 _cond 时决定退出并同时减一，
+        # 不能用 is_alive() 判断：退出中的线程仍然存活，会让并发的 submit 以为有人接手
+        self._live_workers = 0
+        self._shutdown = False
+
+    @classmethod
+    def from_env(cls) -> "DownloadScheduler":
+        """带宽上限可以通过环境变量 MPVS_BANDWIDTH_LIMIT（单位 KB/s）配置。"""
+        limit_kb = float(os.environ.get("MPVS_BANDWIDTH_LIMIT", "0") or 0)
+        return cls(bandwidth_limit=limit_kb * 1024 if limit_kb > 0 else None)
+
+    # --- 提交 ---
+
+    def submit(self, fn: Callable[[Job], Any], priority: int = BULK,
+               callback: Optional[Callable[[Job], None]] = None) -> Job:
+        """
+        提交任务。fn(job) 在工作线程中执行，传输数据时应调用 job.throttle(n)。
+        callback(job) 在任务结束后于同一工作线程中调用。
+        """
+        job = Job(fn, priority, callback)
+        if priority == INTERACTIVE:
+            threading.Thread(target=self._run, args=(job,), daemon=True).start()
+            return job
+        with self._cond:
+            heapq.heappush(self._queue, (priority, next(self._seq), job))
+            metrics.gauge("download.queue_depth").set(len(self._queue))
+            self._ensure_workers()
+            self._cond.notify()
+        return job
+
+    def submit_batch(self, fns: list[Callable[[Job], Any]], priority: int,
+                     on_complete: Callable[[list[Job]], None]) -> list[Job]:
+        """
+        提交一组任务，全部结束后调用一次 on_complete(jobs)。
+        on_complete 总是在工作线程中调用，fns 为空时也一样（不会在调用者线程中同步调用）。
+        """
+        if not fns:
+            threading.Thread(target=on_complete, args=([],), daemon=True).start()
+            return []
+        remaining = [len(fns)]
+        lock = threading.Lock()
+        jobs: list[Job] = []
+
+        def _one_done(_job: Job) -> None:
+            with lock:
+                remaining[0] -= 1
+                finished = remaining[0] == 0
+            if finished:
+                on_complete(jobs)
+
+        jobs.extend(Job(fn, priority, _one_done) for fn in fns)
+        for job in jobs:
+            if priority == INTERACTIVE:
+                threading.Thread(target=self._run, args=(job,), daemon=True).start()
+            else:
+                with self._cond:
+                    heapq.heappush(self._queue, (priority, next(self._seq), job))
+        with self._cond:
+            metrics.gauge("download.queue_depth").set(len(self._queue))
+            self._ensure_workers()
+            self._cond.notify_all()
+        return jobs
+
+    def cancel(self, job: Job) -> None:
+        job.cancel()
+        with self._cond:
+            # 唤醒可能正处于暂停状态的任务，让它尽快退出
+            self._cond.notify_all()
+
+    def pending(self) -> int:
+        with self._cond:
+            return len(self._queue)
+
+    def shutdown(self) -> None:
+        """取消排队中和正在执行的任务（正在传输的任务在下一个数据块时中止）。回调仍会被调用。"""
+        with self._cond:
+            self._shutdown = True
+            for _p, _s, job in self._queue:
+                job.cancel()
+            for job in self._active:
+                job.cancel()
+            self._cond.notify_all()
+
+    # --- 执行 ---
+
+    def _ensure_workers(self) -> None:
+        # 调用方持有 _cond
+        while self._live_workers < min(self.max_workers, len(self._queue)):
+            threading.Thread(target=self._worker_loop, daemon=True).start()
+            self._live_workers += 1
+
+    def _worker_loop(self) -> None:
+        try:
+            while True:
+                with self._cond:
+                    while not self._queue and not self._shutdown:
+                        # 空闲一段时间后线程自行退出，不常驻
+                        if not self._cond.wait(timeout=30) and not self._queue:
+                            self._live_workers -= 1
+                            return
+                    if self._shutdown and not self._queue:
+                        self._live_workers -= 1
+                        return
+                    _priority, _seq, job = heapq.heappop(self._queue)
+                    metrics.gauge("download.queue_depth").set(len(self._queue))
+                self._run(job)
+        except BaseException:
+            # 回调抛出异常时线程退出，同样要让出名额
+            with self._cond:
+                self._live_workers -= 1
+            raise
+
+    def _run(self, job: Job) -> None:
+        with self._cond:
+            self._running[job.priority] += 1
+            self._active.add(job)
+            if self._shutdown:
+                job.cancel()
+        job._throttle = lambda nbytes: self._throttle(job, nbytes)
+        try:
+            if job.cancelled:
+                raise DownloadCancelled()
+            job.result = job.fn(job)
+        except BaseException as e:
+            job.error = e
+        finally:
+            with self._cond:
+                self._running[job.priority] -= 1
+                self._active.discard(job)
+                self._cond.notify_all()
+            job.done.set()
+            if job.error is None:
+                outcome = "completed"
+            elif job.cancelled or isinstance(job.error, DownloadCancelled):
+                outcome = "cancelled"
+            else:
+                outcome = "failed"
+            metrics.counter(f"scheduler.{PRIORITY_NAMES[job.priority]}.{outcome}").inc()
+            if job.callback is not None:
+                job.callback(job)
+
+    def _higher_priority_running(self, priority: int) -> bool:
+        return any(count for p, count in self._running.items() if p < priority)
+
+    def _throttle(self, job: Job, nbytes: int) -> None:
+        if self._higher_priority_running(job.priority):
+            paused_at = time.perf_counter()
+            with self._cond:
+                while self._higher_priority_running(job.priority) and not job.cancelled:
+                    self._cond.wait()
+            metrics.histogram("scheduler.paused.ms").observe((time.perf_counter() - paused_at) * 1000)
+            if job.cancelled:
+                raise DownloadCancelled()
+        self.bucket.consume(nbytes)
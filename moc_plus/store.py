@@ -0,0 +1,417 @@
+import os
+import json
+import time
+import shutil
+import hashlib
+import threading
+import uuid
+import contextlib
+from dataclasses import dataclass, asdict
+from typing import Optional
+
+from .jsonl import file_lock, parse_jsonl
+
+STORE_DIRNAME = ".store"
+HASH_CHUNK_SIZE = 1024 * 1024
+# 播放时间索引最多每隔这么久写一次盘（秒）
+ACCESS_FLUSH_INTERVAL = 30.0
+
+
+@dataclass
+class StoreEntry:
+    """索引中的一条记录：一首歌（按歌曲 ID）对应一个内容对象和一个可读的链接。"""
+    song_id: str
+    sha256: str
+    ext: str
+    title: str
+    path: str
+    size: int
+
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class DownloadStore:
+    """
+    内容寻址的下载存储。
+
+    音频按 SHA-256 保存在 <download_dir>/.store/objects/ab/abcdef....mp3，
+    下载目录中只放指向对象的可读硬链接（不支持时退化为符号链接或复制），
+    因此同名不同曲不会互相覆盖，同一首歌换了标题也只存一份。
+
+    index.jsonl 是只追加的索引（每行一条 StoreEntry），加载后常驻内存，
+    “这首歌下载过没有”只需一次字典查找，不需要任何网络请求。
+    TUI、守护进程和 mpvs fetch 可能同时使用同一个存储：所有写操作都持有
+    index.lock 上的 flock，并在修改前读入其他进程追加的新记录。
+
+    access.json 记录每个对象（按 SHA-256）最近一次被播放或下载的时间，
+    供磁盘配额按 LRU 淘汰时使用，不需要遍历目录。
+
+    leftovers.json 记录转封装失败时以原始格式留在下载目录中的文件，
+    清理时只删除这里登记过、且之后已成功下载的文件，不会误删用户自己的文件。
+    """
+
+    def __init__(self, download_dir: str):
+        self.download_dir = download_dir
+        self.root = os.path.join(download_dir, STORE_DIRNAME)
+        self.objects_dir = os.path.join(self.root, "objects")
+        self.tmp_dir = os.path.join(self.root, "tmp")
+        self.index_path = os.path.join(self.root, "index.jsonl")
+        self.access_path = os.path.join(self.root, "access.json")
+        self.lock_path = os.path.join(self.root, "index.lock")
+        self.leftovers_path = os.path.join(self.root, "leftovers.json")
+        self._by_id: dict[str, StoreEntry] = {}
+        self._by_path: dict[str, StoreEntry] = {}
+        self._access: dict[str, float] = {}
+        self._access_flushed = 0.0
+        # 已读入的 index.jsonl 的 inode 和字节数，用于只读取其他进程追加的部分
+        self._index_ino: Optional[int] = None
+        self._index_offset = 0
+        self._lock = threading.Lock()
+        os.makedirs(self.objects_dir, exist_ok=True)
+        os.makedirs(self.tmp_dir, exist_ok=True)
+        self._refresh_index()
+        self._access = self._read_access()
+
+    @contextlib.contextmanager
+    def _locked(self):
+        """先取进程内的锁，再对 index.lock 加 flock，与其他进程互斥。"""
+        with self._lock, file_lock(self.lock_path):
+            yield
+
+    # --- 索引 ---
+
+    def _refresh_index(self) -> None:
+        """
+        读入 index.jsonl 中上次之后新增的记录；文件被其他进程重写过（inode 变了或变短了）时整个重新加载。
+        除 __init__ 外，调用方须持有 _locked()。
+        """
+        try:
+            f = open(self.index_path, "rb")
+        except FileNotFoundError:
+            self._by_id, self._by_path = {}, {}
+            self._index_ino, self._index_offset = None, 0
+            return
+        with f:
+            st = os.fstat(f.fileno())
+            if st.st_ino != self._index_ino or st.st_size < self._index_offset:
+                self._by_id = {}
+                self._index_ino, self._index_offset = st.st_ino, 0
+            elif st.st_size == self._index_offset:
+                return
+            f.seek(self._index_offset)
+            records, consumed = parse_jsonl(f.read())
+        for record in records:
+            with contextlib.suppress(TypeError):
+                entry = StoreEntry(**record)
+                self._by_id[entry.song_id] = entry
+        self._index_offset += consumed
+        self._by_path = {entry.path: entry for entry in self._by_id.values()}
+
+    def refresh(self) -> None:
+        """读入其他进程（守护进程、mpvs fetch）新写入的索引记录。"""
+        with self._locked():
+            self._refresh_index()
+
+    def _append_index(self, entry: StoreEntry) -> None:
+        # 调用方持有 _locked() 且刚刚 _refresh_index()，追加后内存与文件仍然一致
+        with open(self.index_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(asdict(entry), ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+            st = os.fstat(f.fileno())
+        self._index_ino, self._index_offset = st.st_ino, st.st_size
+
+    def lookup(self, song_id: str) -> Optional[StoreEntry]:
+        """按歌曲 ID 查询已下载的记录。链接被用户删除时视为未下载。"""
+        entry = self._by_id.get(song_id)
+        if entry is None:
+            # 可能是其他进程刚下载的
+            self.refresh()
+            entry = self._by_id.get(song_id)
+        if entry is None:
+            return None
+        if not os.path.exists(entry.path):
+            # 可读链接丢了但对象还在时，直接恢复链接
+            if os.path.exists(self.object_path(entry.sha256, entry.ext)):
+                with self._lock:
+                    self._link(self.object_path(entry.sha256, entry.ext), entry.path)
+                return entry
+            return None
+        return entry
+
+    def entries(self) -> list[StoreEntry]:
+        return list(self._by_id.values())
+
+    def remove(self, entries: list[StoreEntry]) -> int:
+        """
+        删除这些记录的可读链接、歌词和对象（仍被其他记录引用的对象保留），
+        并重写索引。其他进程在此期间重新下载过的记录不删除。返回释放的字节数。
+        """
+        freed = 0
+        with self._locked():
+            self._refresh_index()
+            entries = [entry for entry in entries if self._by_id.get(entry.song_id) == entry]
+            for entry in entries:
+                del self._by_id[entry.song_id]
+                self._by_path.pop(entry.path, None)
+            in_use = {e.sha256 for e in self._by_id.values()}
+            for entry in entries:
+                stem = os.path.splitext(entry.path)[0]
+                for path in (entry.path, stem + ".lrc"):
+                    with contextlib.suppress(FileNotFoundError):
+                        os.remove(path)
+                if entry.sha256 in in_use:
+                    continue
+                object_path = self.object_path(entry.sha256, entry.ext)
+                for path in (object_path, os.path.splitext(object_path)[0] + ".lrc"):
+                    with contextlib.suppress(FileNotFoundError):
+                        freed += os.path.getsize(path)
+                        os.remove(path)
+                in_use.add(entry.sha256)   # 同一对象的多条记录只释放一次
+            self._rewrite_index()
+            # 被释放对象的播放时间在合并时一并清掉
+            self._flush_access_locked()
+        return freed
+
+    def _rewrite_index(self) -> None:
+        """原子地重写 index.jsonl，只保留当前的记录。调用方须持有 _locked() 并已 _refresh_index()。"""
+        tmp_path = f"{self.index_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for entry in self._by_id.values():
+                f.write(json.dumps(asdict(entry), ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+            st = os.fstat(f.fileno())
+        os.replace(tmp_path, self.index_path)
+        self._index_ino, self._index_offset = st.st_ino, st.st_size
+
+    # --- 播放时间索引 ---
+
+    def _read_access(self) -> dict[str, float]:
+        try:
+            with open(self.access_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        return data if isinstance(data, dict) else {}
+
+    def _write_access(self, access: dict[str, float]) -> None:
+        tmp_path = f"{self.access_path}.tmp"
+        with contextlib.suppress(OSError):
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(access, f, separators=(",", ":"))
+            os.replace(tmp_path, self.access_path)
+        self._access_flushed = time.monotonic()
+
+    def touch(self, path: str) -> bool:
+        """记录 path（下载目录中的可读链接）刚被播放。不是本存储管理的文件时返回 False。"""
+        entry = self._by_path.get(path)
+        if entry is None:
+            self.refresh()
+            entry = self._by_path.get(path)
+            if entry is None:
+                return False
+        with self._lock:
+            self._access[entry.sha256] = time.time()
+            due = time.monotonic() - self._access_flushed >= ACCESS_FLUSH_INTERVAL
+        if due:
+            self.flush_access()
+        return True
+
+    def flush_access(self) -> None:
+        with self._locked():
+            self._flush_access_locked()
+
+    def _flush_access_locked(self) -> None:
+        # TUI 和守护进程可能各自记录，写盘前与磁盘上的版本合并，取较新的时间；
+        # 只保留仍在索引中的对象，因此先读入其他进程新增的记录
+        self._refresh_index()
+        merged = self._read_access()
+        for sha256, when in self._access.items():
+            if when > merged.get(sha256, 0):
+                merged[sha256] = when
+        live = {entry.sha256 for entry in self._by_id.values()}
+        self._access = {sha256: when for sha256, when in merged.items() if sha256 in live}
+        self._write_access(self._access)
+
+    def last_access(self, entry: StoreEntry) -> float:
+        """最近一次播放或下载的时间（下载时间即对象文件的 mtime）。"""
+        downloaded = 0.0
+        with contextlib.suppress(OSError):
+            downloaded = os.path.getmtime(self.object_path(entry.sha256, entry.ext))
+        return max(self._access.get(entry.sha256, 0), downloaded)
+
+    # --- 原始格式残留 ---
+
+    def _read_leftovers(self) -> dict[str, dict]:
+        try:
+            with open(self.leftovers_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        return data if isinstance(data, dict) else {}
+
+    def _write_leftovers(self, leftovers: dict[str, dict]) -> None:
+        tmp_path = f"{self.leftovers_path}.tmp"
+        with contextlib.suppress(OSError):
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(leftovers, f, ensure_ascii=False)
+            os.replace(tmp_path, self.leftovers_path)
+
+    def record_leftover(self, song_id: str, path: str) -> None:
+        """登记下载器以原始格式留下的文件（转封装失败或没有 ffmpeg）。记下 inode 和大小，被替换过的文件不算。"""
+        st = os.stat(path)
+        with self._locked():
+            leftovers = self._read_leftovers()
+            leftovers[os.path.abspath(path)] = {"song_id": song_id, "ino": st.st_ino, "size": st.st_size}
+            self._write_leftovers(leftovers)
+
+    def leftovers(self) -> dict[str, dict]:
+        """已登记的残留文件：路径 -> {'song_id', 'ino', 'size'}。"""
+        return self._read_leftovers()
+
+    def forget_leftovers(self, paths: list[str]) -> None:
+        if not paths:
+            return
+        with self._locked():
+            leftovers = self._read_leftovers()
+            for path in paths:
+                leftovers.pop(path, None)
+            self._write_leftovers(leftovers)
+
+    # --- 对象 ---
+
+    def object_path(self, sha256: str, ext: str) -> str:
+        return os.path.join(self.objects_dir, sha256[:2], f"{sha256}{ext}")
+
+    def new_temp_path(self, suffix: str) -> str:
+        """
+        下载过程中使用的临时文件路径（位于同一文件系统，便于原子重命名）。
+        不用 mkstemp：它固定以 0600 创建，重命名后对象和硬链接都会变成只有自己可读；
+        这里按 0666 创建，由 umask 决定最终权限，与直接写文件时一致。
+        """
+        while True:
+            path = os.path.join(self.tmp_dir, f"{uuid.uuid4().hex}{suffix}")
+            try:
+                fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o666)
+            except FileExistsError:
+                continue
+            os.close(fd)
+            return path
+
+    def add(self, song_id: str, title: str, safe_title: str, temp_path: str, ext: str,
+            sha256: Optional[str] = None, lrc_content: Optional[str] = None) -> StoreEntry:
+        """
+        把下载好的临时文件收入存储，创建可读链接和歌词，并写入索引。
+        :param sha256: 调用方在下载时顺便算好的哈希；为 None 时重新计算。
+        """
+        sha256 = sha256 or file_sha256(temp_path)
+        object_path = self.object_path(sha256, ext)
+        with self._locked():
+            self._refresh_index()
+            if os.path.exists(object_path):
+                # 内容完全相同的文件已经存在：去重。更新 mtime 作为最近下载时间
+                os.remove(temp_path)
+                with contextlib.suppress(OSError):
+                    os.utime(object_path)
+            else:
+                os.makedirs(os.path.dirname(object_path), exist_ok=True)
+                os.replace(temp_path, object_path)
+
+            link_path = self._choose_link_path(safe_title, song_id, ext, sha256)
+            self._link(object_path, link_path)
+            if lrc_content:
+                self._write_lrc(os.path.splitext(object_path)[0] + ".lrc",
+                                os.path.splitext(link_path)[0] + ".lrc", lrc_content)
+
+            entry = StoreEntry(song_id=song_id, sha256=sha256, ext=ext, title=title,
+                               path=link_path, size=os.path.getsize(object_path))
+            previous = self._by_id.get(song_id)
+            if previous is not None:
+                self._by_path.pop(previous.path, None)
+            self._by_id[song_id] = entry
+            self._by_path[link_path] = entry
+            self._append_index(entry)
+        return entry
+
+    # --- 可读链接 ---
+
+    def _choose_link_path(self, safe_title: str, song_id: str, ext: str, sha256: str) -> str:
+        candidate = os.path.join(self.download_dir, f"{safe_title}{ext}")
+        if not os.path.lexists(candidate) or self._points_to(candidate, sha256, ext):
+            return candidate
+        # 同名但内容不同：用歌曲 ID 区分，避免互相覆盖
+        return os.path.join(self.download_dir, f"{safe_title} [{song_id}]{ext}")
+
+    def _points_to(self, link_path: str, sha256: str, ext: str) -> bool:
+        object_path = self.object_path(sha256, ext)
+        with contextlib.suppress(OSError):
+            if os.path.samefile(link_path, object_path):
+                return True
+            # 旧版本直接按标题保存的文件：内容相同也算同一首
+            return file_sha256(link_path) == sha256
+        return False
+
+    @staticmethod
+    def _link(object_path: str, link_path: str) -> None:
+        if os.path.lexists(link_path):
+            with contextlib.suppress(OSError):
+                if os.path.samefile(link_path, object_path):
+                    return
+            os.remove(link_path)
+        try:
+            os.link(object_path, link_path)
+        except OSError:
+            try:
+                os.symlink(object_path, link_path)
+            except OSError:
+                shutil.copy2(object_path, link_path)
+
+    def _write_lrc(self, object_lrc: str, link_lrc: str, content: str) -> None:
+        if not os.path.exists(object_lrc):
+            try:
+                with open(object_lrc, "w", encoding="utf-8") as f:
+                    f.write(content)
+            except OSError:
+                # 歌词保存失败不是致命错误
+                return
+        with contextlib.suppress(OSError):
+            self._link(object_lrc, link_lrc)
+
+
+_stores: dict[str, DownloadStore] = {}
+_stores_lock = threading.Lock()
+
+
+def get_store(download_dir: str) -> DownloadStore:
+    """每个下载目录共享一个 DownloadStore 实例（索引只加载一次）。"""
+    key = os.path.abspath(download_dir)
+    with _stores_lock:
+        store = _stores.get(key)
+        if store is None:
+            store = _stores[key] = DownloadStore(key)
+        return store
+
+
+def record_play(path: str) -> None:
+    """
+    如果 path 是某个下载目录中的歌曲，记录它刚被播放（供 LRU 淘汰使用）。
+    只在同目录下存在 .store 时才打开存储，对其他文件只多一次 stat。
+    """
+    download_dir = os.path.dirname(os.path.abspath(path))
+    if os.path.isdir(os.path.join(download_dir, STORE_DIRNAME)):
+        get_store(download_dir).touch(os.path.abspath(path))
+
+
+def flush_all() -> None:
+    """把所有已打开存储的播放时间写盘（退出前调用）。"""
+    with _stores_lock:
+        stores = list(_stores.values())
+    for store in stores:
+        store.flush_access()
@@ -0,0 +1,152 @@
+import os
+import time
+import threading
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any, Callable, Optional
+
+from . import metrics
+
+if TYPE_CHECKING:
+    from textual.app import App
+
+# 界面最多每秒重绘这么多次（可用环境变量 MPVS_UI_FPS 调整）
+DEFAULT_FPS = 20
+# 播放进度条的宽度（字符）
+PROGRESS_WIDTH = 24
+
+_MISSING = object()
+
+
+def format_time(seconds: Optional[float]) -> str:
+    if seconds is None:
+        return "--:--"
+    seconds = int(seconds)
+    if seconds >= 3600:
+        return f"{seconds // 3600}:{seconds // 60 % 60:02d}:{seconds % 60:02d}"
+    return f"{seconds // 60}:{seconds % 60:02d}"
+
+
+class UIUpdateCoordinator:
+    """
+    界面更新协调器。
+
+    状态栏、副标题、播放进度等只通过 set(field, value) 修改：值先写进待渲染表，
+    同一字段在一帧之内被改多次时只保留最后一次，与已显示内容相同时直接丢弃；
+    每帧最多渲染一次，两帧之间至少间隔 1/fps 秒。没有变化时不会调度任何帧。
+
+    set() 可以在任意线程中调用（只投递一条消息，真正的渲染总在界面线程中进行）。
+    """
+
+    def __init__(self, app: "App", fps: Optional[float] = None):
+        self.app = app
+        fps = fps or float(os.environ.get("MPVS_UI_FPS", "0") or 0) or DEFAULT_FPS
+        self.frame_interval = 1.0 / fps
+        self._renderers: dict[str, Callable[[Any], None]] = {}
+        self._pending: dict[str, Any] = {}
+        self._rendered: dict[str, Any] = {}
+        self._lock = threading.Lock()
+        self._scheduled = False
+        self._last_frame = 0.0
+        self._updates = 0
+
+    def register(self, field: str, renderer: Callable[[Any], None]) -> None:
+        """注册字段的渲染函数（在界面线程中调用）。"""
+        self._renderers[field] = renderer
+
+    def get(self, field: str, default: Any = None) -> Any:
+        """字段的最新值（可能还没渲染）。"""
+        with self._lock:
+            value = self._pending.get(field, self._rendered.get(field, _MISSING))
+        return default if value is _MISSING else value
+
+    def set(self, field: str, value: Any) -> None:
+        with self._lock:
+            if self._pending.get(field, self._rendered.get(field, _MISSING)) == value:
+                return
+            self._pending[field] = value
+            self._updates += 1
+            if self._scheduled:
+                return
+            self._scheduled = True
+        # call_later 只是向应用的消息队列投递一条回调消息，跨线程调用也是安全的
+        self.app.call_later(self._schedule_frame)
+
+    def _schedule_frame(self) -> None:
+        delay = self._last_frame + self.frame_interval - time.monotonic()
+        if delay > 0:
+            self.app.set_timer(delay, self.flush)
+        else:
+            self.flush()
+
+    def flush(self) -> None:
+        """立即渲染所有待更新的字段（在界面线程中调用）。"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            updates, self._updates = self._updates, 0
+            self._scheduled = False
+        self._last_frame = time.monotonic()
+        rendered = 0
+        for field, value in pending.items():
+            if self._rendered.get(field, _MISSING) == value:
+                continue
+            renderer = self._renderers.get(field)
+            if renderer is None:
+                continue
+            renderer(value)
+            self._rendered[field] = value
+            rendered += 1
+        metrics.counter("ui.frames").inc()
+        metrics.counter("ui.updates").inc(updates)
+        metrics.counter("ui.updates_rendered").inc(rendered)
+
+
+@dataclass(frozen=True)
+class NowPlaying:
+    """播放进度条显示的内容。elapsed 取整到秒，秒数不变时不会触发重绘。"""
+    title: str = ""
+    elapsed: int = 0
+    duration: Optional[int] = None
+    paused: bool = True
+
+    def render(self, width: int = PROGRESS_WIDTH) -> str:
+        if not self.title:
+            return "■ Nothing playing"
+        icon = "⏸" if self.paused else "▶"
+        clock = f"{format_time(self.elapsed)} / {format_time(self.duration)}"
+        if not self.duration:
+            return f"{icon} {self.title}  {clock}"
+        filled = min(width, int(width * self.elapsed / self.duration))
+        return f"{icon} {self.title}  {clock}  {'━' * filled}{'─' * (width - filled)}"
+
+
+class PlaybackClock:
+    """
+    由偶尔的采样外推出来的播放位置：两次采样之间按单调时钟推算，
+    这样进度条每秒走一格时不需要每秒都询问播放器（连接守护进程时每次询问都是一次 IPC）。
+    """
+
+    def __init__(self):
+        self.title = ""
+        self.position = 0.0
+        self.duration: Optional[float] = None
+        self.paused = True
+        self.sampled_at = float("-inf")
+
+    def update(self, title: Optional[str], position: Optional[float],
+               duration: Optional[float], paused: bool) -> None:
+        self.title = title or ""
+        self.position = float(position or 0.0)
+        self.duration = float(duration) if duration else None
+        self.paused = paused
+        self.sampled_at = time.monotonic()
+
+    def age(self) -> float:
+        return time.monotonic() - self.sampled_at
+
+    def now(self) -> float:
+        position = self.position if self.paused else self.position + self.age()
+        return min(position, self.duration) if self.duration else position
+
+    def snapshot(self) -> NowPlaying:
+        return NowPlaying(self.title, int(self.now()),
+                          int(self.duration) if self.duration else None, self.paused)
@@ -0,0 +1,430 @@
+import os
+import sys
+import time
+import errno
+import select
+import struct
+import contextlib
+import logging
+import threading
+import ctypes
+import ctypes.util
+from dataclasses import dataclass
+from typing import Callable, Iterable, Optional
+
+from . import metrics
+from .logs import setup_logging
+
+logger = logging.getLogger(__name__)
+
+# 事件类型
+CREATED = "created"
+DELETED = "deleted"
+MOVED = "moved"
+OVERFLOW = "overflow"   # 内核事件队列溢出，调用方应自行核对所有路径
+
+# 轮询后端的扫描间隔（秒），可通过 MPVS_POLL_INTERVAL 配置
+DEFAULT_POLL_INTERVAL = 2.0
+
+
+@dataclass
+class FileEvent:
+    kind: str
+    path: str
+    dest: Optional[str] = None   # 仅 MOVED 使用
+    is_dir: bool = False
+
+
+def music_roots(download_dir: str) -> list[str]:
+    """需要监视的目录：下载目录，加上环境变量 MPVS_MUSIC_ROOTS（os.pathsep 分隔）中的目录。"""
+    roots = [download_dir]
+    for root in os.environ.get("MPVS_MUSIC_ROOTS", "").split(os.pathsep):
+        root = os.path.abspath(os.path.expanduser(root.strip())) if root.strip() else ""
+        if root and os.path.isdir(root) and root not in roots:
+            roots.append(root)
+    return roots
+
+
+def _walk_dirs(root: str) -> Iterable[str]:
+    """root 及其下所有非隐藏子目录（不跟随符号链接）。"""
+    stack = [root]
+    while stack:
+        directory = stack.pop()
+        yield directory
+        try:
+            with os.scandir(directory) as it:
+                for entry in it:
+                    if not entry.name.startswith('.') and entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+        except OSError:
+            continue
+
+
+# --- inotify 后端 ---
+
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_FROM = 0x00000040
+_IN_MOVED_TO = 0x00000080
+_IN_CREATE = 0x00000100
+_IN_DELETE = 0x00000200
+_IN_DELETE_SELF = 0x00000400
+_IN_MOVE_SELF = 0x00000800
+_IN_Q_OVERFLOW = 0x00004000
+_IN_IGNORED = 0x00008000
+_IN_ONLYDIR = 0x01000000
+_IN_ISDIR = 0x40000000
+_WATCH_MASK = (_IN_CREATE | _IN_DELETE | _IN_MOVED_FROM | _IN_MOVED_TO | _IN_CLOSE_WRITE
+               | _IN_DELETE_SELF | _IN_MOVE_SELF | _IN_ONLYDIR)
+_EVENT_HEADER = struct.Struct("iIII")
+# 收到 MOVED_FROM 后最多等这么久（秒）的 MOVED_TO，之后按移出监视范围（删除）处理
+_MOVE_PAIR_TIMEOUT = 0.5
+
+
+class _InotifyBackend:
+    """通过 ctypes 直接调用 Linux inotify，不依赖第三方库。每个目录一个 watch。"""
+
+    def __init__(self, roots: list[str]):
+        if not sys.platform.startswith("linux"):
+            raise OSError(errno.ENOSYS, "inotify is only available on Linux")
+        self._libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self.fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err))
+        self._dirs: dict[int, str] = {}
+        # MOVED_FROM 等待配对的 MOVED_TO：cookie -> (路径, 是否目录)
+        self._moved_from: dict[int, tuple[str, bool]] = {}
+        # 空闲时 read 无限期阻塞，stop 通过这个管道唤醒
+        self._wake_r, self._wake_w = os.pipe()
+        try:
+            for root in roots:
+                for directory in _walk_dirs(root):
+                    self._add_watch(directory, strict=directory == root)
+        except OSError:
+            self.close()
+            raise
+
+    def _add_watch(self, directory: str, strict: bool = False) -> None:
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(directory), _WATCH_MASK)
+        if wd < 0:
+            err = ctypes.get_errno()
+            if strict:
+                raise OSError(err, os.strerror(err), directory)
+            # 常见原因是超出 fs.inotify.max_user_watches
+            logger.warning("inotify_add_watch failed for %s: %s", directory, os.strerror(err))
+            return
+        self._dirs[wd] = directory
+        metrics.gauge("watcher.watches").set(len(self._dirs))
+
+    def _rename_subtree(self, src: str, dest: str) -> None:
+        prefix = src + os.sep
+        for wd, directory in self._dirs.items():
+            if directory == src:
+                self._dirs[wd] = dest
+            elif directory.startswith(prefix):
+                self._dirs[wd] = dest + directory[len(src):]
+
+    def read(self, timeout: Optional[float]) -> list[FileEvent]:
+        """等待并返回一批事件。timeout 为 None 时一直等到有事件或被 wakeup()。"""
+        if self._moved_from and (timeout is None or timeout > _MOVE_PAIR_TIMEOUT):
+            timeout = _MOVE_PAIR_TIMEOUT
+        readable, _, _ = select.select([self.fd, self._wake_r], [], [], timeout)
+        if self._wake_r in readable:
+            return []
+        if not readable:
+            # 没有新事件时，把没等到配对的 MOVED_FROM 当作删除（移出了监视范围）
+            events = [FileEvent(DELETED, path, is_dir=is_dir) for path, is_dir in self._moved_from.values()]
+            self._moved_from.clear()
+            return events
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+        events: list[FileEvent] = []
+        offset = 0
+        while offset < len(data):
+            wd, mask, cookie, length = _EVENT_HEADER.unpack_from(data, offset)
+            offset += _EVENT_HEADER.size
+            name = os.fsdecode(data[offset:offset + length].rstrip(b"\0"))
+            offset += length
+
+            if mask & _IN_Q_OVERFLOW:
+                events.append(FileEvent(OVERFLOW, ""))
+                continue
+            if mask & _IN_IGNORED:
+                self._dirs.pop(wd, None)
+                continue
+            directory = self._dirs.get(wd)
+            if directory is None or (name and name.startswith('.')):
+                continue
+            if mask & (_IN_DELETE_SELF | _IN_MOVE_SELF):
+                # 由父目录的 DELETE / MOVED_FROM 事件负责报告
+                continue
+            path = os.path.join(directory, name) if name else directory
+            is_dir = bool(mask & _IN_ISDIR)
+
+            if mask & _IN_CREATE:
+                if is_dir:
+                    events.extend(self._watch_new_dir(path))
+                events.append(FileEvent(CREATED, path, is_dir=is_dir))
+            elif mask & _IN_CLOSE_WRITE:
+                events.append(FileEvent(CREATED, path))
+            elif mask & _IN_DELETE:
+                events.append(FileEvent(DELETED, path, is_dir=is_dir))
+            elif mask & _IN_MOVED_FROM:
+                self._moved_from[cookie] = (path, is_dir)
+            elif mask & _IN_MOVED_TO:
+                source = self._moved_from.pop(cookie, None)
+                if source is not None:
+                    if is_dir:
+                        self._rename_subtree(source[0], path)
+                    events.append(FileEvent(MOVED, source[0], dest=path, is_dir=is_dir))
+                else:
+                    if is_dir:
+                        events.extend(self._watch_new_dir(path))
+                    events.append(FileEvent(CREATED, path, is_dir=is_dir))
+        return events
+
+    def _watch_new_dir(self, path: str) -> list[FileEvent]:
+        """为新出现的目录（及其子目录）添加 watch，并补报添加 watch 之前就已存在的文件。"""
+        events = []
+        for directory in _walk_dirs(path):
+            self._add_watch(directory)
+            try:
+                with os.scandir(directory) as it:
+                    for entry in it:
+                        if not entry.name.startswith('.') and entry.is_file():
+                            events.append(FileEvent(CREATED, entry.path))
+            except OSError:
+                continue
+        return events
+
+    def wakeup(self) -> None:
+        with contextlib.suppress(OSError):
+            os.write(self._wake_w, b"\0")
+
+    def close(self) -> None:
+        for fd in (self.fd, self._wake_r, self._wake_w):
+            with contextlib.suppress(OSError):
+                os.close(fd)
+
+
+# --- 轮询后端 ---
+
+class _PollingBackend:
+    """
+    没有 inotify 时的后备方案。只对每个目录做一次 stat：目录的 mtime 没变就说明
+    其中没有文件被添加、删除或改名，不需要重新列出；变了才重新 scandir 这一个目录。
+    同一轮中消失和出现的 inode 相同的条目还原为 MOVED。
+    """
+
+    def __init__(self, roots: list[str], interval: float):
+        self.interval = interval
+        # 目录 -> (mtime_ns, {名称: (是否目录, inode)})
+        self._snapshots: dict[str, tuple[int, dict[str, tuple[bool, int]]]] = {}
+        for root in roots:
+            for directory in _walk_dirs(root):
+                self._snapshots[directory] = self._scan(directory)
+        self._stop = threading.Event()
+
+    @staticmethod
+    def _scan(directory: str) -> tuple[int, dict[str, tuple[bool, int]]]:
+        entries: dict[str, tuple[bool, int]] = {}
+        try:
+            mtime = os.stat(directory).st_mtime_ns
+            with os.scandir(directory) as it:
+                for entry in it:
+                    if not entry.name.startswith('.'):
+                        entries[entry.name] = (entry.is_dir(follow_symlinks=False), entry.inode())
+        except OSError:
+            return -1, {}
+        return mtime, entries
+
+    def read(self, timeout: Optional[float]) -> list[FileEvent]:
+        # 轮询后端本来就要按间隔扫描，timeout 为 None 时也只等一个间隔
+        if self._stop.wait(self.interval if timeout is None else min(timeout, self.interval)):
+            return []
+        created: list[tuple[FileEvent, int]] = []
+        deleted: dict[int, FileEvent] = {}
+        for directory in list(self._snapshots):
+            if directory not in self._snapshots:
+                continue   # 本轮中作为被删除目录的子目录已移除
+            old_mtime, old_entries = self._snapshots[directory]
+            try:
+                mtime = os.stat(directory).st_mtime_ns
+            except OSError:
+                continue   # 由父目录报告删除
+            if mtime == old_mtime:
+                continue
+            self._snapshots[directory] = snapshot = self._scan(directory)
+            new_entries = snapshot[1]
+            for name, (is_dir, inode) in new_entries.items():
+                if old_entries.get(name) != (is_dir, inode):
+                    path = os.path.join(directory, name)
+                    if is_dir:
+                        created.extend(self._add_tree(path))
+                    created.append((FileEvent(CREATED, path, is_dir=is_dir), inode))
+            for name, (is_dir, inode) in old_entries.items():
+                if new_entries.get(name) != (is_dir, inode):
+                    path = os.path.join(directory, name)
+                    if is_dir:
+                        self._drop_tree(path)
+                    deleted[inode] = FileEvent(DELETED, path, is_dir=is_dir)
+
+        events: list[FileEvent] = []
+        moved_dests: set[str] = set()
+        moved_dirs: list[str] = []
+        for event, inode in created:
+            source = deleted.pop(inode, None)
+            if source is not None and source.is_dir == event.is_dir:
+                events.append(FileEvent(MOVED, source.path, dest=event.path, is_dir=event.is_dir))
+                moved_dests.add(event.path)
+                if event.is_dir:
+                    moved_dirs.append(event.path + os.sep)
+        # 整个目录被移动时，不再逐个报告其中的文件为新建
+        events.extend(event for event, _inode in created
+                      if event.path not in moved_dests
+                      and not any(event.path.startswith(prefix) for prefix in moved_dirs))
+        events.extend(deleted.values())
+        return events
+
+    def _add_tree(self, path: str) -> list[tuple[FileEvent, int]]:
+        events = []
+        for directory in _walk_dirs(path):
+            snapshot = self._scan(directory)
+            self._snapshots[directory] = snapshot
+            events.extend((FileEvent(CREATED, os.path.join(directory, name)), inode)
+                          for name, (is_dir, inode) in snapshot[1].items() if not is_dir)
+        return events
+
+    def _drop_tree(self, path: str) -> None:
+        prefix = path + os.sep
+        for directory in [d for d in self._snapshots if d == path or d.startswith(prefix)]:
+            del self._snapshots[directory]
+
+    def wakeup(self) -> None:
+        self._stop.set()
+
+    def close(self) -> None:
+        self._stop.set()
+
+
+# --- 合并与分发 ---
+
+def coalesce(events: list[FileEvent]) -> list[FileEvent]:
+    """
+    合并一段时间内的事件，每个路径只保留最终结果：
+    先创建后删除的临时文件直接消失，新建后又被移走的文件视为在目标位置新建。
+    """
+    state: dict[str, FileEvent] = {}
+    result: list[FileEvent] = []
+    for event in events:
+        if event.kind == OVERFLOW:
+            return [event]
+        if event.kind == MOVED:
+            earlier = state.pop(event.path, None)
+            if earlier is not None and earlier.kind == CREATED:
+                # 新建后又被移走：等价于在目标位置新建
+                state[event.dest] = FileEvent(CREATED, event.dest, is_dir=event.is_dir)
+            else:
+                result.append(event)
+            continue
+        earlier = state.get(event.path)
+        if earlier is not None and earlier.kind == CREATED and event.kind == DELETED:
+            del state[event.path]
+        elif earlier is not None and earlier.kind == DELETED and event.kind == CREATED:
+            # 删除后重建（例如被覆盖写入）：两条都保留，按顺序处理后文件仍然存在
+            del state[event.path]
+            result.append(FileEvent(DELETED, event.path, is_dir=event.is_dir))
+            result.append(event)
+        else:
+            state[event.path] = event
+
+    result.extend(state.values())
+    return result
+
+
+class FileWatcher:
+    """
+    在后台线程中监视一组目录（递归、忽略隐藏文件），把一段时间内的变化合并后
+    一次性交给 callback(list[FileEvent])。callback 在监视线程中调用。
+
+    优先使用 inotify，不可用时（非 Linux、超出 watch 上限等）退化为按目录 mtime 轮询。
+    后端在监视线程中创建：递归遍历目录可能很慢，start() 不阻塞调用方（例如 UI 线程）。
+    """
+
+    def __init__(self, roots: list[str], callback: Callable[[list[FileEvent]], None],
+                 debounce: float = 0.3, max_delay: float = 2.0, force_polling: bool = False):
+        self.roots = [os.path.abspath(r) for r in roots if os.path.isdir(r)]
+        self.callback = callback
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self.force_polling = force_polling
+        self.backend = None
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = threading.Event()
+
+    def start(self) -> "FileWatcher":
+        setup_logging()
+        self._thread = threading.Thread(target=self._run, name="file-watcher", daemon=True)
+        self._thread.start()
+        return self
+
+    def _create_backend(self):
+        if not self.force_polling:
+            try:
+                return _InotifyBackend(self.roots)
+            except OSError as e:
+                logger.info("inotify unavailable (%s), falling back to polling", e)
+        interval = float(os.environ.get("MPVS_POLL_INTERVAL", DEFAULT_POLL_INTERVAL))
+        return _PollingBackend(self.roots, interval)
+
+    @property
+    def backend_name(self) -> str:
+        if self.backend is None:
+            return "starting"
+        return "inotify" if isinstance(self.backend, _InotifyBackend) else "polling"
+
+    def stop(self) -> None:
+        self._stopping.set()
+        # 先设置 _stopping 再读取 backend：后端还没建好时，监视线程建好后会看到 _stopping 并退出
+        backend = self.backend
+        if backend is not None:
+            backend.wakeup()
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+
+    def _run(self) -> None:
+        self.backend = self._create_backend()
+        logger.info("watching %d root(s) with %s", len(self.roots), self.backend_name)
+        try:
+            self._loop()
+        finally:
+            self.backend.close()
+
+    def _loop(self) -> None:
+        pending: list[FileEvent] = []
+        first_at = last_at = 0.0
+        while not self._stopping.is_set():
+            # 没有待合并的事件时无限期等待，空闲时不会定期唤醒
+            timeout = self.debounce if pending else None
+            try:
+                events = self.backend.read(timeout)
+            except OSError as e:
+                logger.warning("file watcher stopped: %s", e)
+                return
+            now = time.monotonic()
+            if events:
+                if not pending:
+                    first_at = now
+                last_at = now
+                pending.extend(events)
+                metrics.counter("watcher.events").inc(len(events))
+            if pending and (now - last_at >= self.debounce or now - first_at >= self.max_delay):
+                batch = coalesce(pending)
+                pending = []
+                if batch:
+                    try:
+                        self.callback(batch)
+                    except Exception:
+                        logger.exception("file watcher callback failed")
@@ -0,0 +1,46 @@
+import os
+
+from moc_plus.library import iter_audio_files, natural_sort_key, scan_in_batches
+
+
+def touch(root, *names):
+    for name in names:
+        path = os.path.join(root, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        open(path, "wb").close()
+
+
+def test_natural_sort_key():
+    names = ["Track 10.mp3", "track 2.mp3", "Track 1.mp3", "Disc 2", "disc 10"]
+    assert sorted(names, key=natural_sort_key) == [
+        "Disc 2", "disc 10", "Track 1.mp3", "track 2.mp3", "Track 10.mp3"]
+
+
+def test_walk_is_depth_first_in_natural_order(tmp_path):
+    root = str(tmp_path)
+    touch(root, "10.mp3", "2.FLAC", "cover.jpg", ".hidden.mp3",
+          "CD 10/1.mp3", "CD 2/1.mp3", "CD 2/extra/1.ogg", ".git/1.mp3")
+    assert [[os.path.relpath(p, root) for p in batch] for batch in iter_audio_files(root)] == [
+        ["2.FLAC", "10.mp3"],
+        ["CD 2/1.mp3"],
+        ["CD 2/extra/1.ogg"],
+        ["CD 10/1.mp3"],
+    ]
+
+
+def test_symlink_loop_is_visited_once(tmp_path):
+    root = str(tmp_path)
+    touch(root, "a/1.mp3")
+    os.symlink(root, os.path.join(root, "a", "loop"))
+    assert [p for batch in iter_audio_files(root) for p in batch] == [os.path.join(root, "a", "1.mp3")]
+
+
+def test_batches_are_fixed_size_and_cancel_stops_early(tmp_path):
+    root = str(tmp_path)
+    touch(root, *(f"d{i}/{j}.mp3" for i in range(3) for j in range(4)))
+    assert [len(b) for b in scan_in_batches(root, batch_size=5)] == [5, 5, 2]
+
+    seen = []
+    for batch in scan_in_batches(root, batch_size=5, cancelled=lambda: bool(seen)):
+        seen.append(batch)
+    assert len(seen) == 1
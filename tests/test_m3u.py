@@ -0,0 +1,104 @@
+import codecs
+import os
+
+import pytest
+
+from moc_plus.m3u import M3UEntry, append_entries, iter_m3u, iter_m3u_batches
+
+PLAYLIST = (
+    "#EXTM3U\n"
+    "#EXTINF:215,周杰伦 - 晴天\n"
+    "晴天.mp3\n"
+    "\n"
+    "#EXTINF:-1 tvg-id=\"x\",Live\n"
+    "http://example.com/stream\n"
+    "sub/../album/夜曲.flac\n"
+    "file:///music/with%20space.mp3\n"
+    "/abs/song.mp3\n"
+)
+
+
+def expected(base):
+    return [
+        M3UEntry(os.path.join(base, "晴天.mp3"), "周杰伦 - 晴天", 215.0),
+        M3UEntry("http://example.com/stream", "Live", None),
+        M3UEntry(os.path.join(base, "album", "夜曲.flac"), "夜曲", None),
+        M3UEntry("/music/with space.mp3", "with space", None),
+        M3UEntry("/abs/song.mp3", "song", None),
+    ]
+
+
+def write(path, data: bytes):
+    path.write_bytes(data)
+    return str(path)
+
+
+@pytest.mark.parametrize("use_mmap", [False, True])
+@pytest.mark.parametrize("chunk_size", [1, 7, 64, 1 << 20])
+def test_utf8_with_any_chunk_size(tmp_path, use_mmap, chunk_size):
+    # 块边界落在多字节字符和行中间时结果不变
+    path = write(tmp_path / "list.m3u8", PLAYLIST.encode("utf-8"))
+    assert list(iter_m3u(path, use_mmap, chunk_size)) == expected(str(tmp_path))
+
+
+@pytest.mark.parametrize("use_mmap", [False, True])
+def test_utf8_bom_is_skipped(tmp_path, use_mmap):
+    path = write(tmp_path / "list.m3u8", codecs.BOM_UTF8 + PLAYLIST.encode("utf-8"))
+    assert list(iter_m3u(path, use_mmap, chunk_size=5)) == expected(str(tmp_path))
+
+
+@pytest.mark.parametrize("encoding", ["utf-16-le", "utf-16-be"])
+def test_utf16_with_bom(tmp_path, encoding):
+    bom = codecs.BOM_UTF16_LE if encoding.endswith("le") else codecs.BOM_UTF16_BE
+    path = write(tmp_path / "list.m3u", bom + PLAYLIST.encode(encoding))
+    assert list(iter_m3u(path, chunk_size=16)) == expected(str(tmp_path))
+
+
+@pytest.mark.parametrize("chunk_size", [3, 1 << 20])
+def test_legacy_m3u_falls_back_to_gb18030(tmp_path, chunk_size):
+    path = write(tmp_path / "list.m3u", PLAYLIST.encode("gb18030"))
+    assert list(iter_m3u(path, chunk_size=chunk_size)) == expected(str(tmp_path))
+
+
+def test_m3u8_never_uses_legacy_encoding(tmp_path):
+    path = write(tmp_path / "list.m3u8", "晴天.mp3\n".encode("gb18030"))
+    [entry] = iter_m3u(path)
+    assert "�" in entry.path
+
+
+def test_windows_relative_paths(tmp_path):
+    path = write(tmp_path / "list.m3u", b"album\\1.mp3\r\n")
+    assert [e.path for e in iter_m3u(path)] == [os.path.join(str(tmp_path), "album", "1.mp3")]
+
+
+def test_empty_file(tmp_path):
+    path = write(tmp_path / "list.m3u", b"")
+    assert list(iter_m3u(path)) == []
+    assert list(iter_m3u(path, use_mmap=True)) == []
+
+
+def test_last_line_without_newline(tmp_path):
+    path = write(tmp_path / "list.m3u", b"#EXTINF:3,A\n/a.mp3\n/b.mp3")
+    assert [e.path for e in iter_m3u(path, chunk_size=4)] == ["/a.mp3", "/b.mp3"]
+
+
+def test_batches_regroup_entries(tmp_path):
+    path = write(tmp_path / "list.m3u", "".join(f"/{i}.mp3\n" for i in range(25)).encode())
+    assert [len(batch) for batch in iter_m3u_batches(path, batch_size=10)] == [10, 10, 5]
+
+
+def test_append_entries_skips_existing_and_round_trips(tmp_path):
+    path = str(tmp_path / "list.m3u8")
+    first = [M3UEntry("/a.mp3", "A", 61.4), M3UEntry("/b.mp3", "B")]
+    assert append_entries(path, first) == 2
+    assert append_entries(path, [M3UEntry("/b.mp3", "B"), M3UEntry("/c.mp3", "C", 3)]) == 1
+    assert list(iter_m3u(path)) == [M3UEntry("/a.mp3", "A", 61.0), M3UEntry("/b.mp3", "B"),
+                                    M3UEntry("/c.mp3", "C", 3.0)]
+    with open(path, encoding="utf-8") as f:
+        assert f.read().count("#EXTM3U") == 1
+
+
+def test_append_entries_adds_missing_trailing_newline(tmp_path):
+    path = write(tmp_path / "list.m3u8", b"/a.mp3")
+    assert append_entries(path, [M3UEntry("/b.mp3", "B")]) == 1
+    assert [e.path for e in iter_m3u(path)] == ["/a.mp3", "/b.mp3"]
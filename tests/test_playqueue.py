@@ -0,0 +1,170 @@
+import random
+
+import pytest
+
+from moc_plus.playlist import Song
+from moc_plus.playqueue import PlayQueue, fisher_yates
+
+
+def make_songs(names):
+    return [Song(title=name, path=f"/music/{name}.mp3") for name in names]
+
+
+def order_paths(queue):
+    return [queue.songs[i].path for i in queue._order]
+
+
+@pytest.fixture
+def queue(tmp_path):
+    random.seed(1234)
+    songs = make_songs(str(i) for i in range(10))
+    q = PlayQueue(songs, state_path=str(tmp_path / "queue.json"))
+    q.set_shuffle(True)
+    return q
+
+
+def play(queue, count):
+    return [queue.songs[queue.next()].path for _ in range(count)]
+
+
+def test_fisher_yates_is_a_permutation():
+    for n in (0, 1, 2, 50):
+        assert sorted(fisher_yates(n, random.Random(n))) == list(range(n))
+
+
+def test_shuffle_plays_each_track_once_per_cycle(queue):
+    first = play(queue, 10)
+    second = play(queue, 10)
+    assert sorted(first) == sorted(s.path for s in queue.songs)
+    assert sorted(second) == sorted(first)
+    # 新的一轮不以上一轮最后一首开始
+    assert second[0] != first[-1]
+
+
+def test_sequential_mode_follows_playlist_order(tmp_path):
+    songs = make_songs("abc")
+    q = PlayQueue(songs, state_path=str(tmp_path / "queue.json"))
+    assert play(q, 4) == [s.path for s in songs] + [songs[0].path]
+
+
+def test_enabling_shuffle_keeps_current_track_first(tmp_path):
+    songs = make_songs(str(i) for i in range(8))
+    q = PlayQueue(songs, state_path=str(tmp_path / "queue.json"))
+    q.jump(5)
+    q.set_shuffle(True)
+    assert q._order[0] == 5
+    assert q._pos == 0
+
+
+def test_sync_without_changes_keeps_order(queue):
+    play(queue, 3)
+    before = list(queue._order)
+    queue.sync()
+    queue.sync()
+    assert queue._order == before
+
+
+def test_splice_drops_removed_and_inserts_added_into_unplayed_part(queue):
+    played = play(queue, 4)
+    upcoming = order_paths(queue)[4:]
+    removed = {played[0], upcoming[0], upcoming[1]}
+    added = make_songs(f"new{i}" for i in range(5))
+    queue.songs[:] = [s for s in queue.songs if s.path not in removed] + added
+    queue.sync()
+
+    order = order_paths(queue)
+    assert sorted(order) == sorted(s.path for s in queue.songs)
+    # 已播放部分（去掉被删除的）保持原样，当前位置停在它的末尾
+    assert order[:queue._pos + 1] == [p for p in played if p not in removed]
+    rest = play(queue, len(queue.songs) - queue._pos - 1)
+    # 本轮剩下的曲目：原来未播放且未删除的，加上所有新增的，每首恰好一次
+    assert sorted(rest) == sorted([p for p in upcoming if p not in removed] + [s.path for s in added])
+    # 原有曲目之间的相对顺序不变
+    assert [p for p in rest if not p.startswith("/music/new")] == [p for p in upcoming if p not in removed]
+
+
+def test_splice_follows_moved_song_objects(queue):
+    play(queue, 2)
+    before = list(queue._order)
+    queue.songs[3].path = "/elsewhere/3.mp3"
+    queue.sync()
+    assert queue._order == before
+    assert queue.index_of("/elsewhere/3.mp3") == 3
+
+
+def test_splice_matches_rebuilt_songs_by_path_including_duplicates(tmp_path):
+    random.seed(7)
+    songs = make_songs(["a", "b", "a", "c"])
+    q = PlayQueue(songs, state_path=str(tmp_path / "queue.json"))
+    q.set_shuffle(True)
+    play(q, 2)
+    before = order_paths(q)
+    # 守护进程收到新播放列表时会重建 Song 对象
+    songs[:] = [Song(title=s.title, path=s.path) for s in songs]
+    q.sync()
+    assert order_paths(q) == before
+    assert sorted(q._order) == [0, 1, 2, 3]
+
+
+def test_sync_in_sequential_mode_tracks_current_position(tmp_path):
+    songs = make_songs("abcd")
+    q = PlayQueue(songs, state_path=str(tmp_path / "queue.json"))
+    q.jump(2)
+    songs.insert(0, Song(title="z", path="/music/z.mp3"))
+    q.sync()
+    assert q.songs[q.next()].path == "/music/d.mp3"
+
+
+def test_previous_returns_to_history_and_next_comes_back(queue):
+    first, second = play(queue, 2)
+    assert queue.songs[queue.previous()].path == first
+    assert queue.songs[queue.next()].path == second
+
+
+def test_up_next_takes_priority(queue):
+    play(queue, 1)
+    queue.enqueue("/music/7.mp3")
+    assert queue.songs[queue.next()].path == "/music/7.mp3"
+
+
+def test_checkpoint_and_restore_reproduce_seeded_order(queue, tmp_path):
+    play(queue, 3)
+    assert queue.checkpoint(12.5, paused=True, force=True)
+    restored = PlayQueue(queue.songs, state_path=queue.state_path)
+    index, position, paused = restored.restore()
+    assert queue.songs[index].path == queue.current
+    assert (position, paused) == (12.5, True)
+    assert restored._order == queue._order
+    assert restored._pos == queue._pos
+
+
+def test_checkpoint_and_restore_keep_spliced_order(queue):
+    play(queue, 3)
+    queue.songs.extend(make_songs(["x", "y"]))
+    queue.sync()
+    assert queue.checkpoint(1.0, force=True)
+    restored = PlayQueue(queue.songs, state_path=queue.state_path)
+    assert restored.restore() is not None
+    assert restored._order == queue._order
+
+
+def test_restore_after_playlist_changed_still_resumes_current(queue):
+    play(queue, 3)
+    current = queue.current
+    assert queue.checkpoint(3.0, force=True)
+    songs = list(queue.songs) + make_songs(["extra"])
+    restored = PlayQueue(songs, state_path=queue.state_path)
+    index, _position, _paused = restored.restore()
+    assert songs[index].path == current
+    assert sorted(restored._order) == list(range(len(songs)))
+
+
+def test_restore_without_checkpoint_returns_none(tmp_path):
+    q = PlayQueue(make_songs("ab"), state_path=str(tmp_path / "missing.json"))
+    assert q.restore() is None
+
+
+def test_unchanged_checkpoint_is_not_rewritten(queue):
+    play(queue, 1)
+    assert queue.checkpoint(5.0, force=True)
+    assert not queue.checkpoint(5.0, force=True)
@@ -0,0 +1,149 @@
+import os
+import time
+
+import pytest
+
+from moc_plus import quota
+from moc_plus.quota import QuotaManager, clean_orphans, parse_size
+from moc_plus.store import DownloadStore
+
+MB = 1024 * 1024
+
+
+@pytest.fixture
+def store(tmp_path):
+    return DownloadStore(str(tmp_path))
+
+
+def add(store, song_id, size=MB, downloaded_at=None):
+    temp_path = store.new_temp_path(".mp3")
+    with open(temp_path, "wb") as f:
+        f.write((song_id.encode() * size)[:size])
+    entry = store.add(song_id, song_id, song_id, temp_path, ".mp3", lrc_content="[00:00.00]x")
+    if downloaded_at is not None:
+        os.utime(store.object_path(entry.sha256, entry.ext), (downloaded_at, downloaded_at))
+    return entry
+
+
+def age(path, seconds=2 * quota.ORPHAN_AGE):
+    when = time.time() - seconds
+    os.utime(path, (when, when))
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("5G", 5 * 1024 ** 3),
+    ("500M", 500 * MB),
+    ("500", 500 * MB),
+    ("1.5GB", int(1.5 * 1024 ** 3)),
+    ("64KiB", 64 * 1024),
+    ("", None),
+    ("0", None),
+    ("lots", None),
+])
+def test_parse_size(text, expected):
+    assert parse_size(text) == expected
+
+
+def test_usage_counts_shared_objects_once(store):
+    add(store, "a")
+    temp_path = store.new_temp_path(".mp3")
+    with open(os.path.join(store.download_dir, "a.mp3"), "rb") as src, open(temp_path, "wb") as dst:
+        dst.write(src.read())
+    store.add("a2", "copy", "copy", temp_path, ".mp3")
+    assert QuotaManager(store, 10 * MB).usage() == MB
+
+
+def test_eviction_follows_last_access_order(store):
+    base = time.time() - 10_000
+    entries = [add(store, f"song{i}", downloaded_at=base + i) for i in range(5)]
+    # song0 最早下载，但刚刚播放过；song1 播放时间早于 song2 的下载时间
+    store.touch(entries[0].path)
+    store._access[entries[1].sha256] = base + 1.5
+    victims, freed = QuotaManager(store, int(3.5 * MB)).enforce()
+    # 目标是 90% × 3.5M = 3.15M：需要淘汰两首，按最近访问时间从旧到新
+    assert [v.song_id for v in victims] == ["song1", "song2"]
+    assert freed == 2 * MB + 2 * len("[00:00.00]x")
+    assert not os.path.exists(entries[1].path)
+    assert not os.path.exists(os.path.splitext(entries[1].path)[0] + ".lrc")
+    assert sorted(e.song_id for e in store.entries()) == ["song0", "song3", "song4"]
+
+
+def test_play_in_same_second_as_download_counts_as_newer(store):
+    now = time.time()
+    played = add(store, "played", downloaded_at=now - 100)
+    add(store, "fresh", downloaded_at=now)
+    store.touch(played.path)   # 与 fresh 的下载在同一秒内，但更晚
+    victims, _freed = QuotaManager(store, int(1.5 * MB)).enforce()
+    assert [v.song_id for v in victims] == ["fresh"]
+
+
+def test_protected_songs_are_never_evicted(store):
+    base = time.time() - 10_000
+    oldest = add(store, "oldest", downloaded_at=base)
+    add(store, "newer", downloaded_at=base + 1)
+    victims, _freed = QuotaManager(store, MB).enforce(protected=[oldest.path])
+    assert [v.song_id for v in victims] == ["newer"]
+
+
+def test_under_quota_or_unlimited_evicts_nothing(store):
+    add(store, "a")
+    assert QuotaManager(store, 10 * MB).enforce() == ([], 0)
+    assert QuotaManager(store, None).enforce() == ([], 0)
+
+
+def test_enforce_sees_downloads_from_other_processes(store):
+    other = DownloadStore(store.download_dir)
+    base = time.time() - 10_000
+    add(store, "mine", downloaded_at=base + 1)
+    add(other, "theirs", downloaded_at=base)
+    victims, _freed = QuotaManager(store, int(1.5 * MB)).enforce()
+    assert [v.song_id for v in victims] == ["theirs"]
+
+
+def test_clean_orphans_removes_only_stale_temp_files(store):
+    stale = store.new_temp_path(".downloading")
+    fresh = store.new_temp_path(".downloading")
+    age(stale)
+    legacy = os.path.join(store.download_dir, "old.downloading")
+    open(legacy, "w").close()
+    age(legacy)
+    count, _freed = clean_orphans(store)
+    assert count == 2
+    assert not os.path.exists(stale) and not os.path.exists(legacy)
+    assert os.path.exists(fresh)
+
+
+def test_clean_orphans_removes_recorded_leftovers_only_after_success(store):
+    leftover = os.path.join(store.download_dir, "a.m4a")
+    with open(leftover, "wb") as f:
+        f.write(b"original")
+    store.record_leftover("a", leftover)
+    age(leftover)
+    user_file = os.path.join(store.download_dir, "a.flac")
+    with open(user_file, "wb") as f:
+        f.write(b"mine")
+    age(user_file)
+
+    assert clean_orphans(store) == (0, 0)   # 这首歌还没有成功下载过
+    assert os.path.exists(leftover)
+
+    add(store, "a")
+    assert clean_orphans(store) == (1, len(b"original"))
+    assert not os.path.exists(leftover)
+    assert os.path.exists(user_file)
+    assert store.leftovers() == {}
+
+
+def test_clean_orphans_ignores_replaced_leftovers(store):
+    leftover = os.path.join(store.download_dir, "a.m4a")
+    with open(leftover, "wb") as f:
+        f.write(b"original")
+    store.record_leftover("a", leftover)
+    os.remove(leftover)
+    with open(leftover, "wb") as f:
+        f.write(b"user replaced this")
+    age(leftover)
+    add(store, "a")
+    assert clean_orphans(store) == (0, 0)
+    assert os.path.exists(leftover)
+    assert store.leftovers() == {}
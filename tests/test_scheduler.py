@@ -0,0 +1,146 @@
+import threading
+import time
+
+from moc_plus.scheduler import (BULK, INTERACTIVE, PREFETCH, DownloadCancelled,
+                                DownloadScheduler, TokenBucket)
+
+
+def wait_for(predicate, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.005)
+    return True
+
+
+def test_token_bucket_unlimited_never_blocks():
+    bucket = TokenBucket(None)
+    start = time.monotonic()
+    for _ in range(1000):
+        bucket.consume(1 << 20)
+    assert time.monotonic() - start < 0.1
+
+
+def test_token_bucket_limits_average_rate():
+    bucket = TokenBucket(100_000)   # 100 KB/s，初始满桶
+    start = time.monotonic()
+    for _ in range(5):
+        bucket.consume(40_000)
+    # 200 KB 中 100 KB 来自初始的桶，其余按速率补充，约 1 秒
+    assert 0.9 <= time.monotonic() - start < 1.5
+
+
+def test_jobs_run_by_priority():
+    scheduler = DownloadScheduler(max_workers=1)
+    gate = threading.Event()
+    order = []
+    scheduler.submit(lambda job: gate.wait(2), BULK)   # 占住唯一的工作线程
+    jobs = [scheduler.submit(lambda job, name=name: order.append(name), priority)
+            for name, priority in (("prefetch", PREFETCH), ("bulk", BULK), ("bulk2", BULK))]
+    gate.set()
+    assert all(job.done.wait(2) for job in jobs)
+    assert order == ["bulk", "bulk2", "prefetch"]
+
+
+def test_lower_priority_pauses_while_interactive_runs():
+    scheduler = DownloadScheduler()
+    release = threading.Event()
+    progress = []
+
+    def background(job):
+        for i in range(200):
+            job.throttle(1)
+            progress.append(i)
+            time.sleep(0.001)
+
+    def interactive(job):
+        job.throttle(1)
+        release.wait(2)
+
+    bulk = scheduler.submit(background, BULK)
+    assert wait_for(lambda: progress)
+    scheduler.submit(interactive, INTERACTIVE)
+    time.sleep(0.05)
+    paused_at = len(progress)
+    time.sleep(0.1)
+    assert len(progress) <= paused_at + 1
+    release.set()
+    assert bulk.done.wait(2)
+    assert len(progress) == 200 and bulk.error is None
+
+
+def test_cancel_stops_running_job():
+    scheduler = DownloadScheduler()
+    started = threading.Event()
+
+    def endless(job):
+        started.set()
+        while True:
+            job.throttle(1)
+            time.sleep(0.001)
+
+    job = scheduler.submit(endless, BULK)
+    assert started.wait(2)
+    scheduler.cancel(job)
+    assert job.done.wait(2)
+    assert isinstance(job.error, DownloadCancelled)
+
+
+def test_shutdown_cancels_queued_and_running_jobs():
+    scheduler = DownloadScheduler(max_workers=1)
+    started = threading.Event()
+    callbacks = []
+
+    def endless(job):
+        started.set()
+        while True:
+            job.throttle(1)
+            time.sleep(0.001)
+
+    running = scheduler.submit(endless, BULK, callback=callbacks.append)
+    queued = scheduler.submit(lambda job: "never", BULK, callback=callbacks.append)
+    assert started.wait(2)
+    scheduler.shutdown()
+    assert running.done.wait(2) and queued.done.wait(2)
+    assert isinstance(running.error, DownloadCancelled)
+    assert queued.result is None and queued.cancelled
+    assert wait_for(lambda: len(callbacks) == 2)
+
+
+def test_batch_completes_once_with_all_jobs():
+    scheduler = DownloadScheduler(max_workers=3)
+    done = threading.Event()
+    results = []
+
+    def on_complete(jobs):
+        results.append([job.result for job in jobs])
+        done.set()
+
+    scheduler.submit_batch([lambda job, i=i: i * i for i in range(10)], BULK, on_complete)
+    assert done.wait(2)
+    time.sleep(0.05)
+    assert results == [[i * i for i in range(10)]]
+
+
+def test_empty_batch_callback_runs_off_the_caller_thread():
+    scheduler = DownloadScheduler()
+    caller = threading.get_ident()
+    threads = []
+    done = threading.Event()
+    scheduler.submit_batch([], BULK, lambda jobs: (threads.append((threading.get_ident(), jobs)), done.set()))
+    assert done.wait(2)
+    assert threads[0][0] != caller and threads[0][1] == []
+
+
+def test_submit_after_idle_exit_still_runs(monkeypatch):
+    # 工作线程的空闲超时缩到几乎为 0，反复制造“线程正在退出时提交”的竞争
+    scheduler = DownloadScheduler(max_workers=1)
+    original_wait = threading.Condition.wait
+    monkeypatch.setattr(threading.Condition, "wait",
+                        lambda self, timeout=None: original_wait(self, 0.001 if timeout == 30 else timeout))
+    for _ in range(20):
+        job = scheduler.submit(lambda job: "ok", BULK)
+        assert job.done.wait(2)
+        time.sleep(0.002)
+    assert wait_for(lambda: scheduler._live_workers == 0)
@@ -0,0 +1,92 @@
+import os
+
+import pytest
+
+from moc_plus.store import DownloadStore, file_sha256
+
+
+@pytest.fixture
+def store(tmp_path):
+    return DownloadStore(str(tmp_path))
+
+
+def add(store, song_id, title, data, ext=".mp3", **kwargs):
+    temp_path = store.new_temp_path(ext)
+    with open(temp_path, "wb") as f:
+        f.write(data)
+    return store.add(song_id, title, title, temp_path, ext, **kwargs)
+
+
+def test_add_creates_readable_link_to_content_object(store):
+    entry = add(store, "1", "Song", b"audio", lrc_content="[00:00.00]hi")
+    object_path = store.object_path(entry.sha256, ".mp3")
+    assert entry.path == os.path.join(store.download_dir, "Song.mp3")
+    assert os.path.samefile(entry.path, object_path)
+    assert entry.sha256 == file_sha256(object_path)
+    with open(os.path.join(store.download_dir, "Song.lrc"), encoding="utf-8") as f:
+        assert f.read() == "[00:00.00]hi"
+    assert os.listdir(store.tmp_dir) == []
+
+
+def test_identical_content_is_stored_once(store):
+    first = add(store, "1", "Song", b"same")
+    second = add(store, "2", "Other title", b"same")
+    assert first.sha256 == second.sha256
+    shard = os.path.dirname(store.object_path(first.sha256, ".mp3"))
+    assert len(os.listdir(shard)) == 1
+    assert os.path.samefile(first.path, second.path)
+
+
+def test_same_title_different_content_does_not_overwrite(store):
+    first = add(store, "1", "Song", b"one")
+    second = add(store, "2", "Song", b"two")
+    assert first.path != second.path
+    assert second.path.endswith("Song [2].mp3")
+    with open(first.path, "rb") as f:
+        assert f.read() == b"one"
+
+
+def test_lookup_relinks_deleted_link_and_reports_missing_object(store):
+    entry = add(store, "1", "Song", b"audio")
+    os.remove(entry.path)
+    assert store.lookup("1") == entry
+    assert os.path.exists(entry.path)
+    os.remove(entry.path)
+    os.remove(store.object_path(entry.sha256, ".mp3"))
+    assert store.lookup("1") is None
+
+
+def test_temp_files_respect_umask(store):
+    old = os.umask(0o022)
+    try:
+        entry = add(store, "1", "Song", b"audio")
+    finally:
+        os.umask(old)
+    assert os.stat(entry.path).st_mode & 0o777 == 0o644
+
+
+def test_index_survives_reload_and_skips_torn_lines(store):
+    entry = add(store, "1", "Song", b"audio")
+    with open(store.index_path, "a", encoding="utf-8") as f:
+        f.write('{"song_id": "2", "sha')
+    reloaded = DownloadStore(store.download_dir)
+    assert reloaded.entries() == [entry]
+
+
+def test_other_process_entries_are_seen_and_kept_on_remove(store):
+    other = DownloadStore(store.download_dir)   # 模拟另一个进程
+    mine = add(store, "1", "Mine", b"one")
+    theirs = add(other, "2", "Theirs", b"two")
+    assert store.lookup("2") == theirs
+    store.remove([mine])
+    assert DownloadStore(store.download_dir).entries() == [theirs]
+    assert os.path.exists(store.object_path(theirs.sha256, ".mp3"))
+
+
+def test_remove_keeps_objects_still_referenced(store):
+    first = add(store, "1", "Song", b"same")
+    second = add(store, "2", "Song again", b"same")
+    assert store.remove([first]) == 0
+    assert os.path.exists(store.object_path(second.sha256, ".mp3"))
+    assert store.remove([second]) == len(b"same")
+    assert not os.path.exists(store.object_path(second.sha256, ".mp3"))
@@ -0,0 +1,107 @@
+import os
+import threading
+
+from moc_plus.watcher import (CREATED, DELETED, MOVED, OVERFLOW, FileEvent, FileWatcher,
+                              _PollingBackend, coalesce)
+
+
+def kinds(events):
+    return sorted((e.kind, e.path, e.dest) for e in events)
+
+
+def test_coalesce_drops_create_then_delete():
+    events = [FileEvent(CREATED, "/m/a.tmp"), FileEvent(DELETED, "/m/a.tmp"),
+              FileEvent(CREATED, "/m/b.mp3")]
+    assert coalesce(events) == [FileEvent(CREATED, "/m/b.mp3")]
+
+
+def test_coalesce_create_then_move_becomes_create_at_dest():
+    events = [FileEvent(CREATED, "/m/a.part"), FileEvent(MOVED, "/m/a.part", dest="/m/a.mp3")]
+    assert coalesce(events) == [FileEvent(CREATED, "/m/a.mp3")]
+
+
+def test_coalesce_keeps_move_of_existing_file():
+    event = FileEvent(MOVED, "/m/a.mp3", dest="/m/b.mp3")
+    assert coalesce([event]) == [event]
+
+
+def test_coalesce_keeps_delete_then_recreate_in_order():
+    # 被覆盖写入的文件：按顺序处理 DELETED、CREATED 之后仍然存在
+    events = [FileEvent(DELETED, "/m/a.mp3"), FileEvent(CREATED, "/m/a.mp3")]
+    assert coalesce(events) == events
+
+
+def test_coalesce_repeated_creates_collapse():
+    events = [FileEvent(CREATED, "/m/a.mp3"), FileEvent(CREATED, "/m/a.mp3")]
+    assert coalesce(events) == [FileEvent(CREATED, "/m/a.mp3")]
+
+
+def test_coalesce_overflow_replaces_everything():
+    events = [FileEvent(CREATED, "/m/a.mp3"), FileEvent(OVERFLOW, ""), FileEvent(DELETED, "/m/b.mp3")]
+    assert coalesce(events) == [FileEvent(OVERFLOW, "")]
+
+
+def test_polling_reports_create_delete_and_move(tmp_path):
+    root = str(tmp_path)
+    (tmp_path / "old.mp3").write_bytes(b"x")
+    (tmp_path / "gone.mp3").write_bytes(b"x")
+    (tmp_path / ".hidden").write_bytes(b"x")
+    backend = _PollingBackend([root], interval=0)
+    assert backend.read(0) == []
+
+    (tmp_path / "new.mp3").write_bytes(b"x")
+    os.remove(tmp_path / "gone.mp3")
+    os.rename(tmp_path / "old.mp3", tmp_path / "renamed.mp3")
+    (tmp_path / ".another").write_bytes(b"x")
+    assert kinds(backend.read(0)) == [
+        (CREATED, os.path.join(root, "new.mp3"), None),
+        (DELETED, os.path.join(root, "gone.mp3"), None),
+        (MOVED, os.path.join(root, "old.mp3"), os.path.join(root, "renamed.mp3")),
+    ]
+    assert backend.read(0) == []
+
+
+def test_polling_moved_directory_is_one_event(tmp_path):
+    root = str(tmp_path)
+    (tmp_path / "album").mkdir()
+    (tmp_path / "album" / "1.mp3").write_bytes(b"x")
+    backend = _PollingBackend([root], interval=0)
+    os.rename(tmp_path / "album", tmp_path / "renamed")
+    events = backend.read(0)
+    assert kinds(events) == [(MOVED, os.path.join(root, "album"), os.path.join(root, "renamed"))]
+    assert events[0].is_dir
+
+    # 移动后的目录继续被监视
+    (tmp_path / "renamed" / "2.mp3").write_bytes(b"x")
+    assert kinds(backend.read(0)) == [(CREATED, os.path.join(root, "renamed", "2.mp3"), None)]
+
+
+def test_polling_new_directory_reports_its_files(tmp_path):
+    root = str(tmp_path)
+    backend = _PollingBackend([root], interval=0)
+    (tmp_path / "album" / "disc1").mkdir(parents=True)
+    (tmp_path / "album" / "disc1" / "1.mp3").write_bytes(b"x")
+    paths = {(e.kind, e.path) for e in backend.read(0)}
+    assert (CREATED, os.path.join(root, "album", "disc1", "1.mp3")) in paths
+    assert (CREATED, os.path.join(root, "album")) in paths
+
+
+def test_file_watcher_delivers_coalesced_batch(tmp_path, monkeypatch):
+    monkeypatch.setenv("MPVS_POLL_INTERVAL", "0.02")
+    batches = []
+    received = threading.Event()
+
+    def callback(batch):
+        batches.append(batch)
+        received.set()
+
+    watcher = FileWatcher([str(tmp_path)], callback, debounce=0.05, force_polling=True).start()
+    try:
+        while watcher.backend is None:
+            received.wait(0.01)
+        (tmp_path / "a.mp3").write_bytes(b"x")
+        assert received.wait(2)
+    finally:
+        watcher.stop()
+    assert watcher.backend_name == "polling"
+    assert [(e.kind, e.path) for e in batches[0]] == [(CREATED, str(tmp_path / "a.mp3"))]